@@ -0,0 +1,177 @@
+import asyncio
+import collections
+
+"""
+IRCv3 BATCH : netsplit and netjoin batches applied in bulk, chathistory
+batches paged by Client.history.
+"""
+
+# Batches whose lines are collected instead of dispatched one by one.
+COLLECTED = ("netsplit", "netjoin", "chathistory")
+
+
+class HistoryError(Exception):
+    """FAIL CHATHISTORY reply, args : (code, description)."""
+    pass
+
+
+class Batch:
+    __slots__ = ("ref", "type", "params", "tags", "events")
+
+    def __init__(self, ref, type, params, tags):
+        self.ref = ref
+        self.type = type
+        self.params = params
+        self.tags = tags
+        self.events = []
+
+    def __repr__(self):
+        return "<Batch %s %s (%d lines)>" % (self.type, " ".join(self.params), len(self.events))
+
+
+class BatchTracker:
+    """
+    Open batches of a Client. Lines of netsplit, netjoin and chathistory
+    batches are kept aside (see collect) and handled when the batch ends :
+
+    netsplit : "netsplit#channel" (batch, nicks) updates each Channel at once,
+               then "netsplit" (batch, nicks, {channel: nicks}) for modules
+    netjoin  : "netjoin#channel" (batch, events), then "netjoin" (batch, {channel: nicks})
+    chathistory : the page awaited by history(), or "chathistory" (batch) if
+                  nobody asked for it
+
+    Lines of other batches (labeled-response...) are dispatched as usual.
+    """
+
+    def __init__(self, client, timeout=30):
+        self.client = client
+        self.timeout = timeout
+        self.open = {} # reference -> Batch
+        self._pages = collections.deque() # (casefolded target, Future) of the CHATHISTORY sent
+
+        client.on("batch", self.batch_event)
+        client.on("fail", self.fail_event)
+
+    def collect(self, event):
+        """Keep event if it belongs to a collected batch, return whether it did."""
+        if event.action == "batch":
+            return False
+        batch = self.open.get(event.get('tags').get('batch'))
+        if batch is None or batch.type not in COLLECTED:
+            return False
+        batch.events.append(event)
+        return True
+
+    """ History """
+
+    async def history(self, target, limit=None, page=100, before=None):
+        """
+        Messages of target, newest first, fetched page by page while the
+        iteration goes on. before : start from this msgid= or timestamp=
+        reference instead of the latest message.
+        """
+        if "draft/chathistory" not in self.client.activeCAP:
+            raise HistoryError("UNSUPPORTED", "draft/chathistory is not enabled")
+        maximum = self.client.isupport.get("CHATHISTORY")
+        if maximum and maximum.isdigit() and int(maximum) > 0:
+            page = min(page, int(maximum))
+
+        anchor = before
+        while limit is None or limit > 0:
+            size = page if limit is None else min(page, limit)
+            if anchor is None:
+                events = await self._page(target, "CHATHISTORY LATEST %s * %d" % (target, size))
+            else:
+                events = await self._page(target, "CHATHISTORY BEFORE %s %s %d" % (target, anchor, size))
+            for event in reversed(events):
+                yield event
+            if limit is not None:
+                limit -= len(events)
+            if len(events) < size:
+                return
+            tags = events[0].get('tags')
+            if tags.get('msgid'):
+                anchor = "msgid=%s" % (tags['msgid'])
+            elif tags.get('time'):
+                anchor = "timestamp=%s" % (tags['time'])
+            else:
+                return
+
+    async def _page(self, target, line):
+        future = asyncio.get_running_loop().create_future()
+        entry = (self.client.casefold(target), future)
+        self._pages.append(entry)
+        await self.client.send(line)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            if entry in self._pages:
+                self._pages.remove(entry)
+
+    """ Handle events """
+
+    def batch_event(self, event):
+        params = event.get('params')
+        if not params:
+            return
+        ref = params[0][1:]
+        if params[0][0] == "+":
+            # draft/ prefixed types are handled as the final ones.
+            kind = params[1].rpartition("/")[2] if len(params) > 1 else ""
+            self.open[ref] = Batch(ref, kind, params[2:], event.get('tags'))
+            return
+        batch = self.open.pop(ref, None)
+        if batch is None:
+            return
+        if batch.type == "netsplit":
+            self.netsplit(batch)
+        elif batch.type == "netjoin":
+            self.netjoin(batch)
+        elif batch.type == "chathistory":
+            self.chathistory(batch)
+
+    def netsplit(self, batch):
+        nicks = []
+        channels = collections.defaultdict(list)
+        for event in batch.events:
+            if event.action != "quit":
+                continue
+            nick = event.get('from')[0]
+            nicks.append(nick)
+            user = self.client.users.get(nick)
+            for channel in user.channels if user else ():
+                channels[channel].append(nick)
+        channels = dict(channels)
+        # They left the network, not only our channels.
+        for nick in nicks:
+            self.client.users.remove(nick)
+        for channel, members in channels.items():
+            self.client.emit("netsplit%s" % (channel), batch, members)
+        self.client.emit("netsplit", batch, nicks, channels)
+
+    def netjoin(self, batch):
+        channels = collections.defaultdict(list)
+        for event in batch.events:
+            if event.action == "join" and event.get('channel'):
+                channels[self.client.casefold(event.get('channel'))].append(event)
+        for channel, events in channels.items():
+            self.client.emit("netjoin%s" % (channel), batch, events)
+        self.client.emit("netjoin", batch, {channel: [event.get('from')[0] for event in events] for channel, events in channels.items()})
+
+    def chathistory(self, batch):
+        target = self.client.casefold(batch.params[0]) if batch.params else None
+        for entry in self._pages:
+            if entry[0] == target:
+                self._pages.remove(entry)
+                if not entry[1].done():
+                    entry[1].set_result(batch.events)
+                return
+        self.client.emit("chathistory", batch)
+
+    def fail_event(self, event):
+        params = event.get('params')
+        if len(params) < 2 or params[0].upper() != "CHATHISTORY" or not self._pages:
+            return
+        _, future = self._pages.popleft()
+        if not future.done():
+            future.set_exception(HistoryError(params[1], params[-1]))
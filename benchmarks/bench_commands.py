@@ -0,0 +1,70 @@
+"""
+PRIVMSG handling with many command modules: every module listening to
+"privmsg" and matching the text itself, against the CommandRouter which
+reaches the matching handler only.
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import load, report
+
+client = load("client")
+
+CHATTER = [
+    ":nick!ident@host PRIVMSG #channel :just talking, nothing to see",
+    ":nick!ident@host PRIVMSG #channel :!cmd7 someone 3 with a reason",
+    ":nick!ident@host PRIVMSG #channel :another line of chat",
+    ":nick!ident@host PRIVMSG #channel :!nothing here",
+]
+
+
+async def run(bot, count):
+    data = [(CHATTER[i % len(CHATTER)] + "\r\n").encode() for i in range(count)]
+    start = time.perf_counter()
+    for line in data:
+        await bot.on_data(line)
+    await asyncio.sleep(0)
+    return count / (time.perf_counter() - start)
+
+
+async def legacy(modules, count, mode):
+    bot = client.Client({'dispatch': mode})
+    calls = []
+    for index in range(modules):
+        name = "!cmd%d" % (index)
+
+        async def on_privmsg(event, name=name):
+            msg = event.get('msg')
+            if msg.split(" ", 1)[0] == name:
+                calls.append(msg.split()[1:])
+        bot.on("privmsg", on_privmsg)
+    return await run(bot, count)
+
+
+async def routed(modules, count, mode):
+    bot = client.Client({'dispatch': mode})
+    calls = []
+    for index in range(modules):
+        async def handler(event, nick, times, reason):
+            calls.append((nick, times, reason))
+        bot.router.add("cmd%d" % (index), handler, args="<nick> [times:int] [reason...]")
+    return await run(bot, count)
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--modules", type=int, default=40)
+    args.add_argument("--lines", type=int, default=20000)
+    opts = args.parse_args()
+
+    rows = []
+    for mode in ("task", "inline"):
+        rows.append(("%s, %d privmsg listeners" % (mode, opts.modules), asyncio.run(legacy(opts.modules, opts.lines, mode)), "lines/sec"))
+        rows.append(("%s, command router" % (mode), asyncio.run(routed(opts.modules, opts.lines, mode)), "lines/sec"))
+    report("Bot commands (%d commands)" % (opts.modules), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Dispatch throughput and per-line latency of Client.on_data, 'task' mode
+(one Task per listener) against 'inline' mode.
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import load, report
+
+client = load("client")
+
+TRAFFIC = [
+    ":nick!ident@host PRIVMSG #channel :%d",
+    ":other!user@host JOIN #channel account :Real Name",
+    ":other!user@host PART #channel :bye",
+    ":irc.server.net 372 me :- message of the day",
+    ":irc.server.net 353 me = #channel :@op!o@host +voice!v@host nick!n@host",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(mode, count, listeners):
+    bot = client.Client({'dispatch': mode})
+    bot.channel("#channel")
+    stamps = [0.0] * count
+    latencies = []
+    done = asyncio.Event()
+
+    async def on_privmsg(event):
+        index = int(event.get("msg"))
+        if listeners and index == count - 1 and len(latencies) == count * listeners - 1:
+            done.set()
+        latencies.append(time.perf_counter() - stamps[index])
+
+    for _ in range(listeners):
+        bot.on("privmsg", on_privmsg)
+        bot.on("privmsg#channel", lambda event: None)
+
+    data = []
+    for index in range(count):
+        for line in TRAFFIC:
+            data.append(((line % index) if "%d" in line else line).encode() + b"\r\n")
+
+    start = time.perf_counter()
+    for index in range(count):
+        for line in data[index * len(TRAFFIC):(index + 1) * len(TRAFFIC)]:
+            stamps[index] = time.perf_counter()
+            await bot.on_data(line)
+    if listeners:
+        await done.wait()
+    elapsed = time.perf_counter() - start
+    return len(data) / elapsed, latencies
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--lines", type=int, default=20000)
+    args.add_argument("--listeners", type=int, default=10)
+    opts = args.parse_args()
+
+    count = opts.lines // len(TRAFFIC)
+    rows = []
+    for mode in ("task", "inline"):
+        throughput, latencies = asyncio.run(run(mode, count, opts.listeners))
+        rows.append(("%s mode throughput" % (mode), throughput, "lines/sec"))
+        rows.append(("%s mode latency p50" % (mode), percentile(latencies, 50) * 1e6, "us"))
+        rows.append(("%s mode latency p99" % (mode), percentile(latencies, 99) * 1e6, "us"))
+    report("Dispatch (%d lines, %d listeners per event)" % (count * len(TRAFFIC), opts.listeners), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Event memory and throughput: slotted lazy Event against the dict-backed
+Event the legacy Parser builds, with its fields decoded up front. Both run
+on the lines the legacy Parser can handle.
+"""
+
+import argparse
+import tracemalloc
+
+from common import lines, load, rate, report
+
+import legacy
+
+
+def touch(e):
+    """What a typical dispatch reads: action and channel."""
+    e.get("action")
+    if e.has("channel"):
+        e.get("channel")
+
+
+def memory(build, data):
+    tracemalloc.start()
+    events = [build(raw) for raw in data]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+    return size / len(data)
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--lines", type=int, default=100000)
+    opts = args.parse_args()
+
+    # The legacy parser cannot handle every line (IPv6 hosts, tags), skip those.
+    old = legacy.Parser()
+    data = []
+    for line in lines(opts.lines):
+        try:
+            old.parse(line)
+            data.append(line)
+        except Exception:
+            pass
+
+    lazy = load("parser").Parser().parse
+    eager = old.parse
+
+    report("Event (%d lines)" % (len(data)), [
+        ("legacy dict Event, parse", rate(eager, data), "lines/sec"),
+        ("slotted Event, parse", rate(lazy, data), "lines/sec"),
+        ("legacy dict Event, parse + dispatch", rate(lambda raw: touch(eager(raw)), data), "lines/sec"),
+        ("slotted Event, parse + dispatch", rate(lambda raw: touch(lazy(raw)), data), "lines/sec"),
+        ("slotted Event, parse + .data", rate(lambda raw: lazy(raw).data, data), "lines/sec"),
+        ("legacy dict Event, memory", memory(eager, data), "bytes/event"),
+        ("slotted Event, memory", memory(lazy, data), "bytes/event"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Ban matching on JOIN: MaskIndex against the naive fnmatch loop over every
+mask, with a realistic mix of ban masks (10k masks x 10k joins by default).
+The naive loop runs on a sample of the joins and is reported per second.
+"""
+
+import argparse
+import fnmatch
+import random
+import time
+
+from common import load, report
+
+hostmask = load("hostmask")
+
+
+def make_masks(count, rand):
+    masks = set()
+    while len(masks) < count:
+        roll = rand.random()
+        if roll < 0.6:
+            masks.add("*!*@host%d.example.net" % (rand.randrange(count * 10)))
+        elif roll < 0.75:
+            masks.add("nick%d*!*@*" % (rand.randrange(count * 10)))
+        elif roll < 0.9:
+            masks.add("*!*@*.isp%d.net" % (rand.randrange(count)))
+        elif roll < 0.97:
+            masks.add("*!ident%d@*.example.net" % (rand.randrange(count)))
+        else:
+            masks.add("*!*bot%d*@*" % (rand.randrange(count)))
+    return sorted(masks)
+
+
+def make_users(count, rand):
+    users = []
+    for index in range(count):
+        host = rand.choice(["host%d.example.net", "client%d.isp%d.net", "%d.dynamic.example.org"])
+        host = host % ((rand.randrange(count * 10),) * host.count("%"))
+        users.append(("nick%d" % (rand.randrange(count * 10)), "ident%d" % (rand.randrange(count)), host))
+    return users
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--masks", type=int, default=10000)
+    args.add_argument("--joins", type=int, default=10000)
+    args.add_argument("--naive-sample", type=int, default=200, help="joins checked with the naive loop")
+    opts = args.parse_args()
+
+    rand = random.Random(42)
+    masks = make_masks(opts.masks, rand)
+    users = make_users(opts.joins, rand)
+
+    start = time.perf_counter()
+    index = hostmask.MaskIndex()
+    for mask in masks:
+        index.add(mask)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = sum(len(index.match(nick, ident, host)) for nick, ident, host in users)
+    elapsed = time.perf_counter() - start
+
+    sample = users[:opts.naive_sample]
+    lowered = [mask.lower() for mask in masks]
+    start = time.perf_counter()
+    naive = 0
+    for nick, ident, host in sample:
+        text = ("%s!%s@%s" % (nick, ident, host)).lower()
+        naive += sum(1 for mask in lowered if fnmatch.fnmatchcase(text, mask))
+    naive_elapsed = time.perf_counter() - start
+
+    expected = sum(len(index.match(*user)) for user in sample)
+    assert naive == expected, (naive, expected)
+
+    report("%d masks x %d joins (%d matches)" % (opts.masks, opts.joins, indexed), [
+        ("index build", build * 1e3, "ms"),
+        ("indexed, all joins", elapsed * 1e3, "ms"),
+        ("indexed", opts.joins / elapsed, "joins/sec"),
+        ("naive fnmatch loop", len(sample) / naive_elapsed, "joins/sec"),
+    ])
+    print("  index : %s" % (index.stats()))
+
+
+if __name__ == "__main__":
+    main()
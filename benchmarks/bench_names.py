@@ -0,0 +1,78 @@
+"""
+NAMES (353/366) ingestion time for large channels: initial sync and resync
+with a part of the members replaced, to check it stays O(n).
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import load, report
+
+client = load("client")
+
+PREFIXES = ["", "", "", "", "+", "@", "@+", "%"]
+
+
+def names_lines(channel, nicks):
+    """353 lines of at most ~500 bytes with userhost-in-names and multi-prefix entries."""
+    lines = []
+    entries = []
+    size = 0
+    for index, nick in enumerate(nicks):
+        entry = "%s%s!ident%d@host%d.example.net" % (PREFIXES[index % len(PREFIXES)], nick, index % 300, index % 5000)
+        if size + len(entry) > 440:
+            lines.append(":irc.server.net 353 me = %s :%s" % (channel, " ".join(entries)))
+            entries = []
+            size = 0
+        entries.append(entry)
+        size += len(entry) + 1
+    if entries:
+        lines.append(":irc.server.net 353 me = %s :%s" % (channel, " ".join(entries)))
+    lines.append(":irc.server.net 366 me %s :End of /NAMES list." % (channel))
+    return [(line + "\r\n").encode() for line in lines]
+
+
+async def sync(members, churn):
+    bot = client.Client({'dispatch': 'inline'})
+    await bot.on_data(b":s 005 me PREFIX=(ohv)@%+ :are supported\r\n")
+    channel = bot.channel("#big")
+    diffs = []
+    bot.on("names#big", lambda event, joined, left: diffs.append((len(joined), len(left))))
+
+    first = names_lines("#big", ["nick%d" % (i) for i in range(members)])
+    changed = int(members * churn)
+    second = names_lines("#big", ["nick%d" % (i) for i in range(changed, members + changed)])
+
+    start = time.perf_counter()
+    for line in first:
+        await bot.on_data(line)
+    initial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for line in second:
+        await bot.on_data(line)
+    resync = time.perf_counter() - start
+
+    assert len(channel.users) == members and len(bot.users) == members
+    assert diffs == [(members, 0), (changed, changed)], diffs
+    return initial, resync
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--members", type=int, nargs="+", default=[5000, 10000, 20000, 40000])
+    args.add_argument("--churn", type=float, default=0.1, help="part of the members replaced on resync")
+    opts = args.parse_args()
+
+    rows = []
+    for members in opts.members:
+        initial, resync = asyncio.run(sync(members, opts.churn))
+        rows.append(("%6d members, initial sync" % (members), initial * 1e3, "ms"))
+        rows.append(("%6d members, resync" % (members), resync * 1e3, "ms"))
+        rows.append(("%6d members, per member" % (members), (initial + resync) / (2 * members) * 1e6, "us"))
+    report("NAMES ingestion (%d%% churn)" % (opts.churn * 100), rows)
+
+
+if __name__ == "__main__":
+    main()
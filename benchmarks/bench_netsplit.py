@@ -0,0 +1,65 @@
+"""
+Netsplit of many users spread over many channels : the QUIT lines one by
+one (every QUIT resolves the channels of the user and emits per channel),
+against the same lines inside an IRCv3 netsplit batch applied in bulk.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from common import load, report
+
+client = load("client")
+
+
+def network(users, channels, per_user):
+    rand = random.Random(42)
+    names = ["#channel%d" % (i) for i in range(channels)]
+    return [("Nick%d" % (i), "ident%d" % (i), "host%d.example.net" % (i), rand.sample(names, per_user)) for i in range(users)], names
+
+
+async def split(data, names, batched, mode):
+    bot = client.Client({'dispatch': mode})
+    bot.activeCAP.append("batch")
+    for name in names:
+        bot.channel(name)
+    for nick, ident, host, joined in data:
+        for name in joined:
+            await bot.on_data((":%s!%s@%s JOIN %s\r\n" % (nick, ident, host, name)).encode())
+    await asyncio.sleep(0)
+
+    lines = [":%s!%s@%s QUIT :hub.example.net leaf.example.net" % (nick, ident, host) for nick, ident, host, _ in data]
+    if batched:
+        lines = ["@batch=split %s" % (line) for line in lines]
+        lines = [":hub.example.net BATCH +split netsplit hub.example.net leaf.example.net"] + lines + [":hub.example.net BATCH -split"]
+    payload = "".join("%s\r\n" % (line) for line in lines).encode()
+
+    start = time.perf_counter()
+    for index in range(0, len(payload), 16384):
+        await bot.on_data(payload[index:index + 16384])
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    assert not any(channel.users for channel in bot.channels.values()), "members left after the split"
+    return elapsed
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--users", type=int, default=5000)
+    args.add_argument("--channels", type=int, default=50)
+    args.add_argument("--per-user", type=int, default=5)
+    opts = args.parse_args()
+
+    data, names = network(opts.users, opts.channels, opts.per_user)
+    rows = []
+    for mode in ("task", "inline"):
+        for batched in (False, True):
+            elapsed = asyncio.run(split(data, names, batched, mode))
+            rows.append(("%s, %s" % (mode, "netsplit batch" if batched else "QUIT lines"), elapsed * 1e3, "ms"))
+    report("Netsplit of %d users on %d channels" % (opts.users, opts.channels), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Parser throughput: one-pass Parser against the legacy split(":") Parser.
+
+The legacy Parser decodes every field of every line, the one-pass Parser
+only locates the command and decodes the other fields when they are read.
+Rows compare both like for like : no field read (the listeners of most
+lines only look at the command), the fields the legacy Parser decodes
+(from, action, msg, channel, target), and Event.data which also builds
+tags, params, prefix and command, fields the legacy Parser does not have.
+Reading everything costs more than the legacy Parser : the lazy decoding
+pays off when listeners read few fields.
+"""
+
+import argparse
+
+from common import lines, load, rate, report
+
+import legacy
+
+
+def legacy_fields(event):
+    event.sender
+    event.action
+    event.msg
+    event.channel
+    event.target
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument("--lines", type=int, default=200000)
+    opts = args.parse_args()
+
+    data = lines(opts.lines)
+    # The legacy parser cannot handle every line (IPv6 hosts, tags), skip those.
+    old = legacy.Parser()
+    legacy_data = []
+    for line in data:
+        try:
+            old.parse(line)
+            legacy_data.append(line)
+        except Exception:
+            pass
+
+    new = load("parser").Parser()
+    old_rate = rate(old.parse, legacy_data)
+    lazy_rate = rate(new.parse, legacy_data)
+    same_rate = rate(lambda raw: legacy_fields(new.parse(raw)), legacy_data)
+    full_rate = rate(lambda raw: new.parse(raw).data, legacy_data)
+    all_rate = rate(new.parse, data)
+
+    report("Parser (%d lines)" % (len(data)), [
+        ("legacy Parser, every field decoded", old_rate, "lines/sec"),
+        ("one-pass Parser, no field read", lazy_rate, "lines/sec"),
+        ("one-pass Parser, legacy fields read", same_rate, "lines/sec"),
+        ("one-pass Parser, Event.data", full_rate, "lines/sec"),
+        ("one-pass Parser, no field read (all lines)", all_rate, "lines/sec"),
+        ("speedup, no field read", lazy_rate / old_rate, "x"),
+        ("speedup, legacy fields read", same_rate / old_rate, "x"),
+        ("speedup, Event.data", full_rate / old_rate, "x"),
+    ])
+    print("  legacy Parser failed on %d/%d lines" % (len(data) - len(legacy_data), len(data)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Outgoing throughput over loopback (local asyncio echo server), with and
+without write coalescing. Flood control is disabled.
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import load, report
+
+connection = load("connection")
+
+
+CLOSED = []
+
+
+async def echo(reader, writer):
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+    CLOSED.append(writer)
+
+
+async def run(count, coalesce, burst):
+    server = await asyncio.start_server(echo, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    conn = connection.Connection("127.0.0.1", port, False, flood_control=False, coalesce=coalesce)
+    await conn.connect()
+
+    received = 0
+    expected = len(b"PRIVMSG #channel :message number 000000\r\n") * count
+
+    async def read_back():
+        nonlocal received
+        while received < expected:
+            data = await conn.reader.read(65536)
+            if not data:
+                break
+            received += len(data)
+
+    reader = asyncio.create_task(read_back())
+    start = time.perf_counter()
+    for index in range(count):
+        wait = (index + 1) % burst == 0 or index == count - 1
+        await conn.send("PRIVMSG #channel :message number %06d" % (index), wait=wait)
+    await reader
+    elapsed = time.perf_counter() - start
+
+    await conn.disconnect()
+    while not CLOSED:
+        await asyncio.sleep(0.01)
+    CLOSED.clear()
+    server.close()
+    await server.wait_closed()
+    return count / elapsed
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--messages", type=int, default=50000)
+    args.add_argument("--burst", type=int, default=100, help="messages sent before awaiting delivery")
+    opts = args.parse_args()
+
+    plain = asyncio.run(run(opts.messages, False, opts.burst))
+    coalesced = asyncio.run(run(opts.messages, True, opts.burst))
+    report("Send (%d messages, bursts of %d)" % (opts.messages, opts.burst), [
+        ("one write + drain per line", plain, "msgs/sec"),
+        ("coalesced writes", coalesced, "msgs/sec"),
+        ("speedup", coalesced / plain, "x"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
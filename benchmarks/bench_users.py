@@ -0,0 +1,96 @@
+"""
+Memory of the user tracking on a simulated network, shared UserRegistry
+against the former per-channel dict of Channel.User wrappers, and the cost
+of resolving the channels of a NICK/QUIT.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+from common import load, report
+
+import legacy
+
+client = load("client")
+
+
+def network(users, channels, per_user):
+    """Return [(nick, ident, host, [channel names])]."""
+    rand = random.Random(42)
+    hosts = ["isp%d.example.net" % (i) for i in range(users // 20 + 1)]
+    names = ["#channel%d" % (i) for i in range(channels)]
+    return [
+        ("Nick%d" % (i), "ident%d" % (i % 500), rand.choice(hosts), rand.sample(names, rand.randint(1, per_user * 2 - 1)))
+        for i in range(users)
+    ], names
+
+
+def build_legacy(data, names):
+    channels = {name: {} for name in names}
+    for nick, ident, host, joined in data:
+        for name in joined:
+            channels[name][nick.lower()] = legacy.User({
+                'nick': nick.lower(),
+                'ident': "%s" % (ident),
+                'host': "%s" % (host),
+                'status': [],
+            })
+    return channels
+
+
+async def build_registry(data, names):
+    bot = client.Client({'dispatch': 'inline'})
+    for name in names:
+        bot.channel(name)
+    for nick, ident, host, joined in data:
+        for name in joined:
+            await bot.on_data((":%s!%s@%s JOIN %s" % (nick, ident, host, name)).encode() + b"\r\n")
+    return bot
+
+
+def measure(build):
+    tracemalloc.start()
+    state = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return state, size
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__)
+    args.add_argument("--users", type=int, default=50000)
+    args.add_argument("--channels", type=int, default=500)
+    args.add_argument("--per-user", type=int, default=6, help="average channels per user")
+    opts = args.parse_args()
+
+    data, names = network(opts.users, opts.channels, opts.per_user)
+    memberships = sum(len(joined) for _, _, _, joined in data)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    old, old_size = measure(lambda: build_legacy(data, names))
+    bot, new_size = measure(lambda: loop.run_until_complete(build_registry(data, names)))
+
+    sample = [nick for nick, _, _, _ in data[:: max(1, len(data) // 1000)]]
+    start = time.perf_counter()
+    for nick in sample:
+        [name for name in old if nick.lower() in old[name]]
+    old_lookup = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    for nick in sample:
+        list(bot.users.get(nick).channels)
+    new_lookup = (time.perf_counter() - start) / len(sample)
+
+    report("Users (%d users, %d channels, %d memberships)" % (opts.users, opts.channels, memberships), [
+        ("per-channel wrappers, memory", old_size / 2 ** 20, "MiB"),
+        ("shared registry, memory", new_size / 2 ** 20, "MiB"),
+        ("per-channel wrappers, NICK/QUIT channels", old_lookup * 1e6, "us"),
+        ("shared registry, NICK/QUIT channels", new_lookup * 1e6, "us"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
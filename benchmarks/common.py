@@ -0,0 +1,64 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks are plain scripts, run them from anywhere :
+    python benchmarks/bench_parser.py
+"""
+
+import importlib
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pyrc = importlib.import_module(os.path.basename(ROOT))
+
+
+def load(name):
+    """Import a submodule of the library (ex: load('parser'))."""
+    return importlib.import_module("%s.%s" % (pyrc.__name__, name))
+
+
+SAMPLE = [
+    ":nick!ident@host.example.org PRIVMSG #channel :Hello world, how are you ?",
+    ":nick!ident@host.example.org PRIVMSG #channel :look at https://example.org:8080/path",
+    "@time=2021-01-01T00:00:00.000Z;account=nick :nick!ident@2001:db8::1 PRIVMSG #channel :tagged",
+    ":other!user@some.isp.net JOIN #channel account :Real Name",
+    ":other!user@some.isp.net PART #channel :Leaving",
+    ":other!user@some.isp.net QUIT :Quit: bye",
+    ":op!ident@services.net MODE #channel +o nick",
+    ":op!ident@services.net KICK #channel other :Behave",
+    ":irc.server.net 353 me = #channel :@op +voice nick!ident@host.example.org",
+    ":irc.server.net 366 me #channel :End of /NAMES list.",
+    ":irc.server.net 001 me :Welcome to the network me",
+    "PING :irc.server.net",
+]
+
+
+def lines(count, sample=SAMPLE):
+    """Return `count` lines cycling over the sample."""
+    return [sample[i % len(sample)] for i in range(count)]
+
+
+def rate(func, items, repeat=3):
+    """Best items/sec of `repeat` runs of func over items."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def report(title, rows):
+    """Print a small aligned table: rows of (label, value, unit)."""
+    print(title)
+    width = max(len(label) for label, _, _ in rows)
+    for label, value, unit in rows:
+        print("  %s : %12.1f %s" % (label.ljust(width), value, unit))
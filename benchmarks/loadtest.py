@@ -0,0 +1,220 @@
+"""
+End-to-end load tests against the in-process fake IRCd (ircd.py), over real
+loopback sockets:
+  - connect-to-registered latency of many clients
+  - inbound lines/sec a client keeps up with under channel churn
+  - outbound throughput under flood control, without Excess Flood kills
+  - memory growth over a long churn run (--duration, hours if needed)
+After the churn, the member list and statuses of the client must match the
+server's.
+"""
+
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from common import load, report
+
+client = load("client")
+ircd = load("ircd")
+
+
+def bot(port, nick, **options):
+    return client.Client({
+        'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': nick,
+        'auto_reconnect': False, 'flood_control': False, **options,
+    })
+
+
+async def wait_for(predicate, timeout=30):
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(0.005)
+
+
+async def registered(each):
+    """Connect and wait for 001."""
+    done = asyncio.Event()
+    each.on("001", lambda event: done.set())
+    await each.connect()
+    await asyncio.wait_for(done.wait(), 30)
+
+
+def joined(server, name):
+    channel = server.channels.get(name)
+    return channel is not None and len(channel.sessions()) > 0
+
+
+def mismatches(server, each, name):
+    """
+    (members, statuses) : nicks on only one side of the channel, members
+    whose status prefixes differ between the client and the fake IRCd.
+    """
+    expected = {each.casefold(member[0]): member[3] for member in server.channels[name].members.values()}
+    tracked = each.channels[each.casefold(name)].users
+    symbols = each.isupport.status_from_symbol
+    members = len(expected.keys() ^ tracked.keys())
+    statuses = 0
+    for key, prefixes in expected.items():
+        member = tracked.get(key)
+        if member is not None and {symbol for symbol, status in symbols.items() if member.has_status(status)} != set(prefixes):
+            statuses += 1
+    return members, statuses
+
+
+async def stop(server, bots):
+    for each in bots:
+        await each.disconnect()
+    await server.stop()
+
+
+async def registration(clients, password):
+    server = ircd.FakeIRCd(accounts=None)
+    port = await server.start()
+    latencies = []
+    bots = []
+
+    async def connect(index):
+        each = bot(port, "load%d" % (index), password=password, username="load%d" % (index))
+        start = time.perf_counter()
+        each.on("001", lambda event: latencies.append(time.perf_counter() - start))
+        bots.append(each)
+        await each.connect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[connect(index) for index in range(clients)])
+    await wait_for(lambda: len(latencies) == clients)
+    total = time.perf_counter() - start
+    await stop(server, bots)
+
+    latencies.sort()
+    return total, latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+
+
+async def inbound(seconds, users, dispatch):
+    server = ircd.FakeIRCd()
+    port = await server.start()
+    each = bot(port, "reader", dispatch=dispatch)
+    await registered(each)
+    each.channel("#load")
+    await each.join("#load")
+    await wait_for(lambda: joined(server, "#load"))
+
+    before = each.recv_stats()["lines"]
+    start = time.perf_counter()
+    await server.churn("#load", rate=0, users=users, duration=seconds)
+    await wait_for(lambda: each.recv_stats()["lines"] - before >= server.lines_out - 2)
+    elapsed = time.perf_counter() - start
+    lines = each.recv_stats()["lines"] - before
+    await asyncio.sleep(0.1)
+    members = len(each.channels[each.casefold("#load")].users)
+    missing, statuses = mismatches(server, each, "#load")
+    await stop(server, [each])
+    assert not missing and not statuses, "%d members and %d statuses differ from the server" % (missing, statuses)
+    return lines / elapsed, members
+
+
+async def outbound(count, delay, burst):
+    # The server allows exactly what the client bucket lets through.
+    server = ircd.FakeIRCd(flood_penalty=delay, flood_limit=delay * (burst + 2))
+    port = await server.start()
+    each = bot(port, "writer", flood_control=True, flood_delay=delay, flood_burst=burst)
+    await registered(each)
+    await each.join("#load")
+    await wait_for(lambda: joined(server, "#load"))
+
+    before = server.lines_in
+    start = time.perf_counter()
+    for index in range(count):
+        await each.send("PRIVMSG #load :outbound line %d" % (index))
+    await wait_for(lambda: server.lines_in - before >= count or server.flood_kills, timeout=count * delay + 30)
+    elapsed = time.perf_counter() - start
+    sent = server.lines_in - before
+    kills = server.flood_kills
+    await stop(server, [each])
+    return sent / elapsed, kills
+
+
+async def memory(seconds, rate, users, interval, dispatch):
+    server = ircd.FakeIRCd()
+    port = await server.start()
+    each = bot(port, "soak", dispatch=dispatch)
+    each.channel("#load")
+    await registered(each)
+    await each.join("#load")
+    await wait_for(lambda: joined(server, "#load"))
+
+    churn = server.churn("#load", rate=rate, users=users, duration=seconds)
+    await asyncio.sleep(min(interval, seconds))
+    gc.collect()
+    baseline = tracemalloc.take_snapshot()
+    first = tracemalloc.get_traced_memory()[0]
+    samples = [first]
+    while not churn.done():
+        await asyncio.sleep(interval)
+        gc.collect()
+        samples.append(tracemalloc.get_traced_memory()[0])
+    await wait_for(lambda: each.recv_stats()["lines"] >= server.lines_out - 2)
+    await asyncio.sleep(0.1)
+    missing, statuses = mismatches(server, each, "#load")
+    await stop(server, [each])
+    assert not missing and not statuses, "%d members and %d statuses differ from the server" % (missing, statuses)
+
+    top = tracemalloc.take_snapshot().compare_to(baseline, "lineno")[:5]
+    return first, samples[-1], max(samples), len(each.users), top
+
+
+def main():
+    args = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    args.add_argument("--clients", type=int, default=200, help="clients registering at once")
+    args.add_argument("--sasl", action="store_true", help="authenticate every client with SASL PLAIN")
+    args.add_argument("--inbound-seconds", type=float, default=5)
+    args.add_argument("--users", type=int, default=2000, help="fake users in the churned channel")
+    args.add_argument("--lines", type=int, default=2000, help="lines sent in the outbound test")
+    args.add_argument("--flood-delay", type=float, default=0.001)
+    args.add_argument("--flood-burst", type=int, default=10)
+    args.add_argument("--duration", type=float, default=10, help="seconds of the memory test")
+    args.add_argument("--rate", type=int, default=2000, help="churn lines/sec of the memory test")
+    args.add_argument("--interval", type=float, default=1, help="memory sampling interval")
+    args.add_argument("--dispatch", default="task", choices=["task", "inline"], help="dispatch mode of the clients")
+    args.add_argument("--skip", nargs="*", default=[], choices=["register", "inbound", "outbound", "memory"])
+    opts = args.parse_args()
+
+    rows = []
+    if "register" not in opts.skip:
+        total, p50, p99 = asyncio.run(registration(opts.clients, "secret" if opts.sasl else None))
+        rows.append(("%d clients registered" % (opts.clients), total * 1e3, "ms"))
+        rows.append(("connect -> 001 p50", p50 * 1e3, "ms"))
+        rows.append(("connect -> 001 p99", p99 * 1e3, "ms"))
+
+    if "inbound" not in opts.skip:
+        per_sec, members = asyncio.run(inbound(opts.inbound_seconds, opts.users, opts.dispatch))
+        rows.append(("inbound churn", per_sec, "lines/sec"))
+        rows.append(("members tracked at the end", members, "users"))
+
+    if "outbound" not in opts.skip:
+        per_sec, kills = asyncio.run(outbound(opts.lines, opts.flood_delay, opts.flood_burst))
+        rows.append(("outbound, %gs flood delay" % (opts.flood_delay), per_sec, "lines/sec"))
+        rows.append(("Excess Flood kills", kills, ""))
+
+    top = []
+    if "memory" not in opts.skip:
+        tracemalloc.start()
+        first, last, peak, users, top = asyncio.run(memory(opts.duration, opts.rate, opts.users, opts.interval, opts.dispatch))
+        tracemalloc.stop()
+        rows.append(("memory after warmup", first / 1024, "KiB"))
+        rows.append(("memory after %gs" % (opts.duration), last / 1024, "KiB"))
+        rows.append(("memory peak sample", peak / 1024, "KiB"))
+        rows.append(("registry size at the end", users, "users"))
+
+    report("Load test against the fake IRCd", rows)
+    for stat in top:
+        print("  %s" % (stat))
+
+
+if __name__ == "__main__":
+    main()
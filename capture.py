@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import atexit
+import gzip
+import time
+
+from .connection import SendQueue
+from .splitter import split_line, UNKNOWN_SOURCE
+
+"""
+Raw traffic capture and deterministic replay
+
+A capture is a text file (gzip compressed when its name ends with .gz), one
+record per raw IRC line :
+    <I|O> <microseconds since capture start> <raw line>
+"""
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class CaptureWriter:
+    """Record every raw line received (I) and sent (O) by a Connection."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = _open(path, "wb")
+        self.start = time.monotonic()
+        self.lines = 0
+        self._partial = b""
+        atexit.register(self.close)
+
+    def record_in(self, data):
+        """Record a received chunk, incomplete lines wait for the next one."""
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        self._write(b"I", lines)
+
+    def record_out(self, data):
+        """Record written data, made of complete lines."""
+        self._write(b"O", data.split(b"\n")[:-1])
+
+    def _write(self, direction, lines):
+        if not lines or self.file is None:
+            return
+        stamp = b"%d" % (int((time.monotonic() - self.start) * 1e6))
+        self.file.write(b"".join(b"%s %s %s\n" % (direction, stamp, line.rstrip(b"\r")) for line in lines if line))
+        self.lines += len(lines)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_capture(path):
+    """Yield (direction, seconds since start, raw line bytes) from a capture."""
+    with _open(path, "rb") as capture:
+        for record in capture:
+            direction, stamp, line = record.rstrip(b"\n").split(b" ", 2)
+            yield direction.decode(), int(stamp) / 1e6, line
+
+
+class ReplayConnection:
+    """Stands in for Connection during a replay, outgoing lines are only recorded."""
+
+    def __init__(self):
+        self.queue = SendQueue()
+        self.sent = []
+        self.connected = True
+
+    async def send(self, data, priority=None, wait=False, reserved=UNKNOWN_SOURCE):
+        self.sent.extend(split_line(data, reserved))
+
+    async def disconnect(self):
+        self.connected = False
+
+
+def _percentiles(values):
+    values = sorted(values)
+    pick = lambda pct: values[min(len(values) - 1, int(len(values) * pct / 100))]
+    return {"count": len(values), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": values[-1]}
+
+
+async def replay(client, path, realtime=False):
+    """
+    Feed the incoming lines of a capture to client.on_data, without socket.
+    realtime=True keeps the original pacing, otherwise lines are fed as fast
+    as possible. Handler latency is only measured for listeners run by
+    on_data, use the 'inline' dispatch mode to include every listener.
+
+    Return a report : lines/sec, latency percentiles per command (seconds),
+    lines the client sent, and the final channel/user state.
+    """
+    client.connection = ReplayConnection()
+    client.connected = True
+    client.eventloop = asyncio.get_running_loop()
+    parser = client.parser
+
+    latencies = {}
+    lines = 0
+    captured_out = 0
+    start = time.perf_counter()
+
+    for direction, stamp, line in read_capture(path):
+        if direction != "I":
+            captured_out += 1
+            continue
+        if realtime:
+            delay = stamp - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        command = parser.scan(line.decode("latin-1"))[2].upper()
+        begin = time.perf_counter()
+        await client.on_data(line + b"\r\n")
+        latencies.setdefault(command, []).append(time.perf_counter() - begin)
+        lines += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        "lines": lines,
+        "elapsed": elapsed,
+        "lines_per_sec": lines / elapsed if elapsed else 0,
+        "latency": {command: _percentiles(values) for command, values in sorted(latencies.items())},
+        "sent": len(client.connection.sent),
+        "captured_sent": captured_out,
+        "state": state(client),
+    }
+
+
+def state(client):
+    """Channel members with their status, and the registry size."""
+    return {
+        "channels": {
+            name: {member.user.nick: member.statuses() for member in channel.users.values()}
+            for name, channel in sorted(client.channels.items())
+        },
+        "users": len(client.users),
+    }
+
+
+def main():
+    from .client import Client
+
+    args = argparse.ArgumentParser(description="Replay a capture through Client.on_data.")
+    args.add_argument("capture")
+    args.add_argument("--realtime", action="store_true", help="keep the original pacing")
+    args.add_argument("--dispatch", default="inline", choices=["inline", "task"])
+    args.add_argument("--channel", action="append", default=[], help="track this channel")
+    args.add_argument("--state", action="store_true", help="print the final channel state")
+    opts = args.parse_args()
+
+    async def run():
+        client = Client({'dispatch': opts.dispatch})
+        for name in opts.channel:
+            client.channel(name)
+        return await replay(client, opts.capture, realtime=opts.realtime)
+
+    report = asyncio.run(run())
+    print("%d lines in %.3fs : %.1f lines/sec, %d lines sent (%d in capture)" % (
+        report["lines"], report["elapsed"], report["lines_per_sec"], report["sent"], report["captured_sent"]))
+    for command, stats in report["latency"].items():
+        print("  %-12s n=%-8d p50=%8.1fus p90=%8.1fus p99=%8.1fus max=%8.1fus" % (
+            command, stats["count"], stats["p50"] * 1e6, stats["p90"] * 1e6, stats["p99"] * 1e6, stats["max"] * 1e6))
+    if opts.state:
+        for name, members in report["state"]["channels"].items():
+            print("  %s : %d members" % (name, len(members)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import asyncio
 
+from .user import Member
+from .hostmask import MaskIndex
+
 """ Channel class helper """
 
 class Channel:
@@ -9,12 +12,20 @@ class Channel:
     VOICE = 1
     HALFOP = 2
     OP = 3
+    ADMIN = 4
+    OWNER = 5
+    # Other PREFIX modes of the server get the following values, see ISupport.
 
     def __init__(self, client, name, key=None):
         self.client = client
-        self.name = name.lower()
+        self.display_name = name # As given, folded again when the casemapping changes
+        self.name = client.casefold(name)
         self.key = key
         self.users = {}
+        self._names = None
+        self.synced = False # True once the member list comes from NAMES, see snapshot.py
+        self.bans = MaskIndex(client.casefold) # Filled from 367/368 and MODE +b/-b, data : (setter, time)
+        self._bans = None
 
         self.client.on("join%s" % (self.name), self.join_event)
         self.client.on("part%s" % (self.name), self.part_event)
@@ -23,6 +34,11 @@ class Channel:
         self.client.on("nick%s" % (self.name), self.nick_event)
         self.client.on("kick%s" % (self.name), self.kick_event)
         self.client.on("353%s" % (self.name), self.names_event)
+        self.client.on("366%s" % (self.name), self.end_of_names_event)
+        self.client.on("367%s" % (self.name), self.banlist_event)
+        self.client.on("368%s" % (self.name), self.end_of_banlist_event)
+        self.client.on("netsplit%s" % (self.name), self.netsplit_event)
+        self.client.on("netjoin%s" % (self.name), self.netjoin_event)
     
     """ Public methods """
         
@@ -33,129 +49,224 @@ class Channel:
         asyncio.create_task(self.client.part(self.name, message))
 
     def is_op(self, nick):
-        if nick.lower() in self.users:
-            return self.OP in self.users[nick.lower()].get('status')
+        if self.client.casefold(nick) in self.users:
+            return self.users[self.client.casefold(nick)].has_status(self.OP)
         return False
 
     def is_halfop(self, nick):
-        if nick.lower() in self.users:
-            return self.HALFOP in self.users[nick.lower()].get('status')
+        if self.client.casefold(nick) in self.users:
+            return self.users[self.client.casefold(nick)].has_status(self.HALFOP)
         return False
     
     def is_voice(self, nick):
-        if nick.lower() in self.users:
-            return self.VOICE in self.users[nick.lower()].get('status')
+        if self.client.casefold(nick) in self.users:
+            return self.users[self.client.casefold(nick)].has_status(self.VOICE)
         return False
 
+    def is_banned(self, nick, ident=None, host=None):
+        """
+        Bans matching a user (nick, ident, host or nick!ident@host), the
+        ident and host are taken from the registry when only a nick is given.
+        """
+        if ident is None and host is None and "!" not in nick:
+            user = self.client.users.get(nick)
+            if user is None:
+                return []
+            nick, ident, host = user.nick, user.ident, user.host
+        return [item.mask for item in self.bans.match(nick, ident, host)]
+
+    def request_bans(self):
+        """Ask the server for the ban list, self.bans is replaced on 368."""
+        asyncio.create_task(self.client.send("MODE %s +b" % (self.name)))
+
+    def set_casefold(self, casefold):
+        """Fold the name, members and bans again for a new casemapping, see Client.refold."""
+        self.name = casefold(self.display_name)
+        self.users = {casefold(member.user.nick): member for member in self.users.values()}
+        if self._names:
+            self._names = {casefold(user[0]): user for user in self._names.values()}
+        self.bans.set_casefold(casefold)
+
     def is_on(self, nick):
-        return nick.lower() in self.users
+        return self.client.casefold(nick) in self.users
 
     def get_userlist(self):
         return self.users
     
     def get_user_status(self, nick):
-        nick = nick.lower()
+        nick = self.client.casefold(nick)
         if self.is_on(nick):
             return self.users[nick].get('status')
         return []
     
     """ Event """
+    # Plain functions, so the member list is updated in the order lines are received.
 
-    async def join_event(self, event):
+    def join_event(self, event):
         nick, ident, host = event.get('from')
-        user = Channel.User({
-            'nick': nick.lower(), 
-            'ident': ident, 
-            'host': host,
-            'status': []
-            })
-        if user.get('nick') not in self.users:
-            self.users[user.get('nick')] = user
-
-    async def part_event(self, event):
+        if self.client.casefold(nick) not in self.users:
+            self._add_member(nick, ident, host)
+        if self.client.opt.get('fetch_bans') and self.client.casefold(nick) == self.client.casefold(self.client.opt.get('nickname')):
+            self.request_bans()
+
+    def part_event(self, event):
         nick, ident, host = event.get('from')
-        if nick.lower() in self.users:
-            del self.users[nick.lower()]
+        self._remove_member(nick)
 
-    async def nick_event(self, event):
+    def nick_event(self, event):
         nick, ident, host = event.get('from')
-        new_nick = event.get('msg').lower()
+        new_nick = self.client.casefold(event.get('msg'))
         if self.is_on(nick):
-            copy = self.users[nick.lower()]
-            copy.add('nick', new_nick)
-            self.users[new_nick] = copy
-            del self.users[nick.lower()]
+            self.users[new_nick] = self.users.pop(self.client.casefold(nick))
 
-    async def kick_event(self, event):
-        nick = event.get('target').lower()
-        if self.is_on(nick):
-            if nick in self.users:
-                del self.users[nick]
+    def kick_event(self, event):
+        self._remove_member(event.get('target'))
 
-    async def quit_event(self, event):
+    def quit_event(self, event):
         nick, ident, host = event.get('from')
-        if self.is_on(nick):
-            del self.users[nick.lower()]
+        self._remove_member(nick)
+
+    def netsplit_event(self, batch, nicks):
+        """Every QUIT of a netsplit batch at once, BatchTracker drops the users from the registry."""
+        users = self.users
+        casefold = self.client.casefold
+        for nick in nicks:
+            users.pop(casefold(nick), None)
 
-    async def mode_event(self, event):
+    def netjoin_event(self, batch, events):
+        for event in events:
+            nick, ident, host = event.get('from')
+            if self.client.casefold(nick) not in self.users:
+                self._add_member(nick, ident, host)
+
+    def mode_event(self, event):
         if event.get('channel'):
-            modes = self._parse_status_from_mode(event.get('msg'))
-            for is_giving, status, nick in modes:
-                self._update_user_status(is_giving, status, nick.lower())
+            # Servers set modes too (netjoin, services), they have no nick.
+            setter = event.sender[0] if event.sender else event.source
+            for is_giving, letter, param in self._parse_modes(event.get('msg')):
+                status = self._get_status_from_letter(letter)
+                if status:
+                    self._update_user_status(is_giving, status, self.client.casefold(param))
+                elif letter == "b":
+                    if is_giving:
+                        self.bans.add(param, (setter, None))
+                    else:
+                        self.bans.remove(param)
         
-    async def names_event(self, event):
-        users = self._parse_users_from_names(event.get('msg'))
-        for user in users:
-            if user.get('nick') not in self.users:
-                self.users[user.get('nick')] = user
+    def names_event(self, event):
+        """353 replies are collected aside, self.users is replaced on 366."""
+        if self._names is None:
+            self._names = {}
+        casefold = self.client.casefold
+        for user in self._parse_users_from_names(event.get('msg')):
+            self._names[casefold(user[0])] = user
+
+    def end_of_names_event(self, event):
+        """
+        Swap in the member list collected from 353 and emit
+        names<channel> (event, joined nicks, left nicks).
+        """
+        names = self._names or {}
+        self._names = None
+        registry = self.client.users
+        old = self.users
+        users = {}
+        joined = []
+
+        for key, (nick, ident, host, status) in names.items():
+            member = old.get(key)
+            if member is None:
+                user = registry.add(nick, ident, host)
+                registry.join(user, self.name)
+                member = Member(user, status)
+                joined.append(nick)
+            else:
+                registry.add(nick, ident, host)
+                member.status = status
+            users[key] = member
+
+        left = [member.user.nick for key, member in old.items() if key not in users]
+        for key in old.keys() - users.keys():
+            registry.part(old[key].user, self.name)
+
+        self.users = users
+        self.synced = True
+        self.client.emit("names%s" % (self.name), event, joined, left)
     
+    def banlist_event(self, event):
+        """367 replies are collected aside, self.bans is replaced on 368."""
+        if self._bans is None:
+            self._bans = MaskIndex(self.client.casefold)
+        params = event.get('params')
+        if len(params) > 2:
+            self._bans.add(params[2], (params[3] if len(params) > 3 else None, params[4] if len(params) > 4 else None))
+
+    def end_of_banlist_event(self, event):
+        self.bans = self._bans or MaskIndex(self.client.casefold)
+        self._bans = None
+        self.client.emit("bans%s" % (self.name), event, self.bans)
+
     """ Private methods """
 
-    def _parse_status_from_mode(self, event_message):
-        modes, users = event_message.split(" ", 1)
-        users = users.split()
-        users.reverse()
+    def _add_member(self, nick, ident, host, status=0):
+        user = self.client.users.add(nick, ident, host)
+        self.client.users.join(user, self.name)
+        member = Member(user, status)
+        self.users[self.client.casefold(nick)] = member
+        return member
+
+    def _remove_member(self, nick):
+        member = self.users.pop(self.client.casefold(nick), None)
+        if member is not None:
+            self.client.users.part(member.user, self.name)
 
-        users_status = []
+    def _parse_modes(self, event_message):
+        """Return (adding, letter, param) for the modes taking a parameter."""
+        modes, _, params = event_message.partition(" ")
+        params = params.split()
+        params.reverse()
+        isupport = self.client.isupport
+
+        changes = []
+        add = True
 
         for token in modes:
             if token == "+":
                 add = True
             elif token == "-":
                 add = False
-            else:
-                status = self._get_status_from_letter(token)
-                if status:
-                    users_status.append((add, status, users.pop()))
-        return users_status
+            elif isupport.takes_param(token, add) and params:
+                changes.append((add, token, params.pop()))
+        return changes
 
 
     def _parse_users_from_names(self, event_message):
-        names = event_message.lower().split()
+        """
+        Return a list of (nick, ident, host, status bitmask), each entry is
+        read once (multi-prefix and userhost-in-names).
+        """
         users = []
+        statuses = self.client.isupport.status_from_symbol
+
+        for entry in event_message.split():
+            status = 0
+            start = 0
+            while start < len(entry) and entry[start] in statuses:
+                status |= 1 << statuses[entry[start]]
+                start += 1
 
-        for user in names:
-            current_user = Channel.User(self._get_user(user))
-            if self._has_status_symbol(current_user.get('nick')):
-                current_user.add('status', [self._get_status_from_nick(current_user.get('nick'))])
-                current_user.add('nick', self._strip_status_symbol_from_nick(current_user.get('nick')))
+            bang = entry.find("!", start)
+            if bang == -1:
+                users.append((entry[start:], None, None, status))
+                continue
+            at = entry.find("@", bang)
+            if at == -1:
+                users.append((entry[start:bang], entry[bang + 1:] or None, None, status))
             else:
-                current_user.add('status', [])
-            users.append(current_user)
+                users.append((entry[start:bang], entry[bang + 1:at] or None, entry[at + 1:] or None, status))
         
         return users
 
-    def _get_user(self, user):
-        return {
-            "nick": user.split("!")[0],
-            "ident": user.split("!")[1].split("@")[0],
-            "host": user.split("!")[1].split("@")[1].split()[0],
-        } 
-    
-    def _has_status_symbol(self, nick):
-        if nick[0] in '+%@':
-            return True
-    
     def _update_user_status(self, is_giving, status, nick):
         if nick in self.users:
             if is_giving:
@@ -164,51 +275,13 @@ class Channel:
                 self._remove_status(nick, status)
     
     def _has_status(self, nick, status):
-        return status in self.users[nick].get('status')
+        return self.users[nick].has_status(status)
     
     def _giving_status(self, nick, status):
-        if not self._has_status(nick, status):
-            self.users[nick].get('status').append(status)
+        self.users[nick].give_status(status)
 
     def _remove_status(self, nick, status):
-        if self._has_status(nick, status):
-            self.users[nick].get('status').remove(status)
-
-    def _get_status_from_symbol(self, symbol):
-        if symbol == '+':
-            return self.VOICE
-        elif symbol == '%':
-            return self.HALFOP
-        elif symbol == '@':
-            return self.OP
-    
-    def _get_status_from_letter(self, letter):
-        letter = letter.lower()
-        if letter == 'v':
-            return self.VOICE
-        elif letter == 'h':
-            return self.HALFOP
-        elif letter == 'o':
-            return self.OP
-        else:
-            return None
-    
-    def _get_status_from_nick(self, nick):
-        return self._get_status_from_symbol(nick[0])
-    
-    def _strip_status_symbol_from_nick(self, nick):
-        return nick[1:]
+        self.users[nick].remove_status(status)
 
-    """ Wrapprer for individual user """
-    class User:
-        def __init__(self, user):
-            self.user = user
-
-        def get(self, key):
-            return self.user[key]
-
-        def add(self, key, value):
-            self.user[key] = value
-
-        def has(self, key):
-            return key in self.user
\ No newline at end of file
+    def _get_status_from_letter(self, letter):
+        return self.client.isupport.status_from_letter.get(letter)
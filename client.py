@@ -1,9 +1,24 @@
-from .logger import Logger
-from .connection import Connection
+from .logger import Logger, StreamSink, FileSink
+from .connection import Connection, LineBuffer
 from .parser import Parser
 from .channel import Channel
+from .user import UserRegistry
+from .dispatcher import Dispatcher
+from .isupport import ISupport
+from .reconnect import Reconnector
+from .capture import CaptureWriter
+from .metrics import Metrics, module_of
+from .policy import Policy
+from .commands import CommandRouter
+from .loader import ModuleLoader
+from .snapshot import Snapshot
+from .usercache import UserCache
+from .replies import RequestTracker
+from .batch import BatchTracker
+from .splitter import MessageSplitter
 
 import asyncio
+import sqlite3
 import traceback
 import base64
 import importlib
@@ -12,6 +27,9 @@ import os
 import sys
 import time
 
+# Classes found in each loaded module, shared by every Client of the process.
+_module_classes = {}
+
 DEFAULT_OPTIONS = {
     'nickname': 'IRCBot',
     'username': 'PyDev',
@@ -21,13 +39,51 @@ DEFAULT_OPTIONS = {
     'ssl': True,
     'password': None,
     'cap': [], # Request IRCv3 capabilities
+    'casefold_cache': 4096, # Size of the LRU cache of casefolded nicks/channels
     'sasl_fail': True, # Continue connect if sasl fail
     'auto_reconnect': True,
-    'retry_count': 5, 
-    'retry_delay': 5, # Delay in seconde
+    'retry_count': 5, # Attempts before giving up, 0 to retry forever
+    'retry_delay': 5, # Delay in seconde, doubled on each attempt...
+    'retry_max_delay': 300, # ...up to retry_max_delay
+    'retry_jitter': 0.5, # Delays are randomly shortened by up to this ratio
+    'ping_interval': 120, # Send a PING after this many idle seconds, disconnect if still silent after as many
+    'flood_control': True, # Token bucket on outgoing lines
+    'flood_delay': 2, # One line every flood_delay seconds...
+    'flood_burst': 10, # ...after a burst of flood_burst lines
+    'coalesce': False, # Write lines queued within flush_window in a single buffer
+    'flush_window': 0, # Seconds, 0 : lines queued until the next loop iteration
+    'flush_bytes': 4096, # Max bytes written at once when coalescing
     'commands': [],
+    'snapshot': None, # Save the channels, members, bans and ISUPPORT to this SQLite file and restore them on start
+    'snapshot_interval': 300, # Seconds between two snapshots
+    'user_cache_ttl': 600, # Seconds a WHO/WHOX result stays in Client.usercache
+    'user_cache_size': 10000, # Users kept in Client.usercache, least recently used evicted first
+    'request_timeout': 30, # Seconds Client.request waits for the end reply
+    'who_timeout': 30, # Seconds before a WHO without end reply is given up
+    'fetch_bans': False, # Request the ban list of a channel when joining it (Channel.bans)
+    'command_prefix': '!', # Prefix (or list of prefixes) of the bot commands, see commands.py
+    'command_user_rate': None, # (count, seconds) : bot commands allowed per user, all commands included
+    'encoding': 'utf-8',
+    'fallback_encoding': 'latin-1', # Used when a line is not valid in encoding, None to drop it
+    'capture': None, # Record the raw traffic to this file (.gz to compress), see capture.py
+    'metrics': False, # Count lines, time parsing, listeners and socket drains, see metrics.py
+    'metrics_port': None, # Serve /metrics (Prometheus text) and /metrics.json on 127.0.0.1:metrics_port
+    'slow_listener': 0.1, # With metrics, warn about listeners running longer than this many seconds
     'debug': False,
+    'logger': None, # Logger instance to use (ex: shared by a ClientPool), built from the log_* options otherwise
+    'log_level': 'info', # debug, info, warn or error ('debug' when debug is set)
+    'log_json': False, # JSON lines instead of text
+    'log_file': None, # Also write to this file...
+    'log_file_max_bytes': 10485760, # ...rotated past this size
+    'log_file_backups': 5,
+    'trace_sample': 1, # Debug RAW/PARSED traces : keep one line every trace_sample...
+    'trace_rate': 100, # ...and at most trace_rate per second (0 : no limit)
+    'dispatch': 'task', # 'task' : one Task per listener, 'inline' : run listeners in order (see Dispatcher)
+    'policies': {}, # Module name -> Policy or dict of Policy arguments (concurrency, timeout, queue, overflow)
     'modules': 'modules', # Modules directory replace / by . path from root : path.to.folder 
+    'module_loading': 'sync', # 'sync' : load the scripts before connecting, 'background' or 'lazy' : connect first (see ModuleLoader)
+    'module_manifest': None, # Events (and required scripts) of each script for the 'lazy' mode, dict or JSON file path
+    'watch_modules': 0, # Check the module files every watch_modules seconds and reload the changed ones (0 : off)
     'scripts': [] # list of modules to load. Order may be important (for dependancies)
 }
 
@@ -39,26 +95,57 @@ class Client:
     def __init__(self, options):
         self.opt = {**DEFAULT_OPTIONS, **options}
 
-        self.log = Logger()
-        self.parser = Parser()
+        self.log = self.opt.get('logger') or self.create_logger()
+        self.isupport = ISupport(self.opt.get('casefold_cache'))
+        self.parser = Parser(self.isupport.chantypes)
 
         if self.opt.get('debug'):
             self.log.info(self.opt)
 
-        self.opt['cap'] = self.opt.get('cap') + [x for x in ["extended-join", "sasl", "userhost-in-names"] if x not in self.opt.get('cap')]
+        self.opt['cap'] = self.opt.get('cap') + [x for x in ["extended-join", "sasl", "userhost-in-names", "multi-prefix", "account-notify", "chghost", "batch", "labeled-response", "server-time", "draft/chathistory"] if x not in self.opt.get('cap')]
 
         self.modules = {}
         self.activeCAP = []
+        self._advertised = []
         self.connected = False
         self.channels = {}
+        self.users = UserRegistry(self.casefold)
 
         self.connection = None
-        self.buffr = ""
-        self._events = {}
+        self.buffr = LineBuffer(tuple(x for x in [self.opt.get('encoding'), self.opt.get('fallback_encoding')] if x))
+        self.dispatcher = Dispatcher(self.opt.get('dispatch'), self.isupport.chantypes, on_error=self.listener_failed)
+        self._events = self.dispatcher.events
         self._modules = {}
-        self._retry_count = 0
-
-        self.eventloop = asyncio.get_event_loop()
+        self._listeners = {} # Module name -> [(event, listener)] registered by the module
+        self._loading = None
+        self._watcher = None
+
+        self.metrics = None
+        accept = None if self.opt.get('debug') else self.dispatcher.wants
+        if self.opt.get('metrics'):
+            self.metrics = Metrics(self.opt.get('slow_listener'), self.log)
+            self.metrics.source("send", self.send_stats)
+            self.metrics.source("recv", self.recv_stats)
+            self.dispatcher.metrics = self.metrics
+            accept = self.metrics.counting(accept)
+        self._accept = accept
+
+        self.router = CommandRouter(self, self.opt.get('command_prefix'), self.opt.get('command_user_rate'))
+        self.replies = RequestTracker(self, self.opt.get('request_timeout'))
+        self.batches = BatchTracker(self, self.opt.get('request_timeout'))
+        self.splitter = MessageSplitter(self)
+        self.usercache = UserCache(self, self.opt.get('user_cache_ttl'), self.opt.get('user_cache_size'), self.opt.get('who_timeout'))
+        if self.metrics:
+            self.metrics.source("usercache", self.usercache.stats)
+
+        self._session = None
+        self.reconnector = Reconnector(
+            self, self.opt.get('retry_delay'), self.opt.get('retry_max_delay'),
+            self.opt.get('retry_count'), self.opt.get('retry_jitter'),
+        )
+
+        # Set by run() or connect(), a Client does not own a loop until then.
+        self.eventloop = None
 
         self.on("connecting", self.connecting)
         self.on("ping", self.pong)
@@ -67,44 +154,189 @@ class Client:
         self.on("903", self.auth_success)
         self.on("904", self.auth_failled)
         self.on("001", self.registered)
+        self.on("005", self.isupport_event)
         self.on("nick", self.nick_event)
         self.on("quit", self.quit_event)
         self.on("closing link", self.disconnected)
 
-        self.load_modules()
+        self.snapshot = None
+        self._restored = 0
+        self._snapshot_task = None
+        if self.opt.get('snapshot'):
+            self.snapshot = Snapshot(self.opt.get('snapshot'))
+            self._restored = self.snapshot.load(self)
+
+        self.loader = ModuleLoader(self, self.opt.get('module_loading'), self.opt.get('module_manifest'))
+        if self.loader.mode == "sync":
+            self.load_modules()
+
+    def create_logger(self):
+        sinks = [StreamSink()]
+        if self.opt.get('log_file'):
+            sinks.append(FileSink(self.opt.get('log_file'), self.opt.get('log_file_max_bytes'), self.opt.get('log_file_backups')))
+        return Logger(
+            'debug' if self.opt.get('debug') else self.opt.get('log_level'), sinks,
+            structured=self.opt.get('log_json'),
+            trace_sample=self.opt.get('trace_sample'), trace_rate=self.opt.get('trace_rate'),
+        )
 
     """ Channels & userlist """
 
+    def casefold(self, name):
+        """Casefold a nick or channel name with the server CASEMAPPING."""
+        return self.isupport.casefold(name)
+
     def channel(self, name):
         channel = Channel(self, name)
-        self.channels[name] = channel
-        return Channel(self, name)
+        self.channels[channel.name] = channel
+        return channel
 
     """ Modules loader """
 
     def load_modules(self):
-        root = os.path.dirname(os.path.dirname(__file__))
-        pwd = os.path.join(root, self.opt.get('modules'))
-        for module in self.opt.get('scripts'): 
-            if module[-3:] != '.py':
-                self.log.warn("Le module %s n'est pas un fichier python" % (module))
-                continue
-            name = module[:-3]
-            modulePath = '%s.%s' % (self.opt.get('modules'), name)
-            loaded = importlib.import_module(modulePath)
-            self.init_module(modulePath, loaded)
+        """Import and instantiate every script now, see ModuleLoader for the other modes."""
+        self.loader.load_all()
     
     def init_module(self, modulePath, module):
-        for name, obj in inspect.getmembers(module):
-            if inspect.isclass(obj):
-                if obj.__module__ == modulePath:
-                    if name.lower() not in self.modules:
-                        self.modules[name.lower()] = obj(self)
-                        self._modules[name.lower()] = module
-    
+        if _module_classes.get(modulePath, (None,))[0] is not module:
+            _module_classes[modulePath] = (module, [
+                (name, obj) for name, obj in inspect.getmembers(module, inspect.isclass)
+                if obj.__module__ == modulePath
+            ])
+        for name, obj in _module_classes[modulePath][1]:
+            if name.lower() not in self.modules:
+                # Listeners registered while the class is instantiated belong to it,
+                # and run under its policy from the start.
+                policy = self.opt.get('policies').get(name.lower())
+                if policy:
+                    self.set_policy(name, policy)
+                self._loading = (name.lower(), obj)
+                try:
+                    self.modules[name.lower()] = obj(self)
+                finally:
+                    self._loading = None
+                self._modules[name.lower()] = module
+
+    def unload_module(self, name):
+        """
+        Remove a module instance and every listener (and command) it
+        registered. Its optional unload() method is called first.
+        """
+        name = name.lower()
+        instance = self.modules.pop(name, None)
+        self._modules.pop(name, None)
+        if instance is None:
+            return None
+        self._call_unload(instance)
+        self._remove_listeners(name)
+        self.dispatcher.set_policy(name, None)
+        return instance
+
+    def _call_unload(self, instance):
+        if hasattr(instance, "unload"):
+            result = instance.unload()
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+
+    def _remove_listeners(self, name):
+        for event, listener in self._listeners.pop(name, ()):
+            if event.startswith("command:"):
+                self.router.remove(event[8:], listener)
+            else:
+                self.dispatcher.remove(event, listener)
+
+    def _detach_module(self, name):
+        """
+        Take a module out as unload_module does, without calling its unload(),
+        and return what _attach_module needs to put it back as it was.
+        """
+        listeners = [(event, listener, self.dispatcher.is_task(listener)) for event, listener in self._listeners.get(name, ())]
+        commands = self.router.export({event for event, _, _ in listeners if event.startswith("command:")})
+        instance = self.modules.pop(name)
+        module = self._modules.pop(name)
+        policy = self.dispatcher.policy_of_owner(name)
+        self._remove_listeners(name)
+        self.dispatcher.set_policy(name, None)
+        return name, instance, module, listeners, commands, policy
+
+    def _attach_module(self, detached):
+        name, instance, module, listeners, commands, policy = detached
+        self.modules[name] = instance
+        self._modules[name] = module
+        self.router.restore(commands)
+        for event, listener, task in listeners:
+            self.dispatcher.on(event, listener, task=task, owner=name)
+        self._listeners[name] = [(event, listener) for event, listener, _ in listeners]
+        if policy is not None:
+            self.dispatcher.set_policy(name, policy)
+
+    def reload_module(self, name):
+        """
+        Reload the source file of a module and re-instantiate its classes,
+        without reconnecting. State goes from the optional save_state() of the
+        old instance to restore_state(state) of the new one. The old instances
+        stay in place if the file fails to import or its classes fail to
+        instantiate, their unload() is called once the new ones are in.
+        Return the reloaded names.
+        """
+        module = self._modules.get(name.lower())
+        if module is None:
+            return []
+        names = [each for each, loaded in self._modules.items() if loaded is module]
+        states = {each: self.modules[each].save_state() for each in names if hasattr(self.modules[each], "save_state")}
+
+        try:
+            module = importlib.reload(module)
+        except Exception as exc:
+            self.log.error("Reloading %s failed, keeping the loaded version : %r", module.__name__, exc)
+            return []
+
+        # The old instances go back in place if the new ones fail to instantiate.
+        detached = [self._detach_module(each) for each in names]
+        _module_classes.pop(module.__name__, None)
+        try:
+            self.init_module(module.__name__, module)
+        except Exception as exc:
+            self.log.error("Reloading %s failed, keeping the loaded version : %r", module.__name__, exc)
+            for each, _ in _module_classes.get(module.__name__, (None, []))[1]:
+                each = each.lower()
+                if self._modules.get(each) is module:
+                    self.unload_module(each)
+                else:
+                    # Instantiation failed, drop the listeners registered before the error.
+                    self._remove_listeners(each)
+            for each in detached:
+                self._attach_module(each)
+            return []
+        for each in detached:
+            self._call_unload(each[1])
+
+        for each, state in states.items():
+            instance = self.modules.get(each)
+            if instance is not None and hasattr(instance, "restore_state"):
+                instance.restore_state(state)
+        self.log.info("Reloaded %s (%s)", module.__name__, ", ".join(names))
+        return names
+
     def reload_all(self):
-        for module in self._modules:
-            self._modules[module] = importlib.reload(self._modules[module])
+        for module in {loaded.__name__: name for name, loaded in self._modules.items()}.values():
+            self.reload_module(module)
+
+    async def watch_modules(self, interval=1):
+        """Reload the modules whose file changed, checked every interval seconds."""
+        mtimes = {}
+        while True:
+            for name, module in list(self._modules.items()):
+                path = getattr(module, "__file__", None)
+                try:
+                    mtime = os.stat(path).st_mtime if path else None
+                except OSError:
+                    continue
+                previous = mtimes.get(module.__name__)
+                mtimes[module.__name__] = mtime
+                if previous is not None and mtime != previous:
+                    self.reload_module(name)
+            await asyncio.sleep(interval)
 
     def get_module(self, name):
         if name.lower() in self.modules:
@@ -115,6 +347,8 @@ class Client:
 
     def run(self):
         """Connect and run client in event loop."""
+        self.eventloop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.eventloop)
         self.eventloop.run_until_complete(self.connect())
         try:
             self.eventloop.run_forever()
@@ -127,63 +361,150 @@ class Client:
             self.log.error("Argument hostname or port missing")
             return
 
+        self.eventloop = asyncio.get_running_loop()
+
         # Disconnect from current connection.
         if self.connected:
-            await self.disconnect()
+            await self._close()
 
         # Create socket
         if not self.connection:
-            self.connection = Connection(self.opt.get('hostname'), self.opt.get('port'), self.opt.get('ssl'), eventloop=self.eventloop)
+            self.connection = Connection(
+                self.opt.get('hostname'), self.opt.get('port'), self.opt.get('ssl'), eventloop=self.eventloop,
+                flood_control=self.opt.get('flood_control'), flood_delay=self.opt.get('flood_delay'), flood_burst=self.opt.get('flood_burst'),
+                coalesce=self.opt.get('coalesce'), flush_window=self.opt.get('flush_window'), flush_bytes=self.opt.get('flush_bytes'),
+                capture=CaptureWriter(self.opt.get('capture')) if self.opt.get('capture') else None,
+                metrics=self.metrics,
+            )
+
+        if self.metrics and self.opt.get('metrics_port') and not self.metrics.server:
+            await self.metrics.serve(port=self.opt.get('metrics_port'))
+
+        if self.opt.get('watch_modules') and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.create_task(self.watch_modules(self.opt.get('watch_modules')))
 
-        # Connect.
+        if self.snapshot and (self._snapshot_task is None or self._snapshot_task.done()):
+            self._snapshot_task = asyncio.create_task(self.snapshot_forever(self.opt.get('snapshot_interval')))
+
+        # Connect, a partial line of the previous connection must not prefix the first one.
         if not self.connection.connected:
+            self.buffr.reset()
+            # Lines queued while disconnected wait for the registration.
+            self.connection.queue.hold()
             await self.connection.connect()
 
         self.connected = True
+        self.activeCAP = []
+        self._advertised = []
+        self._session = object()
         self.emit("connecting", None)
+        self.loader.start()
+
+        self.eventloop.create_task(self.handle_forever(self._session))
 
-        self.eventloop.create_task(self.handle_forever())
+    async def save_snapshot(self):
+        """Write the snapshot file now."""
+        if self.snapshot:
+            await self.snapshot.save(self)
+
+    async def snapshot_forever(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save_snapshot()
+            except (OSError, sqlite3.Error) as exc:
+                self.log.error("Snapshot failed : %r", exc)
+
+    def stop_capture(self):
+        """Close the traffic capture file."""
+        if self.connection and self.connection.capture:
+            self.connection.capture.close()
+            self.connection.capture = None
+
+    def health(self):
+        """Summary of the client state, see ClientPool.health."""
+        return {
+            'connected': self.connected,
+            'hostname': self.opt.get('hostname'),
+            'nickname': self.opt.get('nickname'),
+            'channels': len(self.channels),
+            'users': len(self.users),
+            'reconnect': self.reconnector.stats(),
+            'send': self.send_stats(),
+            'recv': self.recv_stats(),
+        }
 
     async def disconnect(self):
-        """Disconnect from server."""
+        """Disconnect from server, a pending reconnect is cancelled."""
+        self.reconnector.stop()
+        await self._close()
+
+    async def _close(self):
+        self._session = None
         if self.connected:
             await self.connection.disconnect()
             self.connected = False
 
-    async def handle_forever(self):
-        """Handle data forever."""
-        while self.connected:
+    async def handle_forever(self, session):
+        """Handle data forever, PING the server when it stays silent."""
+        pinged = False
+        while self._session is session:
             try:
-                data = await self.connection.recv()
+                data = await self.connection.recv(timeout=self.opt.get('ping_interval') or None)
             except asyncio.TimeoutError:
+                if not pinged:
+                    pinged = True
+                    await self.send("PING :%d" % (time.time()))
+                    continue
+                if self.opt.get('debug'): self.log.info('Connection timed out.')
+                data = None
+            except (ConnectionError, OSError) as exc:
+                # Reset by peer, broken pipe... handled as the end of the stream.
+                if self.opt.get('debug'): self.log.info('Connection lost : %r' % (exc))
                 data = None
 
+            if self._session is not session:
+                break
             if not data:
-                if self.connected:
-                    await self.disconnect()
+                await self.connection_lost()
                 break
 
+            pinged = False
             await self.on_data(data)
 
+    async def connection_lost(self):
+        """Drop the connection and reconnect if enabled."""
+        await self._close()
+        self.emit("disconnected", None)
+        if self.opt.get('auto_reconnect'):
+            if self.opt.get('debug'): self.log.info('Reconnecting...')
+            self.reconnector.start()
+
     async def on_data(self, data):
-        try:
-            self.buffr += str(data, "UTF-8")
-        except:
-            pass
-        lines = self.buffr.split("\n")
-        self.buffr = lines.pop()
-        for line in lines:
+        batches = self.batches
+        for line in self.buffr.feed(data):
             try:
-                e = self.parser.parse(line.rstrip())
+                # Inside a batch every line is parsed, the batch may collect it.
+                accept = None if batches.open else self._accept
+                if self.metrics is None:
+                    e = self.parser.parse(line, accept=accept)
+                else:
+                    start = time.perf_counter()
+                    e = self.parser.parse(line, accept=accept)
+                    self.metrics.parsed(time.perf_counter() - start)
+                if e is None:
+                    continue
+                if batches.open and batches.collect(e):
+                    continue
 
                 if e.has("channel") and e.get("channel"):
-                    self.emit("%s%s" % (e.get("action"), e.get("channel").lower()), e)
+                    await self.dispatcher.dispatch("%s%s" % (e.get("action"), self.casefold(e.get("channel"))), e)
 
-                self.emit(e.get("action"), e)
+                await self.dispatcher.dispatch(e.get("action"), e)
 
-                if self.opt.get('debug'):
-                    self.log.info("RAW : %s" % (line))
-                    self.log.info("PARSED : %s" % (e.data))
+                if self.opt.get('debug') and self.log.tracing():
+                    self.log.debug("RAW : %s", line)
+                    self.log.debug("PARSED : %s", e.data)
                     
 
             except RuntimeError:
@@ -193,28 +514,84 @@ class Client:
     
     """ Event System """
 
-    def ev(self, event):
+    def ev(self, event, task=False, policy=None):
         def decorator(func):
-            self.on(event, func)
+            self.on(event, func, task=task, policy=policy)
             return func
         return decorator
 
-    def on(self, event, listener):
-        if not event in self._events:
-            self._events[event] = []
-        self._events[event].append(listener)
+    def on(self, event, listener, task=False, policy=None):
+        """
+        Register a listener. With task=True the listener always runs in its
+        own Task, use it for handlers waiting on the network in 'inline' mode.
+        policy : Policy (or dict of its arguments) limiting this listener.
+        """
+        if policy is not None:
+            self.dispatcher.set_policy(listener, Policy.from_options(policy))
+        owner = self._module_owner(listener)
+        self.dispatcher.on(event, listener, task=task, owner=owner)
+        if owner:
+            self._listeners.setdefault(owner, []).append((event, listener))
+
+    def command(self, name, **options):
+        """
+        Decorator registering a bot command, ex:
+            @client.command("kick", args="<nick> [reason...]", cooldown=5, user_rate=(3, 60))
+            async def kick(event, nick, reason): ...
+        See CommandRouter.add for the options.
+        """
+        return self.router.command(name, **options)
+
+    def set_policy(self, target, policy):
+        """
+        Limit a listener, or every listener of a module (name or instance),
+        with a Policy or a dict of its arguments. None removes the policy.
+        A module policy also covers the plain functions and lambdas the
+        module registers with on(), and may be set before it is loaded.
+        """
+        if isinstance(target, str):
+            target = target.lower()
+        else:
+            target = next((name for name, module in self.modules.items() if module is target), target)
+        self.dispatcher.set_policy(target, Policy.from_options(policy))
+
+    def module_name(self, listener):
+        """Name of the module owning a listener in self.modules, its Python module otherwise."""
+        owner = getattr(listener, "__self__", None)
+        for name, module in self.modules.items():
+            if module is owner:
+                return name
+        return module_of(listener)
     
     def remove(self, event, listener):
-        if event in self._events:
-            events = self._events[event]
-            if listener in events:
-                events.remove(listener)
+        self.dispatcher.remove(event, listener)
+        owner = self._module_owner(listener)
+        if owner and (event, listener) in self._listeners.get(owner, ()):
+            self._listeners[owner].remove((event, listener))
+
+    def _module_owner(self, listener):
+        """
+        Name of the module owning a listener : a method of a module instance,
+        or a function registered while the module is instantiated.
+        """
+        owner = getattr(listener, "__self__", None)
+        if self._loading and (owner is None or isinstance(owner, self._loading[1])):
+            return self._loading[0]
+        if owner is None:
+            return None
+        for name, module in self.modules.items():
+            if module is owner:
+                return name
+        return None
     
     def emit(self, event, *args, **kwargs):
-        if event in self._events:
-            listeners = self._events[event][:]
-            for listener in listeners:
-                asyncio.create_task(listener(*args, **kwargs))
+        self.dispatcher.emit(event, *args, **kwargs)
+
+    def listener_failed(self, event, listener, exc):
+        self.log.error("Listener %s failed : %r", getattr(listener, "__qualname__", listener), exc,
+                       event=event, module=self.module_name(listener))
+        if self.opt.get('debug'):
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
 
     """ Handle internal event """
 
@@ -224,7 +601,6 @@ class Client:
     async def connecting(self, event):
         if self.opt.get('cap'):
             await self.send("CAP LS 302")
-            await self.send("CAP REQ :%s" % (" ".join(self.opt.get('cap'))))
         else:
             await self.register()
     
@@ -234,7 +610,20 @@ class Client:
 
     async def cap(self, event):
         msg = event.get("msg").split()
-        if msg[0] == "ACK":
+        if msg[0] == "LS":
+            # Only request what the server offers, a single unknown cap NAKs the whole request.
+            if len(msg) > 1 and msg[1] == "*":
+                self._advertised.extend(msg[2:])
+                return
+            advertised = [cap.partition("=")[0] for cap in self._advertised + msg[1:]]
+            self._advertised = []
+            wanted = [cap for cap in self.opt.get('cap') if cap in advertised]
+            if wanted:
+                await self.send("CAP REQ :%s" % (" ".join(wanted)))
+            else:
+                await self.send("CAP END")
+                await self.register()
+        elif msg[0] == "ACK":
             for cap in self.opt.get('cap'):
                 if cap in msg:
                     self.activeCAP.append(cap)
@@ -266,55 +655,109 @@ class Client:
         await self.register()
 
     async def registered(self, event):
+        self.connection.queue.release()
+        reconnected = self.reconnector.registered()
         for cmd in self.opt.get('commands'):
             await self.send(cmd)
         await self.send("MODE %s +B" % (self.opt.get('nickname')))
+        if reconnected or self._restored:
+            # Channels of the previous connection, or restored from the snapshot.
+            self._restored = 0
+            for line in self.splitter.pack("JOIN", [channel.name for channel in self.channels.values() if not channel.key]):
+                await self.send(line)
+            for channel in self.channels.values():
+                if channel.key:
+                    await self.join(channel.name, channel.key)
+        if reconnected:
+            self.emit("reconnected", event)
     
-    async def quit_event(self, event):
-        nick = event.get('from')[0].lower()
+    async def isupport_event(self, event):
+        casemapping = self.isupport.casemapping
+        self.isupport.parse(event.get('params'), event.trailing)
+        self.parser.chantypes = self.isupport.chantypes
+        self.dispatcher.set_chantypes(self.isupport.chantypes)
+        if casemapping != self.isupport.casemapping:
+            self.refold()
+
+    def refold(self):
+        """
+        Fold again every key holding a nick or channel name after a
+        CASEMAPPING change : channels, users, their channel sets and the
+        channel events ("join#chan") of the dispatcher.
+        """
+        self.users.set_casefold(self.casefold)
+        names = {}
+        for channel in self.channels.values():
+            old = channel.name
+            channel.set_casefold(self.casefold)
+            names[old] = channel.name
+        channels = {channel.name: channel for channel in self.channels.values()}
+        self.channels.clear()
+        self.channels.update(channels)
+        self.users.rename_channels(names)
+        self.dispatcher.refold(self.casefold, names)
+        self.usercache.set_casefold(self.casefold)
+
+    # quit_event and nick_event are plain functions, as the Channel handlers :
+    # in 'task' mode the registry and member lists follow the order of the lines.
+
+    def quit_event(self, event):
+        nick = self.casefold(event.get('from')[0])
         
-        if nick == self.opt.get('nickname').lower():
+        if nick == self.casefold(self.opt.get('nickname')):
             self.disconnect
 
-        channels = []
-        for channel in self.channels:
-            if nick in self.channels[channel].users:
-                channels.append(channel)
-                self.emit("quit%s" % (channel), event)
+        user = self.users.get(nick)
+        channels = list(user.channels) if user else []
+        for channel in channels:
+            self.emit("quit%s" % (channel), event)
         self.emit("quit_channels", event, channels)
 
-    async def nick_event(self, event):
-        nick = event.get('from')[0].lower()
-        channels = []
-        for channel in self.channels:
-            if nick in self.channels[channel].users:
-                channels.append(channel)
-                self.emit("nick%s" % (channel), event)
+    def nick_event(self, event):
+        nick = event.get('from')[0]
+        user = self.users.rename(nick, event.get('msg'))
+        channels = list(user.channels) if user else []
+        for channel in channels:
+            self.emit("nick%s" % (channel), event)
         self.emit("nick_channels", event, channels)
     
     async def disconnected(self, event):
         if self.opt.get('debug'): self.log.info('Disconnected.')
-        await self.connection.disconnect()
-        if self.opt.get('auto_reconnect'):
-            if self.opt.get('debug'): self.log.info('Reconnecting...')
-            while (self._retry_count < self.opt.get('retry_count')) and not self.connection.connected:
-                try:
-                    if self.opt.get('debug'): self.log.info('Trying to reconnect n°%d.' % (self._retry_count))
-                    self._retry_count += 1
-                    await self.connect()
-                    time.sleep(self.opt.get('retry_delay'))
-                except RuntimeError:
-                    if self.opt.get('debug'):
-                        traceback.print_exception(RuntimeError)
-                        traceback.print_stack()
+        if self.connected:
+            await self.connection_lost()
 
     """ Client helper """
 
-    async def send(self, message):
-        await self.connection.send(message)
+    async def send(self, message, priority=None, wait=False):
+        await self.connection.send(message, priority=priority, wait=wait, reserved=self.splitter.reserved())
+
+    async def request(self, message, timeout=None):
+        """
+        Send a command and return its Reply, e.g. await client.request("WHOIS nick").
+        See RequestTracker for the supported commands.
+        """
+        return await self.replies.request(message, timeout)
+
+    def history(self, target, limit=None, page=100, before=None):
+        """
+        Async iterator over the history of target (draft/chathistory), newest first :
+        async for event in client.history("#channel", limit=500): ...
+        """
+        return self.batches.history(target, limit, page, before)
+
+    def recv_stats(self):
+        """Received lines/bytes, decoding fallbacks and dropped lines, see LineBuffer.stats."""
+        return self.buffr.stats()
+
+    def send_stats(self):
+        """Send queue depth and wait times, see SendQueue.stats."""
+        return self.connection.queue.stats() if self.connection else None
 
     async def join(self, channel, key=None):
-        await self.send("JOIN %s %s" % (channel, key))
+        if key:
+            await self.send("JOIN %s %s" % (channel, key))
+        else:
+            await self.send("JOIN %s" % (channel))
 
     async def part(self, channel, msg=None):
         await self.send("PART %s %s" % (channel, msg))
@@ -325,6 +768,11 @@ class Client:
     async def notice(self, target, message):
         await self.send("NOTICE %s :%s" % (target, message))
 
+    async def announce(self, targets, message, command="PRIVMSG"):
+        """Send message to every target, as many targets per line as TARGMAX allows."""
+        for line in self.splitter.pack(command, targets, message):
+            await self.send(line)
+
     async def mode(self, target, mode, params=None):
         await self.send("MODE %s %s %s" % (target, mode, params))
 
@@ -0,0 +1,274 @@
+import collections
+import time
+
+""" Bot commands router """
+
+CONVERTERS = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "lower": str.lower,
+}
+
+
+class UsageError(ValueError):
+    pass
+
+
+class Arguments:
+    """
+    Argument spec compiled once, ex: "<nick> [count:int] [reason...]".
+    <name> is required, [name] optional (None when missing), name... takes the
+    rest of the line (last one only), :type converts (str, int, float, lower).
+    """
+
+    __slots__ = ("spec", "params", "required", "greedy")
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.params = []
+        self.greedy = False
+        for token in spec.split():
+            optional = token.startswith("[")
+            token = token.strip("<>[]")
+            self.greedy = token.endswith("...")
+            name, _, kind = token.rstrip(".").partition(":")
+            if kind not in CONVERTERS and kind:
+                raise ValueError("Unknown argument type %r in %r" % (kind, spec))
+            self.params.append((name, CONVERTERS[kind or "str"], optional))
+        self.required = sum(1 for _, _, optional in self.params if not optional)
+
+    def parse(self, text):
+        count = len(self.params)
+        if not count:
+            return ()
+        words = text.split(None, count - 1) if self.greedy else text.split()
+        if len(words) < self.required:
+            raise UsageError("missing %s" % (self.params[len(words)][0]))
+        if len(words) > count:
+            raise UsageError("too many arguments")
+        values = []
+        for index, (name, convert, _) in enumerate(self.params):
+            if index >= len(words):
+                values.append(None)
+                continue
+            try:
+                values.append(convert(words[index]))
+            except ValueError:
+                raise UsageError("invalid %s %r" % (name, words[index]))
+        return values
+
+
+class RateLimiter:
+    """
+    Per key token bucket : `count` uses per `per` seconds. The least recently
+    seen keys are forgotten past `size` entries.
+    """
+
+    def __init__(self, count, per, size=4096):
+        self.count = count
+        self.per = per
+        self.size = size
+        self.keys = collections.OrderedDict()
+
+    def allow(self, key, now):
+        state = self.keys.get(key)
+        if state is None:
+            state = self.keys[key] = [self.count, now]
+            if len(self.keys) > self.size:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+            state[0] = min(self.count, state[0] + (now - state[1]) * self.count / self.per)
+            state[1] = now
+        if state[0] < 1:
+            return False
+        state[0] -= 1
+        return True
+
+
+class Command:
+    __slots__ = ("name", "event", "args", "cooldown", "limiter", "help", "last")
+
+    def __init__(self, name, args=None, cooldown=0, user_rate=None, help=None):
+        self.name = name
+        self.event = "command:%s" % (name)
+        self.args = Arguments(args) if args is not None else None
+        self.cooldown = cooldown
+        self.limiter = RateLimiter(*user_rate) if user_rate else None
+        self.help = help
+        self.last = 0
+
+    @property
+    def usage(self):
+        return "%s %s" % (self.name, self.args.spec) if self.args else self.name
+
+
+class CommandRouter:
+    """
+    Route PRIVMSG starting with a prefix to the matching command only. One
+    privmsg listener walks a trie of the command names, then the handler is
+    emitted as "command:<name>" (event, *arguments), so it runs with the
+    dispatch mode, policies and metrics of the client.
+
+    Without args spec, the handler gets (event, rest of the line). Rejected
+    messages emit "command_error" (event, command, reason) where reason is
+    'usage', 'cooldown' or 'rate' (the usage error in event 'error').
+    """
+
+    def __init__(self, client, prefix="!", user_rate=None, abbreviations=False):
+        self.client = client
+        self.prefixes = tuple(prefix) if isinstance(prefix, (list, tuple)) else (prefix,)
+        self.abbreviations = abbreviations
+        self.limiter = RateLimiter(*user_rate) if user_rate else None
+        self.commands = {}
+        self._trie = {}
+        self._listening = False
+
+    """ Registration """
+
+    def add(self, name, handler, args=None, aliases=(), cooldown=0, user_rate=None, help=None, task=False, policy=None):
+        """
+        Register a command. cooldown : seconds between two uses, user_rate :
+        (count, seconds) uses allowed per user. task and policy as in Client.on.
+        """
+        command = Command(name.lower(), args, cooldown, user_rate, help)
+        for alias in (command.name,) + tuple(alias.lower() for alias in aliases):
+            if alias in self.commands:
+                raise ValueError("Command %r is already registered" % (alias))
+            self.commands[alias] = command
+            self._insert(alias, command)
+        self.client.on(command.event, handler, task=task, policy=policy)
+        if not self._listening:
+            self._listening = True
+            self.client.on("privmsg", self.privmsg_event)
+        return command
+
+    def remove(self, name, handler=None):
+        command = self.commands.get(name.lower())
+        if command is None:
+            return
+        for alias in [alias for alias, each in self.commands.items() if each is command]:
+            del self.commands[alias]
+            self._delete(alias)
+        if handler is not None:
+            self.client.remove(command.event, handler)
+        else:
+            for listener in list(self.client.dispatcher.events.get(command.event, ())):
+                self.client.remove(command.event, listener)
+        if not self.commands and self._listening:
+            self._listening = False
+            self.client.remove("privmsg", self.privmsg_event)
+
+    def export(self, events):
+        """{alias: Command} of the commands emitting one of events, see restore."""
+        return {alias: command for alias, command in self.commands.items() if command.event in events}
+
+    def restore(self, commands):
+        """Register again commands returned by export, their handlers are registered apart."""
+        for alias, command in commands.items():
+            self.commands[alias] = command
+            self._insert(alias, command)
+        if self.commands and not self._listening:
+            self._listening = True
+            self.client.on("privmsg", self.privmsg_event)
+
+    def command(self, name, **options):
+        """Decorator registering a command, see add."""
+        def decorator(func):
+            self.add(name, func, **options)
+            return func
+        return decorator
+
+    """ Matching """
+
+    def match(self, text):
+        """Return (Command, rest of the line) for a message, or None."""
+        for prefix in self.prefixes:
+            if text.startswith(prefix):
+                break
+        else:
+            return None
+
+        node = self._trie
+        pos = len(prefix)
+        length = len(text)
+        while pos < length and text[pos] != " ":
+            node = node.get(text[pos].lower())
+            if node is None:
+                return None
+            pos += 1
+        if pos == len(prefix):
+            return None
+
+        command = node.get(None)
+        if command is None and self.abbreviations:
+            command = self._unique(node)
+        if command is None:
+            return None
+        return command, text[pos + 1:]
+
+    def privmsg_event(self, event):
+        text = event.get('msg')
+        if not text or not text.startswith(self.prefixes):
+            return
+        found = self.match(text)
+        if found is None:
+            return
+        command, rest = found
+
+        now = time.monotonic()
+        if command.cooldown and now - command.last < command.cooldown:
+            self.client.emit("command_error", event, command, "cooldown")
+            return
+        if self.limiter or command.limiter:
+            user = self.client.casefold(event.get('from')[0])
+            if (self.limiter and not self.limiter.allow(user, now)) or (command.limiter and not command.limiter.allow(user, now)):
+                self.client.emit("command_error", event, command, "rate")
+                return
+
+        if command.args is None:
+            args = (rest,)
+        else:
+            try:
+                args = command.args.parse(rest)
+            except UsageError as exc:
+                event.add('error', str(exc))
+                self.client.emit("command_error", event, command, "usage")
+                return
+
+        command.last = now
+        self.client.emit(command.event, event, *args)
+
+    """ Trie """
+
+    def _insert(self, name, command):
+        node = self._trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[None] = command
+
+    def _delete(self, name):
+        path = [self._trie]
+        for char in name:
+            path.append(path[-1][char])
+        del path[-1][None]
+        for index in range(len(name), 0, -1):
+            if path[index]:
+                break
+            del path[index - 1][name[index - 1]]
+
+    def _unique(self, node):
+        """The only command below node, if there is exactly one."""
+        found = None
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is None:
+                    if found is not None and found is not child:
+                        return None
+                    found = child
+                else:
+                    stack.append(child)
+        return found
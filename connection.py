@@ -1,14 +1,265 @@
 import asyncio
+import collections
 import ssl
+import time
+
+from .splitter import split_line, UNKNOWN_SOURCE
+
+
+class TokenBucket:
+    """
+    Flood control, RFC 1459 style : up to `burst` lines at once, then one line
+    every `delay` seconds.
+    """
+
+    def __init__(self, delay=2, burst=10):
+        self.delay = delay
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def reset(self):
+        """Full burst again, servers count the flood per connection."""
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+
+    def take(self):
+        """Consume a token and return 0, or return the seconds to wait for one."""
+        now = time.monotonic()
+        if self.delay > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) / self.delay)
+        else:
+            self.tokens = self.burst
+        self.stamp = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) * self.delay
+
+
+class SendQueue:
+    """
+    Outgoing lines, by priority lane. Lower lanes are always sent first.
+    While held, only the URGENT and REGISTRATION lanes are sent, see hold.
+    """
+
+    URGENT = 0
+    REGISTRATION = 1
+    NORMAL = 2
+    BULK = 3
+
+    LANES = {
+        "PING": URGENT,
+        "PONG": URGENT,
+        "CAP": REGISTRATION,
+        "AUTHENTICATE": REGISTRATION,
+        "PASS": REGISTRATION,
+        "NICK": REGISTRATION,
+        "USER": REGISTRATION,
+        "QUIT": REGISTRATION,
+        "PRIVMSG": BULK,
+        "NOTICE": BULK,
+    }
+
+    def __init__(self, bucket=None):
+        self.bucket = bucket
+        self.lanes = tuple(collections.deque() for _ in range(4))
+        self.held = False
+        self._ready = asyncio.Event()
+
+        self.sent = 0
+        self.wait_total = 0
+        self.wait_max = 0
+        self.throttled = 0
+
+    def priority(self, line):
+        command = line.split(" ", 1)[0].upper()
+        return self.LANES.get(command, self.NORMAL)
+
+    def put(self, line, priority=None):
+        """Queue a line, return a future resolved once it is written."""
+        if priority is None:
+            priority = self.priority(line)
+        future = asyncio.get_running_loop().create_future()
+        self.lanes[priority].append((bytes(line + "\r\n", "UTF-8"), future, time.monotonic()))
+        self._ready.set()
+        return future
+
+    def hold(self):
+        """Keep the lanes after REGISTRATION (lines queued while disconnected...) until release()."""
+        self.held = True
+
+    def release(self):
+        self.held = False
+        self._ready.set()
+
+    def served(self):
+        """Lanes sent right now."""
+        return self.lanes[:self.REGISTRATION + 1] if self.held else self.lanes
+
+    async def get(self):
+        """Wait for the next line allowed by the flood control."""
+        while not any(self.served()):
+            self._ready.clear()
+            await self._ready.wait()
+
+        if self.bucket:
+            delay = self.bucket.take()
+            while delay:
+                self.throttled += delay
+                await asyncio.sleep(delay)
+                delay = self.bucket.take()
+
+        return self._pop()
+
+    def get_nowait(self, budget):
+        """
+        Return the next line if it fits in budget bytes and the flood control
+        allows it right now, None otherwise.
+        """
+        for lane in self.served():
+            if lane:
+                if len(lane[0][0]) > budget:
+                    return None
+                if self.bucket and self.bucket.take():
+                    return None
+                return self._pop()
+        return None
+
+    def _pop(self):
+        for lane in self.served():
+            if lane:
+                data, future, queued = lane.popleft()
+                waited = time.monotonic() - queued
+                self.sent += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                return data, future
+
+    def cancel(self):
+        """Drop every queued line, their futures are cancelled."""
+        for lane in self.lanes:
+            while lane:
+                _, future, _ = lane.popleft()
+                future.cancel()
+
+    @property
+    def depth(self):
+        return sum(len(lane) for lane in self.lanes)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "lanes": [len(lane) for lane in self.lanes],
+            "held": self.held,
+            "sent": self.sent,
+            "wait_avg": self.wait_total / self.sent if self.sent else 0,
+            "wait_max": self.wait_max,
+            "throttled": self.throttled,
+        }
+
+
+class LineBuffer:
+    """
+    Split received bytes in IRC lines, decoded with the first of `encodings`
+    that fits. Lines are sliced from the buffer through a memoryview, the
+    buffer itself is only trimmed once per chunk.
+    """
+
+    MAX_LINE = 8191 + 512 # IRCv3 tags + RFC 1459 message
+
+    def __init__(self, encodings=("utf-8", "latin-1")):
+        self.encodings = encodings
+        self.buffer = bytearray()
+        self._discard = False
+
+        self.lines = 0
+        self.bytes = 0
+        self.fallback = 0
+        self.dropped = 0
+        self.dropped_bytes = 0
+
+    def feed(self, data):
+        """Add received data, return the list of complete decoded lines."""
+        buffer = self.buffer
+        start = len(buffer)
+        buffer += data
+        self.bytes += len(data)
+
+        if self._discard:
+            end = buffer.find(b"\n")
+            if end == -1:
+                self.dropped_bytes += len(buffer)
+                buffer.clear()
+                return []
+            self.dropped_bytes += end + 1
+            del buffer[:end + 1]
+            self._discard = False
+            start = 0
+
+        lines = []
+        pos = 0
+        end = buffer.find(b"\n", start)
+        if end != -1:
+            with memoryview(buffer) as view:
+                while end != -1:
+                    stop = end - 1 if end > pos and buffer[end - 1] == 13 else end
+                    if stop > pos:
+                        line = self.decode(view[pos:stop])
+                        if line is not None:
+                            lines.append(line)
+                    pos = end + 1
+                    end = buffer.find(b"\n", pos)
+            del buffer[:pos]
+
+        if len(buffer) > self.MAX_LINE:
+            self.dropped += 1
+            self.dropped_bytes += len(buffer)
+            buffer.clear()
+            self._discard = True
+
+        return lines
+
+    def reset(self):
+        """Forget the partial line buffered, on a new connection."""
+        self.buffer.clear()
+        self._discard = False
+
+    def decode(self, data):
+        for index, encoding in enumerate(self.encodings):
+            try:
+                line = str(data, encoding)
+            except UnicodeDecodeError:
+                continue
+            self.lines += 1
+            if index:
+                self.fallback += 1
+            return line
+        self.dropped += 1
+        self.dropped_bytes += len(data)
+        return None
+
+    def stats(self):
+        return {
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "fallback": self.fallback,
+            "dropped": self.dropped,
+            "dropped_bytes": self.dropped_bytes,
+            "buffered": len(self.buffer),
+        }
 
 
 class Connection:
     """A TCP connection over the IRC protocol."""
 
     CONNECT_TIMEOUT = 10
-    MAX_LEN = 451
+    FLUSH_TIMEOUT = 2 # Seconds given to the queued lines (QUIT...) on disconnect
+    CHUNK_SIZE = 65536
 
-    def __init__(self, hostname, port, useSSL, eventloop=None):
+    def __init__(self, hostname, port, useSSL, eventloop=None, flood_delay=2, flood_burst=10, flood_control=True,
+                 coalesce=False, flush_window=0, flush_bytes=4096, capture=None, metrics=None):
         self.hostname = hostname
         self.port = port
         self.ssl = useSSL
@@ -17,6 +268,21 @@ class Connection:
         self.writer = None
         self.eventloop = eventloop or asyncio.new_event_loop()
 
+        self.queue = SendQueue(TokenBucket(flood_delay, flood_burst) if flood_control else None)
+        self._sender = None
+
+        # CaptureWriter recording the raw traffic, see capture.py
+        self.capture = capture
+        # Metrics recording the time spent waiting for the socket, see metrics.py
+        self.metrics = metrics
+
+        # Write coalescing : lines queued within flush_window seconds, up to
+        # flush_bytes, are written in a single buffer with a single drain.
+        # With flush_window = 0, the lines queued until the next loop iteration.
+        self.coalesce = coalesce
+        self.flush_window = flush_window
+        self.flush_bytes = flush_bytes
+
     async def connect(self):
         """Connect to target."""
 
@@ -28,17 +294,31 @@ class Connection:
             port=self.port,
             ssl=self.ssl,
         )
+        if self.queue.bucket:
+            self.queue.bucket.reset()
+        self._sender = asyncio.create_task(self.send_forever())
 
     async def disconnect(self):
         """Disconnect from target."""
         if not self.connected:
             return
 
+        await self.flush(self.FLUSH_TIMEOUT)
+        if self._sender:
+            self._sender.cancel()
+            self._sender = None
+        self.queue.cancel()
         self.writer.close()
         self.reader = None
         self.writer = None
         self.stop()
 
+    async def flush(self, timeout=None):
+        """Wait for the queued lines to be written, at most timeout seconds."""
+        futures = [future for lane in self.queue.served() for _, future, _ in lane]
+        if futures and self._sender and not self._sender.done():
+            await asyncio.wait(futures, timeout=timeout)
+
     @property
     def connected(self):
         """Whether this connection is... connected to something."""
@@ -48,19 +328,64 @@ class Connection:
         """Stop event loop."""
         #self.eventloop.call_soon(self.eventloop.stop)
 
-    async def send(self, data):
-        """Add data to send queue."""
-        if len(data) > self.MAX_LEN:
-            prefix_index = data.index(':')
-            prefix = data[0:prefix_index+1]
-            msg = data[prefix_index+1:]
-            to_send = [ msg[i:i+(self.MAX_LEN-len(prefix))] for i in range(0, len(msg), self.MAX_LEN-len(prefix)) ]
-            
-            for line in to_send:
-                self.writer.write(bytes(prefix + line + "\r\n", "UTF-8"))
-        else:
-            self.writer.write(bytes(data + "\r\n", "UTF-8"))
-        await self.writer.drain()
+    async def send(self, data, priority=None, wait=False, reserved=UNKNOWN_SOURCE):
+        """
+        Add data to send queue, split in lines of 512 bytes once relayed with
+        reserved bytes of source prefix (see splitter.py). With wait=True,
+        return once the data has been written to the socket (CancelledError
+        if the connection is lost first).
+        """
+        futures = [self.queue.put(line, priority) for line in split_line(data, reserved)]
+
+        if wait:
+            await asyncio.gather(*futures)
+
+    async def send_forever(self):
+        """Write queued lines as the flood control allows."""
+        while self.connected:
+            batch = [await self.queue.get()]
+            if self.coalesce:
+                await self.collect(batch)
+
+            try:
+                if len(batch) == 1:
+                    data = batch[0][0]
+                else:
+                    data = b"".join(data for data, _ in batch)
+                self.writer.write(data)
+                if self.capture:
+                    self.capture.record_out(data)
+                if self.metrics is None:
+                    await self.writer.drain()
+                else:
+                    start = time.perf_counter()
+                    await self.writer.drain()
+                    self.metrics.drained(time.perf_counter() - start)
+            except (ConnectionError, AttributeError):
+                for _, future in batch:
+                    future.cancel()
+                self.queue.cancel()
+                return
+
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def collect(self, batch):
+        """Add to batch the lines queued within the flush window."""
+        budget = self.flush_bytes - len(batch[0][0])
+        if not self.queue.depth:
+            await asyncio.sleep(self.flush_window)
+        while budget > 0:
+            item = self.queue.get_nowait(budget)
+            if item is None:
+                return
+            batch.append(item)
+            budget -= len(item[0])
 
     async def recv(self, *, timeout=None):
-        return await asyncio.wait_for(self.reader.readline(), timeout=timeout)
+        """Return the next chunk of raw bytes, b"" once the connection is closed."""
+        data = await asyncio.wait_for(self.reader.read(self.CHUNK_SIZE), timeout=timeout)
+        if self.capture and data:
+            self.capture.record_in(data)
+        return data
@@ -0,0 +1,277 @@
+import asyncio
+import collections
+import inspect
+import time
+import traceback
+
+""" Event dispatcher """
+
+# Listener kinds
+FUNCTION = 0
+COROUTINE = 1
+TASK = 2
+ISOLATED = 3 # Runs under a Policy, see policy.py
+
+
+class Dispatcher:
+    """
+    Index of listeners by event name.
+
+    mode 'task'   : every listener runs in its own Task (historical behaviour).
+    mode 'inline' : plain functions are called directly, coroutine listeners are
+                    awaited one after the other in emit order, only listeners
+                    registered with task=True get their own Task. A listener
+                    which waits for the network (ex: a reply to a command) must
+                    opt in, it would block the read loop otherwise.
+
+    Exceptions of listeners are passed to on_error(event, listener, exc), in
+    both modes. Listeners with a Policy (see set_policy) run in Tasks with
+    bounded concurrency and a timeout, whatever the mode.
+    """
+
+    def __init__(self, mode="task", chantypes="#", on_error=None):
+        self.mode = mode
+        self.chantypes = chantypes
+        self.on_error = on_error
+        self.metrics = None # Metrics timing every listener, see metrics.py
+        self.events = {}
+        self._index = {}
+        self._actions = collections.Counter()
+        self._spawn = set()
+        self._policies = {}
+        self._owner_policies = {}
+        self._owners = {}
+        self._pending = collections.deque()
+        self._draining = False
+
+    """ Registration """
+
+    def on(self, event, listener, task=False, owner=None):
+        """
+        owner : what the listener belongs to (ex: a module name), its policy
+        set with set_policy applies to the listener. A bound method belongs
+        to its instance by default.
+        """
+        if owner is not None:
+            self._owners[listener] = owner
+        if event not in self.events:
+            self.events[event] = []
+            self._actions[self.action_of(event)] += 1
+        self.events[event].append(listener)
+        if task:
+            self._spawn.add(listener)
+        self._reindex(event)
+
+    def remove(self, event, listener):
+        if event in self.events:
+            events = self.events[event]
+            if listener in events:
+                events.remove(listener)
+                if not self.is_registered(listener):
+                    self._spawn.discard(listener)
+                    self._owners.pop(listener, None)
+            if not events:
+                del self.events[event]
+                self._actions[self.action_of(event)] -= 1
+                if self._actions[self.action_of(event)] <= 0:
+                    del self._actions[self.action_of(event)]
+            self._reindex(event)
+
+    def set_policy(self, target, policy):
+        """
+        Run a listener, or every listener of an owner (see on) or bound to an
+        object (ex: a module instance), under a Policy. None removes the policy.
+        """
+        if inspect.isfunction(target) or inspect.ismethod(target):
+            policies = self._policies
+        else:
+            policies = self._owner_policies
+        if policy is None:
+            policies.pop(target, None)
+        else:
+            policies[target] = policy
+        for event in list(self.events):
+            self._reindex(event)
+
+    def policy_of_owner(self, owner):
+        """Policy set on an owner with set_policy (ex: a module name), None otherwise."""
+        return self._owner_policies.get(owner)
+
+    def policy_of(self, listener):
+        policy = self._policies.get(listener)
+        if policy is None and self._owner_policies:
+            owner = self._owners.get(listener) or getattr(listener, "__self__", None)
+            if owner is not None:
+                policy = self._owner_policies.get(owner)
+        return policy
+
+    def is_task(self, listener):
+        """Whether listener was registered with task=True."""
+        return listener in self._spawn
+
+    def is_registered(self, listener):
+        return any(listener in listeners for listeners in self.events.values())
+
+    def wants(self, action):
+        """Whether any listener is registered for this action (with or without channel)."""
+        return action in self._actions
+
+    def set_chantypes(self, chantypes):
+        self.chantypes = chantypes
+        self._actions = collections.Counter(self.action_of(event) for event in self.events)
+
+    def refold(self, casefold, names=None):
+        """
+        Fold again the channel of the channel events ('join#chan') for a new
+        casemapping. names : {old channel: new channel} of the channels known
+        by their original name, others are folded from the old key.
+        """
+        names = names or {}
+        events = {}
+        for event, listeners in self.events.items():
+            action = self.action_of(event)
+            if action != event:
+                channel = event[len(action):]
+                event = action + names.get(channel, casefold(channel))
+            merged = events.setdefault(event, [])
+            merged.extend(listener for listener in listeners if listener not in merged)
+        # Updated in place, Client._events is the same dict.
+        self.events.clear()
+        self.events.update(events)
+        self._actions = collections.Counter(self.action_of(event) for event in self.events)
+        self._index = {}
+        for event in self.events:
+            self._reindex(event)
+
+    def action_of(self, event):
+        """Strip the channel suffix of an event name: 'join#chan' -> 'join'."""
+        for index, char in enumerate(event):
+            if char in self.chantypes:
+                return event[:index]
+        return event
+
+    def _reindex(self, event):
+        listeners = self.events.get(event)
+        if not listeners:
+            self._index.pop(event, None)
+            return
+        self._index[event] = tuple((listener, self._kind(listener)) for listener in listeners)
+
+    def _kind(self, listener):
+        if self.policy_of(listener) is not None:
+            return ISOLATED
+        if listener in self._spawn:
+            return TASK
+        if inspect.iscoroutinefunction(listener):
+            return COROUTINE
+        return FUNCTION
+
+    """ Dispatch """
+
+    def emit(self, event, *args, **kwargs):
+        if event not in self._index:
+            return
+        if self.mode != "inline":
+            self._run(event, self._index[event], args, kwargs)
+            return
+
+        self._pending.append((event, args, kwargs))
+        if not self._draining:
+            self._draining = True
+            asyncio.create_task(self._drain())
+
+    def emit_to(self, event, listeners, *args, **kwargs):
+        """
+        Emit to some of the listeners of event only (ex: the ones registered
+        since it was emitted), as in 'task' mode whatever the mode.
+        """
+        self._run(event, [entry for entry in self._index.get(event, ()) if entry[0] in listeners], args, kwargs)
+
+    def _run(self, event, entries, args, kwargs):
+        metrics = self.metrics
+        for listener, kind in entries:
+            if kind == FUNCTION:
+                if metrics is None:
+                    result = self._call(event, listener, args, kwargs)
+                else:
+                    start = time.perf_counter()
+                    result = self._call(event, listener, args, kwargs)
+                    metrics.listener(event, listener, time.perf_counter() - start)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(self._guard(event, listener, result))
+            elif kind == ISOLATED:
+                self.policy_of(listener).submit(self, event, listener, args, kwargs)
+            elif metrics is None:
+                asyncio.create_task(self._guard(event, listener, listener(*args, **kwargs)))
+            else:
+                asyncio.create_task(self._guard(event, listener, metrics.timed(event, listener, listener(*args, **kwargs))))
+
+    async def dispatch(self, event, *args, **kwargs):
+        """
+        Emit and, in inline mode, run the listeners before returning. Waits
+        first for the policies of the listeners using backpressure.
+        """
+        if event not in self._index:
+            return
+        if self._policies or self._owner_policies:
+            for listener, kind in self._index[event]:
+                if kind == ISOLATED:
+                    await self.policy_of(listener).wait()
+        if self.mode != "inline":
+            self.emit(event, *args, **kwargs)
+            return
+
+        self._pending.append((event, args, kwargs))
+        if not self._draining:
+            self._draining = True
+            await self._drain()
+
+    async def _drain(self):
+        metrics = self.metrics
+        try:
+            while self._pending:
+                event, args, kwargs = self._pending.popleft()
+                for listener, kind in self._index.get(event, ()):
+                    if kind == ISOLATED:
+                        self.policy_of(listener).submit(self, event, listener, args, kwargs)
+                        continue
+                    if kind == TASK:
+                        if metrics is None:
+                            asyncio.create_task(self._guard(event, listener, listener(*args, **kwargs)))
+                        else:
+                            asyncio.create_task(self._guard(event, listener, metrics.timed(event, listener, listener(*args, **kwargs))))
+                        continue
+                    if metrics is not None:
+                        start = time.perf_counter()
+                    try:
+                        if kind == COROUTINE:
+                            await listener(*args, **kwargs)
+                        else:
+                            result = listener(*args, **kwargs)
+                            if inspect.isawaitable(result):
+                                await result
+                    except Exception as exc:
+                        self._failed(event, listener, exc)
+                    if metrics is not None:
+                        metrics.listener(event, listener, time.perf_counter() - start)
+        finally:
+            self._draining = False
+
+    async def _guard(self, event, listener, coro):
+        """Report the exception of a listener run in its own Task."""
+        try:
+            await coro
+        except Exception as exc:
+            self._failed(event, listener, exc)
+
+    def _call(self, event, listener, args, kwargs):
+        try:
+            return listener(*args, **kwargs)
+        except Exception as exc:
+            self._failed(event, listener, exc)
+
+    def _failed(self, event, listener, exc):
+        if self.on_error:
+            self.on_error(event, listener, exc)
+        else:
+            traceback.print_exception(type(exc), exc, exc.__traceback__)
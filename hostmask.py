@@ -0,0 +1,263 @@
+import re
+
+"""
+Hostmask matching : nick!user@host masks with * and ? wildcards, compiled
+once into an index answering "which masks match this user".
+"""
+
+WILDCARDS = "*?"
+
+
+def normalize(mask):
+    """Complete a partial mask like the servers do: nick -> nick!*@*, user@host -> *!user@host."""
+    if "!" not in mask and "@" not in mask:
+        return "%s!*@*" % (mask)
+    if "!" not in mask:
+        return "*!%s" % (mask)
+    if "@" not in mask:
+        return "%s@*" % (mask)
+    return mask
+
+
+def compile_mask(mask):
+    """Regex matching a (casefolded) nick!user@host against a (casefolded) mask."""
+    pattern = "".join(".*" if char == "*" else "." if char == "?" else re.escape(char) for char in mask)
+    return re.compile(pattern, re.DOTALL).fullmatch
+
+
+def literal_prefix(text):
+    for index, char in enumerate(text):
+        if char in WILDCARDS:
+            return text[:index]
+    return text
+
+
+def has_wildcard(text):
+    return "*" in text or "?" in text
+
+
+class Mask:
+    __slots__ = ("mask", "key", "data", "match")
+
+    def __init__(self, mask, key, data):
+        self.mask = mask
+        self.key = key
+        self.data = data
+        self.match = None
+
+
+class _Trie:
+    """Masks stored under a literal prefix, found by walking a text."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, prefix, item):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(item)
+
+    def remove(self, prefix, item):
+        path = [self.root]
+        for char in prefix:
+            path.append(path[-1][char])
+        path[-1][None].remove(item)
+        if not path[-1][None]:
+            del path[-1][None]
+        for index in range(len(prefix), 0, -1):
+            if path[index]:
+                break
+            del path[index - 1][prefix[index - 1]]
+
+    def walk(self, text):
+        """Yield the items stored under every prefix of text."""
+        node = self.root
+        items = node.get(None)
+        if items:
+            yield from items
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return
+            items = node.get(None)
+            if items:
+                yield from items
+
+
+class MaskIndex:
+    """
+    Index of hostmasks. Each mask lands in the cheapest bucket it allows :
+      - literal host (*!*@host, nick!*@host...) : hash of the host
+      - literal user (*!user@*.net) : hash of the user
+      - literal start (nick*!*@*) : trie of the mask prefix
+      - literal end of host (*!*@*.isp.net) : trie of the reversed host
+      - anything else : compiled regex, tried one by one once a single regex
+        made of all of them matched
+    Masks and users are casefolded with `casefold` (the server CASEMAPPING).
+    Extended bans ($a:account, ~q:...) are stored but never match.
+    """
+
+    MIN_LITERAL = 2
+
+    def __init__(self, casefold=str.lower):
+        self.casefold = casefold
+        self.masks = {}
+        self._hosts = {}
+        self._users = {}
+        self._prefixes = _Trie()
+        self._suffixes = _Trie()
+        self._fallback = []
+        self._any = None
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __contains__(self, mask):
+        return self.casefold(normalize(mask)) in self.masks
+
+    def __iter__(self):
+        return (item.mask for item in self.masks.values())
+
+    def set_casefold(self, casefold):
+        """Rebuild the index for a new casemapping."""
+        items = [(item.mask, item.data) for item in self.masks.values()]
+        self.casefold = casefold
+        self.clear()
+        for mask, data in items:
+            self.add(mask, data)
+
+    def clear(self):
+        self.masks = {}
+        self._hosts = {}
+        self._users = {}
+        self._prefixes = _Trie()
+        self._suffixes = _Trie()
+        self._fallback = []
+        self._any = None
+
+    def add(self, mask, data=None):
+        """Index mask, or update its data. Empty masks (a MODE +b whose argument was lost) are ignored."""
+        if not mask:
+            return
+        key = self.casefold(normalize(mask))
+        if key in self.masks:
+            self.masks[key].data = data
+            return
+        item = self.masks[key] = Mask(mask, key, data)
+        if key[0] in "$~":
+            return
+
+        where, at = self._bucket(key)
+        if where == "host":
+            userpart = key[:at]
+            if userpart != "*!*":
+                item.match = compile_mask(key)
+            self._hosts.setdefault(key[at + 1:], []).append(item)
+            return
+        item.match = compile_mask(key)
+        if where == "user":
+            self._users.setdefault(self._user(key, at), []).append(item)
+        elif where == "prefix":
+            self._prefixes.add(literal_prefix(key), item)
+        elif where == "suffix":
+            self._suffixes.add(self._host_suffix(key, at), item)
+        else:
+            self._fallback.append(item)
+            self._any = None
+
+    def remove(self, mask):
+        if not mask:
+            return None
+        key = self.casefold(normalize(mask))
+        item = self.masks.pop(key, None)
+        if item is None or key[0] in "$~":
+            return item
+
+        where, at = self._bucket(key)
+        if where == "host":
+            bucket = self._hosts[key[at + 1:]]
+            bucket.remove(item)
+            if not bucket:
+                del self._hosts[key[at + 1:]]
+        elif where == "user":
+            bucket = self._users[self._user(key, at)]
+            bucket.remove(item)
+            if not bucket:
+                del self._users[self._user(key, at)]
+        elif where == "prefix":
+            self._prefixes.remove(literal_prefix(key), item)
+        elif where == "suffix":
+            self._suffixes.remove(self._host_suffix(key, at), item)
+        else:
+            self._fallback.remove(item)
+            self._any = None
+        return item
+
+    def match(self, nick, user=None, host=None):
+        """
+        Masks matching a user, given as nick, user, host or as a single
+        nick!user@host string. Return the Mask objects (mask, data).
+        """
+        if user is None and host is None:
+            text = self.casefold(nick)
+        else:
+            text = self.casefold("%s!%s@%s" % (nick, user or "", host or ""))
+        at = text.rfind("@")
+        host = text[at + 1:]
+
+        found = []
+        for item in self._hosts.get(host, ()):
+            if item.match is None or item.match(text):
+                found.append(item)
+        if self._users:
+            for item in self._users.get(text[text.find("!") + 1:at], ()):
+                if item.match(text):
+                    found.append(item)
+        for item in self._prefixes.walk(text):
+            if item.match(text):
+                found.append(item)
+        for item in self._suffixes.walk(host[::-1]):
+            if item.match(text):
+                found.append(item)
+        if self._fallback:
+            if self._any is None:
+                self._any = re.compile("|".join("(?:%s)" % (item.match.__self__.pattern) for item in self._fallback), re.DOTALL).fullmatch
+            if self._any(text):
+                for item in self._fallback:
+                    if item.match(text):
+                        found.append(item)
+        return found
+
+    def matches(self, nick, user=None, host=None):
+        """Whether any mask matches the user."""
+        return bool(self.match(nick, user, host))
+
+    def stats(self):
+        return {
+            "masks": len(self.masks),
+            "hosts": sum(len(bucket) for bucket in self._hosts.values()),
+            "users": sum(len(bucket) for bucket in self._users.values()),
+            "fallback": len(self._fallback),
+        }
+
+    def _bucket(self, key):
+        at = key.rfind("@")
+        hostpart = key[at + 1:]
+        if not has_wildcard(hostpart):
+            return "host", at
+        user = self._user(key, at)
+        if user and not has_wildcard(user):
+            return "user", at
+        if len(literal_prefix(key)) >= self.MIN_LITERAL:
+            return "prefix", at
+        if len(self._host_suffix(key, at)) >= self.MIN_LITERAL:
+            return "suffix", at
+        return "fallback", at
+
+    def _user(self, key, at):
+        return key[key.find("!") + 1:at]
+
+    def _host_suffix(self, key, at):
+        """Literal end of the host part, reversed."""
+        return literal_prefix(key[at + 1:][::-1])
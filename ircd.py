@@ -0,0 +1,522 @@
+import asyncio
+import base64
+import collections
+import itertools
+import random
+import time
+
+"""
+In-process asyncio IRC server stand-in, for tests and load tests.
+
+It speaks enough protocol for CAP LS/REQ/ACK, SASL PLAIN, 001/005,
+JOIN/PART/NAMES/MODE/NICK/QUIT/PING/PRIVMSG, WHO/WHOX/WHOIS, labeled-response, BATCH and CHATHISTORY, and can generate synthetic
+channel churn, netsplits and netjoins from fake users.
+"""
+
+CAPS = ["sasl", "extended-join", "userhost-in-names", "multi-prefix", "account-notify", "chghost", "batch", "labeled-response", "server-time", "draft/chathistory"]
+PRE_REGISTRATION = ("CAP", "AUTHENTICATE", "PASS", "NICK", "USER", "PING", "PONG", "QUIT")
+
+
+class Session:
+    """A client connected to the fake server."""
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.nick = None
+        self.ident = None
+        self.host = "127.0.0.1"
+        self.caps = set()
+        self.capping = False
+        self.registered = False
+        self.account = None
+        self.received = 0
+        self.labeled = None # Lines answering the labeled command being handled
+        self.penalty = time.monotonic()
+
+    @property
+    def mask(self):
+        return "%s!%s@%s" % (self.nick, self.ident, self.host)
+
+    def send(self, line):
+        if self.labeled is not None:
+            self.labeled.append(line)
+        elif not self.writer.is_closing():
+            self.writer.write(line.encode() + b"\r\n")
+
+    def numeric(self, code, text):
+        self.send(":%s %s %s %s" % (self.server.name, code, self.nick or "*", text))
+
+    def close(self, reason=None):
+        if reason:
+            self.send("ERROR :Closing Link: %s (%s)" % (self.host, reason))
+        self.writer.close()
+
+
+class FakeChannel:
+    def __init__(self, name):
+        self.name = name
+        # casefolded nick -> [nick, ident, host, prefix symbols, session or None for fake users]
+        self.members = {}
+        self.history = collections.deque(maxlen=1000) # (msgid, time, line) of the PRIVMSG/NOTICE
+
+    def sessions(self):
+        return [member[4] for member in self.members.values() if member[4] is not None]
+
+
+class FakeIRCd:
+    """
+    Fake IRC server. accounts : {account: password} accepted by SASL PLAIN
+    (None accepts everything). flood_penalty : RFC 1459 style flood
+    protection, each line adds flood_penalty seconds to a per-client timer and
+    the client is killed (Excess Flood) once it runs flood_limit seconds ahead,
+    0 disables it.
+    """
+
+    def __init__(self, name="irc.fake.net", accounts=None, flood_penalty=0, flood_limit=10, isupport=None):
+        self.name = name
+        self.accounts = accounts
+        self.flood_penalty = flood_penalty
+        self.flood_limit = flood_limit
+        self.isupport = isupport or [
+            "CASEMAPPING=rfc1459", "CHANTYPES=#", "PREFIX=(ohv)@%+", "CHANMODES=beI,k,l,imnpst",
+            "NICKLEN=30", "TARGMAX=PRIVMSG:4,NOTICE:4,JOIN:,PART:", "WHOX", "CHATHISTORY=100",
+        ]
+        self.sessions = set()
+        self.channels = {}
+        self.fake = {}
+        self.server = None
+        self.port = None
+        self.lines_in = 0
+        self.lines_out = 0
+        self.flood_kills = 0
+        self.who_queries = 0
+        self._churn = []
+        self._ids = itertools.count()
+
+    """ Lifecycle """
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        for task in self._churn:
+            task.cancel()
+        for session in list(self.sessions):
+            session.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def drop(self, nick=None, reason="Connection reset"):
+        """Drop one session (by nick) or all of them, to exercise reconnects."""
+        for session in list(self.sessions):
+            if nick is None or session.nick == nick:
+                session.close(reason)
+
+    async def handle(self, reader, writer):
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8", "replace").rstrip("\r\n")
+                if not line:
+                    continue
+                self.lines_in += 1
+                session.received += 1
+                if self.flood_penalty and self.penalize(session):
+                    break
+                self.dispatch(session, line)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.part_all(session, "QUIT :Connection closed")
+            self.sessions.discard(session)
+            writer.close()
+
+    def penalize(self, session):
+        now = time.monotonic()
+        session.penalty = max(session.penalty, now) + self.flood_penalty
+        if session.penalty - now > self.flood_limit:
+            self.flood_kills += 1
+            session.close("Excess Flood")
+            return True
+        return False
+
+    """ Commands """
+
+    def dispatch(self, session, line):
+        label = None
+        if line.startswith("@"):
+            tags, _, line = line.partition(" ")
+            for tag in tags[1:].split(";"):
+                if tag.startswith("label="):
+                    label = tag[6:]
+        if line.startswith(":"):
+            line = line.split(" ", 1)[1]
+        head, _, trailing = line.partition(" :")
+        params = head.split()
+        if _:
+            params.append(trailing)
+        command = params.pop(0).upper()
+        if not session.registered and command not in PRE_REGISTRATION:
+            session.numeric("451", "%s :You have not registered" % (command))
+            return
+        handler = getattr(self, "cmd_%s" % (command.lower()), None)
+        if label is None or "labeled-response" not in session.caps:
+            if handler:
+                handler(session, params)
+            return
+
+        session.labeled = []
+        try:
+            if handler:
+                handler(session, params)
+        finally:
+            lines, session.labeled = session.labeled, None
+        if not lines:
+            session.send("@label=%s :%s ACK" % (label, self.name))
+        elif len(lines) == 1:
+            session.send("@label=%s %s" % (label, lines[0]))
+        else:
+            ref = "L%d" % (next(self._ids))
+            session.send("@label=%s :%s BATCH +%s labeled-response" % (label, self.name, ref))
+            for each in lines:
+                session.send("@batch=%s %s" % (ref, each))
+            session.send(":%s BATCH -%s" % (self.name, ref))
+
+    def cmd_cap(self, session, params):
+        sub = params[0].upper() if params else ""
+        if sub == "LS":
+            session.capping = True
+            session.send(":%s CAP * LS :%s" % (self.name, " ".join(CAPS)))
+        elif sub == "REQ":
+            session.capping = True
+            wanted = params[-1].split()
+            if all(cap in CAPS for cap in wanted):
+                session.caps.update(wanted)
+                session.send(":%s CAP * ACK :%s" % (self.name, " ".join(wanted)))
+            else:
+                session.send(":%s CAP * NAK :%s" % (self.name, " ".join(wanted)))
+        elif sub == "END":
+            session.capping = False
+            self.try_register(session)
+
+    def cmd_authenticate(self, session, params):
+        if params[0] == "PLAIN":
+            session.send("AUTHENTICATE +")
+            return
+        try:
+            _, account, password = base64.b64decode(params[0]).decode().split("\0")
+        except ValueError:
+            session.numeric("904", ":SASL authentication failed")
+            return
+        if self.accounts is None or self.accounts.get(account) == password:
+            session.account = account
+            session.numeric("900", "%s %s :You are now logged in as %s" % ("*", account, account))
+            session.numeric("903", ":SASL authentication successful")
+        else:
+            session.numeric("904", ":SASL authentication failed")
+
+    def cmd_nick(self, session, params):
+        nick = params[0]
+        if session.registered:
+            self.rename(session, nick)
+        else:
+            session.nick = nick
+            self.try_register(session)
+
+    def cmd_user(self, session, params):
+        session.ident = params[0]
+        self.try_register(session)
+
+    def try_register(self, session):
+        if session.registered or session.capping or not session.nick or not session.ident:
+            return
+        session.registered = True
+        session.numeric("001", ":Welcome to the fake network %s" % (session.mask))
+        session.numeric("005", "%s :are supported by this server" % (" ".join(self.isupport)))
+        session.numeric("376", ":End of /MOTD command.")
+
+    def cmd_ping(self, session, params):
+        session.send(":%s PONG %s :%s" % (self.name, self.name, params[-1] if params else ""))
+
+    def cmd_pong(self, session, params):
+        pass
+
+    def cmd_join(self, session, params):
+        for name in params[0].split(","):
+            channel = self.channels.setdefault(name.lower(), FakeChannel(name))
+            key = session.nick.lower()
+            if key in channel.members:
+                continue
+            channel.members[key] = [session.nick, session.ident, session.host, "" if channel.members else "@", session]
+            self.broadcast(channel, self.join_line(session.mask, channel.name, session.account, "Fake user"))
+            self.names(session, channel)
+
+    def cmd_names(self, session, params):
+        channel = self.channels.get(params[0].lower()) if params else None
+        if channel:
+            self.names(session, channel)
+
+    def cmd_part(self, session, params):
+        for name in params[0].split(","):
+            channel = self.channels.get(name.lower())
+            if channel and session.nick.lower() in channel.members:
+                self.broadcast(channel, ":%s PART %s :%s" % (session.mask, channel.name, params[-1] if len(params) > 1 else ""))
+                del channel.members[session.nick.lower()]
+
+    def cmd_mode(self, session, params):
+        channel = self.channels.get(params[0].lower())
+        if channel and len(params) > 1:
+            self.mode(channel, session.mask, params[1], params[2:])
+
+    def cmd_privmsg(self, session, params):
+        for target in params[0].split(","):
+            channel = self.channels.get(target.lower())
+            if channel:
+                line = ":%s PRIVMSG %s :%s" % (session.mask, channel.name, params[-1])
+                self.record(channel, line)
+                self.broadcast(channel, line, skip=session)
+
+    cmd_notice = cmd_privmsg
+
+    def cmd_whois(self, session, params):
+        nick = params[-1] if params else ""
+        other = next((each for each in self.sessions if each.nick and each.nick.lower() == nick.lower()), None)
+        if other is None:
+            session.numeric("401", "%s :No such nick/channel" % (nick))
+        else:
+            session.numeric("311", "%s %s %s * :Fake user" % (other.nick, other.ident, other.host))
+            channels = [channel.members[other.nick.lower()][3][:1] + channel.name for channel in self.channels.values() if other.nick.lower() in channel.members]
+            if channels:
+                session.numeric("319", "%s :%s" % (other.nick, " ".join(channels)))
+            session.numeric("312", "%s %s :Fake server" % (other.nick, self.name))
+            if other.account:
+                session.numeric("330", "%s %s :is logged in as" % (other.nick, other.account))
+        session.numeric("318", "%s :End of /WHOIS list." % (nick))
+
+    def cmd_who(self, session, params):
+        """WHO <channel|nick> [%fields[,token]], WHOX replies carry t c u h s n f a r only."""
+        self.who_queries += 1
+        mask = params[0] if params else "*"
+        if mask.lower() in self.channels:
+            channel = self.channels[mask.lower()]
+            found = [(channel.name, member) for member in channel.members.values()]
+        else:
+            found = [(channel.name, channel.members[mask.lower()]) for channel in self.channels.values() if mask.lower() in channel.members][:1]
+        whox = len(params) > 1 and params[1].startswith("%")
+        token = params[1].partition(",")[2] if whox else ""
+        for name, (nick, ident, host, prefix, other) in found:
+            flags = "H" + prefix[:1]
+            if whox:
+                account = other.account if other and other.account else "0"
+                session.numeric("354", "%s %s %s %s %s %s %s %s :Fake user" % (token or "0", name, ident, host, self.name, nick, flags, account))
+            else:
+                session.numeric("352", "%s %s %s %s %s %s :0 Fake user" % (name, ident, host, self.name, nick, flags))
+        session.numeric("315", "%s :End of /WHO list." % (mask))
+
+    def cmd_chathistory(self, session, params):
+        """CHATHISTORY LATEST <target> * <limit> | BEFORE <target> <msgid=|timestamp=> <limit>"""
+        if len(params) < 4 or params[0].upper() not in ("LATEST", "BEFORE"):
+            session.send(":%s FAIL CHATHISTORY INVALID_PARAMS %s :Invalid parameters" % (self.name, params[0] if params else "*"))
+            return
+        sub, target, anchor, limit = params[0].upper(), params[1], params[2], int(params[3])
+        channel = self.channels.get(target.lower())
+        if channel is None:
+            session.send(":%s FAIL CHATHISTORY INVALID_TARGET %s %s :No such channel" % (self.name, sub, target))
+            return
+        history = list(channel.history)
+        if sub == "BEFORE":
+            kind, _, value = anchor.partition("=")
+            if kind == "msgid":
+                ids = [entry[0] for entry in history]
+                end = ids.index(value) if value in ids else len(history)
+            else:
+                end = sum(1 for entry in history if entry[1] < value)
+            history = history[:end]
+        ref = "H%d" % (next(self._ids))
+        session.send(":%s BATCH +%s chathistory %s" % (self.name, ref, channel.name))
+        for msgid, stamp, line in history[-limit:] if limit else []:
+            session.send("@batch=%s;time=%s;msgid=%s %s" % (ref, stamp, msgid, line))
+        session.send(":%s BATCH -%s" % (self.name, ref))
+
+    def cmd_quit(self, session, params):
+        session.close("Quit: %s" % (params[-1] if params else ""))
+
+    """ Helpers """
+
+    def join_line(self, mask, channel, account, realname):
+        """Plain JOIN, the extended-join variant is produced per session in broadcast."""
+        return (":%s JOIN %s" % (mask, channel), ":%s JOIN %s %s :%s" % (mask, channel, account or "*", realname))
+
+    def record(self, channel, line):
+        now = time.time()
+        stamp = "%s.%03dZ" % (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)), int(now * 1000) % 1000)
+        channel.history.append(("m%d" % (next(self._ids)), stamp, line))
+
+    def broadcast(self, channel, line, skip=None):
+        for session in channel.sessions():
+            if session is skip:
+                continue
+            if isinstance(line, tuple):
+                session.send(line[1] if "extended-join" in session.caps else line[0])
+            else:
+                session.send(line)
+            self.lines_out += 1
+
+    def names(self, session, channel):
+        entries = []
+        for nick, ident, host, prefix, _ in channel.members.values():
+            if "multi-prefix" not in session.caps:
+                prefix = prefix[:1]
+            if "userhost-in-names" in session.caps:
+                entries.append("%s%s!%s@%s" % (prefix, nick, ident, host))
+            else:
+                entries.append("%s%s" % (prefix, nick))
+        for index in range(0, len(entries), 15):
+            session.numeric("353", "= %s :%s" % (channel.name, " ".join(entries[index:index + 15])))
+        session.numeric("366", "%s :End of /NAMES list." % (channel.name))
+
+    def mode(self, channel, mask, modes, args):
+        args = list(args)
+        index = 0
+        add = True
+        symbols = {"o": "@", "h": "%", "v": "+"}
+        for letter in modes:
+            if letter in "+-":
+                add = letter == "+"
+            elif letter in symbols and index < len(args):
+                member = channel.members.get(args[index].lower())
+                index += 1
+                if member:
+                    if add and symbols[letter] not in member[3]:
+                        member[3] = "".join(sorted(member[3] + symbols[letter], key="@%+".index))
+                    elif not add:
+                        member[3] = member[3].replace(symbols[letter], "")
+            elif letter in "bkl" and index < len(args):
+                index += 1
+        # Relayed with every argument, the consumed ones included.
+        self.broadcast(channel, ":%s MODE %s %s" % (mask, channel.name, " ".join([modes] + args)))
+
+    def rename(self, session, nick):
+        old = session.mask
+        notified = set()
+        for channel in self.channels.values():
+            member = channel.members.pop(session.nick.lower(), None)
+            if member:
+                member[0] = nick
+                channel.members[nick.lower()] = member
+                notified.update(channel.sessions())
+        session.nick = nick
+        notified.add(session)
+        for other in notified:
+            other.send(":%s NICK :%s" % (old, nick))
+
+    def part_all(self, session, line):
+        if not session.nick:
+            return
+        notified = set()
+        for channel in self.channels.values():
+            if channel.members.pop(session.nick.lower(), None):
+                notified.update(channel.sessions())
+        for other in notified:
+            other.send(":%s %s" % (session.mask, line))
+
+    """ Synthetic churn """
+
+    def netsplit(self, name, count, server="split.fake.net"):
+        """Quit count fake users of channel name at once, in a netsplit batch. Return their masks."""
+        channel = self.channels.get(name.lower())
+        fakes = [key for key, member in channel.members.items() if member[4] is None][:count]
+        masks = ["%s!%s@%s" % tuple(channel.members.pop(key)[:3]) for key in fakes]
+        self.batched(channel, "netsplit %s %s" % (self.name, server), [":%s QUIT :%s %s" % (mask, self.name, server) for mask in masks])
+        return masks
+
+    def netjoin(self, name, masks, server="split.fake.net"):
+        """Join the users masks back to channel name, in a netjoin batch."""
+        channel = self.channels.get(name.lower())
+        for mask in masks:
+            nick, _, rest = mask.partition("!")
+            ident, _, host = rest.partition("@")
+            channel.members[nick.lower()] = [nick, ident, host, "", None]
+        self.batched(channel, "netjoin %s %s" % (self.name, server), [self.join_line(mask, channel.name, None, "Fake user") for mask in masks])
+
+    def batched(self, channel, header, lines):
+        for session in channel.sessions():
+            ref = "B%d" % (next(self._ids)) if "batch" in session.caps else None
+            if ref:
+                session.send(":%s BATCH +%s %s" % (self.name, ref, header))
+            for line in lines:
+                if isinstance(line, tuple):
+                    line = line[1] if "extended-join" in session.caps else line[0]
+                session.send("@batch=%s %s" % (ref, line) if ref else line)
+            if ref:
+                session.send(":%s BATCH -%s" % (self.name, ref))
+            self.lines_out += len(lines)
+
+    def churn(self, channel, rate=100, users=1000, duration=None):
+        """
+        Generate JOIN/PART/QUIT/NICK/MODE/PRIVMSG from fake users on channel at
+        `rate` lines per second (0 : as fast as possible), for `duration`
+        seconds or until stop(). Return the task.
+        """
+        task = asyncio.create_task(self._churn_forever(channel, rate, users, duration))
+        self._churn.append(task)
+        return task
+
+    async def _churn_forever(self, name, rate, users, duration):
+        channel = self.channels.setdefault(name.lower(), FakeChannel(name))
+        rand = random.Random(next(self._ids))
+        end = time.monotonic() + duration if duration else None
+        batch = max(1, rate // 100) if rate else 100
+        sent = 0
+        start = time.monotonic()
+
+        while end is None or time.monotonic() < end:
+            for _ in range(batch):
+                self._churn_line(channel, rand, users)
+            sent += batch
+            for session in channel.sessions():
+                await session.writer.drain()
+            delay = start + sent / rate - time.monotonic() if rate else 0
+            await asyncio.sleep(max(0, delay))
+        return sent
+
+    def _churn_line(self, channel, rand, users):
+        fakes = [key for key, member in channel.members.items() if member[4] is None]
+        roll = rand.random()
+        if not fakes or (roll < 0.3 and len(fakes) < users):
+            nick = "fake%d" % (next(self._ids))
+            member = [nick, "u%d" % (rand.randrange(500)), "host%d.fake.net" % (rand.randrange(5000)), "", None]
+            channel.members[nick.lower()] = member
+            self.broadcast(channel, self.join_line("%s!%s@%s" % tuple(member[:3]), channel.name, None, "Fake user"))
+            return
+        key = rand.choice(fakes)
+        nick, ident, host, _, _ = channel.members[key]
+        mask = "%s!%s@%s" % (nick, ident, host)
+        if roll < 0.45:
+            del channel.members[key]
+            self.broadcast(channel, ":%s PART %s :bye" % (mask, channel.name))
+        elif roll < 0.55:
+            del channel.members[key]
+            self.broadcast(channel, ":%s QUIT :Quit: bye" % (mask))
+        elif roll < 0.65:
+            new = "fake%d" % (next(self._ids))
+            member = channel.members.pop(key)
+            member[0] = new
+            channel.members[new.lower()] = member
+            self.broadcast(channel, ":%s NICK :%s" % (mask, new))
+        elif roll < 0.75:
+            self.mode(channel, "ChanServ!services@fake.net", rand.choice(["+o", "-o", "+v", "-v"]), [nick])
+        else:
+            line = ":%s PRIVMSG %s :synthetic message %d" % (mask, channel.name, rand.randrange(10 ** 6))
+            self.record(channel, line)
+            self.broadcast(channel, line)
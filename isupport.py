@@ -0,0 +1,128 @@
+import functools
+import string
+
+""" RPL_ISUPPORT (005) and casemapping helpers """
+
+CASEMAPS = {
+    "ascii": str.maketrans(string.ascii_uppercase, string.ascii_lowercase),
+    "rfc1459": str.maketrans(string.ascii_uppercase + "[]\\~", string.ascii_lowercase + "{}|^"),
+    "strict-rfc1459": str.maketrans(string.ascii_uppercase + "[]\\", string.ascii_lowercase + "{}|"),
+}
+
+# Status constants of the well known prefix modes, see Channel.
+STATUS_LETTERS = {"v": 1, "h": 2, "o": 3, "a": 4, "q": 5}
+
+
+def casefold_function(casemapping, cache_size=4096):
+    """Return a cached casefold function for the given CASEMAPPING."""
+    table = CASEMAPS.get(casemapping)
+
+    if table is None:
+        @functools.lru_cache(maxsize=cache_size)
+        def casefold(name):
+            return name.lower()
+    else:
+        @functools.lru_cache(maxsize=cache_size)
+        def casefold(name):
+            return name.translate(table)
+
+    return casefold
+
+
+class ISupport:
+    """
+    Server features advertised by RPL_ISUPPORT, with RFC 1459 defaults until
+    the server tells otherwise.
+    """
+
+    DEFAULTS = {
+        "CASEMAPPING": "rfc1459",
+        "CHANTYPES": "#&",
+        "PREFIX": "(ov)@+",
+        "CHANMODES": "beI,k,l,imnpst",
+    }
+
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self.tokens = dict(self.DEFAULTS)
+        self.casemapping = None
+        self.casefold = None
+        self.update()
+
+    def parse(self, params, trailing=None):
+        """
+        Read the tokens of a 005 reply, params start with our nick. The last
+        param is the "are supported" text when it is the trailing (:) param
+        or holds a space, servers may leave that text out.
+        """
+        tokens = params[1:]
+        if tokens and (trailing or " " in tokens[-1]):
+            tokens = tokens[:-1]
+        for token in tokens:
+            if token.startswith("-"):
+                self.tokens.pop(token[1:], None)
+                if token[1:] in self.DEFAULTS:
+                    self.tokens[token[1:]] = self.DEFAULTS[token[1:]]
+                continue
+            key, _, value = token.partition("=")
+            self.tokens[key.upper()] = value
+        self.update()
+
+    def get(self, key, default=None):
+        return self.tokens.get(key, default)
+
+    def update(self):
+        """Derive the lookup tables from the tokens."""
+        casemapping = self.tokens.get("CASEMAPPING") or "rfc1459"
+        if casemapping != self.casemapping:
+            self.casemapping = casemapping
+            self.casefold = casefold_function(casemapping, self.cache_size)
+
+        self.chantypes = self.tokens.get("CHANTYPES") or "#"
+
+        modes, _, symbols = (self.tokens.get("PREFIX") or "").partition(")")
+        modes = modes[1:]
+        self.prefix = list(zip(modes, symbols))
+        self.prefix_symbols = "".join(symbols)
+
+        self.status_from_letter = {}
+        self.status_from_symbol = {}
+        extra = max(STATUS_LETTERS.values()) + 1
+        for letter, symbol in self.prefix:
+            if letter in STATUS_LETTERS:
+                status = STATUS_LETTERS[letter]
+            else:
+                status = extra
+                extra += 1
+            self.status_from_letter[letter] = status
+            self.status_from_symbol[symbol] = status
+
+        groups = (self.tokens.get("CHANMODES") or "").split(",") + ["", "", "", ""]
+        self.list_modes = groups[0]
+        self.always_param_modes = groups[1]
+        self.set_param_modes = groups[2]
+        self.flag_modes = groups[3]
+
+        # TARGMAX=PRIVMSG:4,NOTICE:4,JOIN: -> {"PRIVMSG": 4, "NOTICE": 4, "JOIN": 0}, 0 : no limit
+        self.targmax = {}
+        for item in (self.tokens.get("TARGMAX") or "").split(","):
+            command, _, count = item.partition(":")
+            if command:
+                self.targmax[command.upper()] = int(count) if count.isdigit() else 0
+
+    def max_targets(self, command):
+        """Targets allowed in one command, 0 for no limit. 1 unless the server tells otherwise."""
+        if self.targmax:
+            return self.targmax.get(command.upper(), 1)
+        maxtargets = self.tokens.get("MAXTARGETS")
+        return int(maxtargets) if maxtargets and maxtargets.isdigit() else 1
+
+    def takes_param(self, letter, adding):
+        """Whether a channel mode letter consumes a parameter."""
+        if letter in self.status_from_letter:
+            return True
+        if letter in self.list_modes or letter in self.always_param_modes:
+            return True
+        if letter in self.set_param_modes:
+            return adding
+        return False
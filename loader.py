@@ -0,0 +1,201 @@
+import asyncio
+import importlib
+import json
+import time
+
+""" Module loading at startup """
+
+
+def _import(path):
+    start = time.perf_counter()
+    module = importlib.import_module(path)
+    return module, time.perf_counter() - start
+
+
+class ModuleLoader:
+    """
+    Load the scripts of a Client.
+
+    mode 'sync'       : import and instantiate every script in __init__ (historical)
+    mode 'background' : connect first, scripts are imported in threads and
+                        instantiated on the loop in the order of the scripts
+    mode 'lazy'       : like 'background', except scripts declared in the
+                        manifest are only loaded on the first of their events
+
+    manifest : {script: [events]} or {script: {"events": [...], "requires": [scripts]}},
+    or the path of a JSON file holding it. A script is instantiated after the
+    scripts it requires, and after the scripts listed before it.
+    """
+
+    def __init__(self, client, mode="sync", manifest=None):
+        if mode not in ("sync", "background", "lazy"):
+            raise ValueError("Unknown module loading mode %r" % (mode))
+        self.client = client
+        self.mode = mode
+        if isinstance(manifest, str):
+            with open(manifest) as manifest_file:
+                manifest = json.load(manifest_file)
+        self.manifest = {}
+        for script, entry in (manifest or {}).items():
+            if isinstance(entry, dict):
+                self.manifest[script] = (entry.get("events", []), entry.get("requires", []))
+            else:
+                self.manifest[script] = (list(entry), [])
+
+        self.timings = {} # script -> (import seconds, init seconds)
+        self.failed = {}
+        self.started = None
+        self.finished = None
+        self._imports = {}
+        self._ready = {}
+        self._lazy = {}
+        self._stubs = {}
+        self._task = None
+
+    def path_of(self, script):
+        if script[-3:] != '.py':
+            return None
+        return '%s.%s' % (self.client.opt.get('modules'), script[:-3])
+
+    def scripts(self):
+        for script in self.client.opt.get('scripts'):
+            if self.path_of(script) is None:
+                self.client.log.warn("Le module %s n'est pas un fichier python" % (script))
+                continue
+            yield script
+
+    """ Loading """
+
+    def load_all(self):
+        """Import and instantiate every script now."""
+        self.started = time.perf_counter()
+        for script in self.scripts():
+            module, seconds = _import(self.path_of(script))
+            self._init(script, module, seconds)
+        self._done()
+
+    def start(self):
+        """Start the background or lazy loading, once, from a running loop."""
+        if self.mode == "sync" or self._task is not None:
+            return
+        self.started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        eager = []
+        for script in self.scripts():
+            self._ready[script] = asyncio.Event()
+            if self.mode == "lazy" and script in self.manifest:
+                self._lazy[script] = None
+                self._stubs[script] = [(event, self._stub(script, event)) for event in self.manifest[script][0]]
+                for event, stub in self._stubs[script]:
+                    self.client.dispatcher.on(event, stub)
+            else:
+                # Imports run in parallel threads, instantiation follows the scripts order.
+                self._imports[script] = loop.run_in_executor(None, _import, self.path_of(script))
+                eager.append(script)
+        self._task = asyncio.create_task(self._load_eager(eager))
+
+    async def wait(self, script):
+        """Return once script is instantiated, loading it if it is lazy."""
+        if script in self._lazy and self._lazy[script] is None:
+            self._lazy[script] = asyncio.create_task(self._load_lazy(script))
+        ready = self._ready.get(script)
+        if ready is not None:
+            await ready.wait()
+
+    def loaded(self):
+        return all(ready.is_set() for ready in self._ready.values())
+
+    async def _load_eager(self, scripts):
+        for script in scripts:
+            await self._requires(script)
+            try:
+                module, seconds = await self._imports.pop(script)
+            except Exception as exc:
+                self._fail(script, exc)
+                continue
+            self._init(script, module, seconds)
+        if self.loaded():
+            self._done()
+
+    async def _load_lazy(self, script):
+        await self._requires(script)
+        try:
+            module, seconds = await asyncio.get_running_loop().run_in_executor(None, _import, self.path_of(script))
+        except Exception as exc:
+            self._fail(script, exc)
+        else:
+            self._init(script, module, seconds)
+        for event, stub in self._stubs.pop(script, ()):
+            self.client.dispatcher.remove(event, stub)
+        if self.loaded():
+            self._done()
+
+    async def _requires(self, script):
+        for required in self.manifest.get(script, ((), ()))[1]:
+            await self.wait(required)
+
+    def _stub(self, script, event):
+        client = self.client
+
+        async def load_on_event(*args, **kwargs):
+            dispatcher = client.dispatcher
+            router = client.router
+            before = set(dispatcher.events.get(event, ()))
+            commands = set(router.commands)
+            await self.wait(script)
+            # The triggering event goes to the listeners registered by the load only.
+            added = set(dispatcher.events.get(event, ())) - before
+            added.discard(router.privmsg_event)
+            if added:
+                dispatcher.emit_to(event, added, *args, **kwargs)
+            # The router saw the message before the commands of the module existed.
+            if dispatcher.action_of(event) == "privmsg" and args and router.commands.keys() - commands:
+                found = router.match(args[0].get('msg') or "")
+                if found is not None and found[0].name not in commands:
+                    router.privmsg_event(args[0])
+        return load_on_event
+
+    def _init(self, script, module, seconds):
+        start = time.perf_counter()
+        try:
+            self.client.init_module(module.__name__, module)
+        except Exception as exc:
+            if self.mode == "sync":
+                raise
+            self._fail(script, exc)
+            return
+        self.timings[script] = (seconds, time.perf_counter() - start)
+        if script in self._ready:
+            self._ready[script].set()
+
+    def _fail(self, script, exc):
+        self.failed[script] = exc
+        self.client.log.error("Loading %s failed : %r", script, exc)
+        if script in self._ready:
+            self._ready[script].set()
+
+    def _done(self):
+        self.finished = time.perf_counter()
+        self._report()
+
+    """ Report """
+
+    def report(self):
+        """Per script import and init time (seconds), slowest first."""
+        return {
+            "mode": self.mode,
+            "total": (self.finished - self.started) if self.finished and self.started else None,
+            "pending": [script for script, ready in self._ready.items() if not ready.is_set()],
+            "failed": {script: repr(exc) for script, exc in self.failed.items()},
+            "scripts": {
+                script: {"import": imported, "init": init}
+                for script, (imported, init) in sorted(self.timings.items(), key=lambda item: -sum(item[1]))
+            },
+        }
+
+    def _report(self):
+        if not self.timings:
+            return
+        report = self.report()
+        self.client.log.info("Modules loaded (%s) in %.1fms : %s", self.mode, report["total"] * 1e3, ", ".join(
+            "%s %.1fms" % (script, (times["import"] + times["init"]) * 1e3) for script, times in report["scripts"].items()))
@@ -1,19 +1,205 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
 """
-Class to log event in stdout
+Class to log event in stdout (or files), formatting and writes are done by a
+background thread so logging never blocks the event loop
 """
 
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+
+LEVELS = {"debug": DEBUG, "info": INFO, "warn": WARN, "error": ERROR}
+NAMES = {DEBUG: "debug", INFO: "info", WARN: "warn", ERROR: "error"}
+MARKS = {DEBUG: "-", INFO: ".", WARN: "+", ERROR: "!"}
+
+
+class StreamSink:
+    """Write records to a stream (stdout by default)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, line):
+        stream = self.stream or sys.stdout
+        stream.write(line + "\n")
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+    def close(self):
+        self.flush()
+
+
+class FileSink:
+    """Write records to a file, rotated to file.1 ... file.<backups> past max_bytes."""
+
+    def __init__(self, path, max_bytes=10 * 2 ** 20, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "a", encoding="utf-8")
+        self.size = self.file.tell()
+
+    def write(self, line):
+        data = line + "\n"
+        size = len(data.encode("utf-8"))
+        if self.max_bytes and self.size and self.size + size > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.size += size
+
+    def rotate(self):
+        self.file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                source = "%s.%d" % (self.path, index)
+                if os.path.exists(source):
+                    os.replace(source, "%s.%d" % (self.path, index + 1))
+            os.replace(self.path, "%s.1" % (self.path))
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
 
 class Logger:
-    def info(self, msg):
-        time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print(".", "%s - %s" % (time, msg))
+    """
+    Queue-backed logger. info/warn/error keep their historical text output,
+    structured=True writes JSON lines instead. Methods of disabled levels are
+    replaced by a no-op.
+    """
+
+    def __init__(self, level=INFO, sinks=None, structured=False, trace_sample=1, trace_rate=0, threaded=True):
+        self.sinks = sinks if sinks is not None else [StreamSink()]
+        self.structured = structured
+        self.set_level(level)
+
+        # Per-line traces : keep one every trace_sample, at most trace_rate per second (0 : no limit).
+        self.trace_sample = max(1, trace_sample)
+        self.trace_rate = trace_rate
+        self._trace_count = 0
+        self._trace_window = 0
+        self._trace_in_window = 0
+        self.dropped_traces = 0
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._write_forever, name="pyrc-logger", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def set_level(self, level):
+        """Level value or name (debug, info, warn, error)."""
+        if isinstance(level, str):
+            if level.lower() not in LEVELS:
+                raise ValueError("Unknown log level %r, use one of %s" % (level, ", ".join(LEVELS)))
+            level = LEVELS[level.lower()]
+        self.level = level
+        for value, name in NAMES.items():
+            if value < self.level:
+                setattr(self, name, self._skip)
+            else:
+                self.__dict__.pop(name, None)
+
+    """ Public methods """
+
+    def debug(self, msg, *args, **fields):
+        self.log(DEBUG, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(INFO, msg, args, fields)
+
+    def warn(self, msg, *args, **fields):
+        self.log(WARN, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(ERROR, msg, args, fields)
+
+    def tracing(self):
+        """Whether the next per-line trace should be written (sampling and rate limit)."""
+        if self.level > DEBUG:
+            return False
+        self._trace_count += 1
+        if self._trace_count % self.trace_sample:
+            return False
+        if self.trace_rate:
+            window = int(time.monotonic())
+            if window != self._trace_window:
+                self._trace_window = window
+                self._trace_in_window = 0
+            if self._trace_in_window >= self.trace_rate:
+                self.dropped_traces += 1
+                return False
+            self._trace_in_window += 1
+        return True
+
+    def log(self, level, msg, args=(), fields=None):
+        if level < self.level:
+            return
+        record = (level, time.time(), msg, args, fields)
+        if self._thread is None:
+            self._write(record)
+        else:
+            self._queue.put(record)
+
+    def close(self):
+        """Write the queued records and stop the background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        for sink in self.sinks:
+            sink.close()
+
+    """ Private methods """
+
+    def _skip(self, msg, *args, **fields):
+        pass
+
+    def _write_forever(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self._write(record)
+            if self._queue.empty():
+                for sink in self.sinks:
+                    sink.flush()
 
-    def warn(self, msg):
-        time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print("+", "%s - %s" % (time, msg))
+    def _write(self, record):
+        line = self._format(record)
+        for sink in self.sinks:
+            try:
+                sink.write(line)
+            except (OSError, ValueError):
+                pass
 
-    def error(self, msg):
-        time = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        print("!", "%s - %s" % (time, msg))
+    def _format(self, record):
+        level, stamp, msg, args, fields = record
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = "%s %r" % (msg, args)
+        if self.structured:
+            data = {"time": datetime.fromtimestamp(stamp).isoformat(), "level": NAMES[level], "msg": str(msg)}
+            if fields:
+                data.update(fields)
+            return json.dumps(data, default=repr)
+        time_str = datetime.fromtimestamp(stamp).strftime("%d/%m/%Y %H:%M:%S")
+        if fields:
+            msg = "%s %s" % (msg, " ".join("%s=%s" % (key, value) for key, value in fields.items()))
+        return "%s %s - %s" % (MARKS[level], time_str, msg)
@@ -0,0 +1,219 @@
+import asyncio
+import collections
+import json
+import time
+
+"""
+Opt-in hot path metrics : lines by command, parse time, listener time by
+event and module, in-flight listener tasks, socket drain wait, plus the send
+and receive stats of the client. Exported as a dict (snapshot), Prometheus
+text or JSON, optionally served over HTTP on a local port.
+"""
+
+
+class Timing:
+    """Count, total and max of a duration, in seconds."""
+
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "avg": self.total / self.count if self.count else 0,
+            "max": self.max,
+        }
+
+
+def module_of(listener):
+    """Module defining a listener, the class module for bound methods."""
+    owner = getattr(listener, "__self__", None)
+    if owner is not None:
+        return type(owner).__module__
+    return getattr(listener, "__module__", None) or "?"
+
+
+class Metrics:
+    """
+    Collected by Client.on_data, the Dispatcher and Connection.send_forever
+    when the client is created with the 'metrics' option. slow_threshold :
+    listeners running longer than this many seconds are logged (0 : never).
+    """
+
+    def __init__(self, slow_threshold=0.1, log=None):
+        self.slow_threshold = slow_threshold
+        self.log = log
+
+        self.lines = collections.Counter()
+        self.parse = Timing()
+        self.listeners = {}
+        self.drain = Timing()
+        self.slow = 0
+        self.in_flight = 0
+        self.tasks = 0
+        self.started = time.time()
+
+        self._modules = {}
+        self._sources = {}
+        self.server = None
+
+    def source(self, name, func):
+        """Add the numeric values of func() (a dict) to the snapshot under name."""
+        self._sources[name] = func
+
+    """ Collect """
+
+    def counting(self, accept=None):
+        """Wrap a Parser.parse accept callback to count lines by command."""
+        lines = self.lines
+
+        def count(command):
+            lines[command] += 1
+            return accept is None or accept(command)
+
+        return count
+
+    def parsed(self, seconds):
+        self.parse.add(seconds)
+
+    def listener(self, event, listener, seconds):
+        module = self._modules.get(listener)
+        if module is None:
+            module = self._modules[listener] = module_of(listener)
+        timing = self.listeners.get((event, module))
+        if timing is None:
+            timing = self.listeners[(event, module)] = Timing()
+        timing.add(seconds)
+
+        if self.slow_threshold and seconds > self.slow_threshold:
+            self.slow += 1
+            if self.log:
+                self.log.warn("Slow listener %s.%s on %s : %.1fms",
+                              module, getattr(listener, "__qualname__", listener), event, seconds * 1e3)
+
+    async def timed(self, event, listener, coro):
+        """Await a listener coroutine in its own Task, counted as in flight."""
+        self.in_flight += 1
+        self.tasks += 1
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.in_flight -= 1
+            self.listener(event, listener, time.perf_counter() - start)
+
+    def drained(self, seconds):
+        self.drain.add(seconds)
+
+    """ Export """
+
+    def snapshot(self):
+        sources = {}
+        for name, func in self._sources.items():
+            try:
+                values = func() or {}
+            except Exception:
+                values = {}
+            sources[name] = {key: value for key, value in values.items() if isinstance(value, (int, float))}
+
+        return {
+            "uptime": time.time() - self.started,
+            "lines": dict(self.lines),
+            "parse": self.parse.get(),
+            "listeners": [
+                {"event": event, "module": module, **timing.get()}
+                for (event, module), timing in self.listeners.items()
+            ],
+            "slow_listeners": self.slow,
+            "tasks_in_flight": self.in_flight,
+            "tasks": self.tasks,
+            "drain": self.drain.get(),
+            **sources,
+        }
+
+    def json(self):
+        return json.dumps(self.snapshot())
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        snap = self.snapshot()
+        out = []
+
+        def metric(name, kind, samples, suffixes=("",)):
+            out.append("# TYPE pyrc_%s %s" % (name, kind))
+            for suffix in suffixes:
+                for labels, value in samples:
+                    if isinstance(value, dict):
+                        value = value["total" if suffix == "_sum" else "count"]
+                    out.append("pyrc_%s%s%s %r" % (name, suffix, _labels(labels), value))
+
+        def summary(name, samples):
+            metric(name, "summary", samples, ("_count", "_sum"))
+            metric("%s_max" % (name), "gauge", [(labels, stats["max"]) for labels, stats in samples])
+
+        metric("lines_total", "counter", [({"command": command}, count) for command, count in sorted(snap["lines"].items())])
+        summary("parse_seconds", [(None, snap["parse"])])
+        summary("listener_seconds", [({"event": item["event"], "module": item["module"]}, item) for item in snap["listeners"]])
+        metric("slow_listeners_total", "counter", [(None, snap["slow_listeners"])])
+        metric("tasks_in_flight", "gauge", [(None, snap["tasks_in_flight"])])
+        metric("tasks_total", "counter", [(None, snap["tasks"])])
+        summary("drain_seconds", [(None, snap["drain"])])
+        for name in self._sources:
+            for key, value in sorted(snap[name].items()):
+                metric("%s_%s" % (name, key), "gauge", [(None, value)])
+        return "\n".join(out) + "\n"
+
+    """ HTTP endpoint """
+
+    async def serve(self, host="127.0.0.1", port=9100):
+        """Serve /metrics (Prometheus text) and /metrics.json."""
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else ""
+            if path == "/metrics":
+                status, ctype, body = "200 OK", "text/plain; version=0.0.4", self.prometheus()
+            elif path == "/metrics.json":
+                status, ctype, body = "200 OK", "application/json", self.json()
+            else:
+                status, ctype, body = "404 Not Found", "text/plain", "Not found\n"
+            body = body.encode()
+            writer.write(b"HTTP/1.0 %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (
+                status.encode(), ctype.encode(), len(body)) + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % (",".join('%s="%s"' % (key, _escape(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -1,170 +1,349 @@
 """
 IRC Parser class
-return a dict with parsed data
+return an Event with parsed data
 ex : {
+      'tags': IRCv3 message tags,
+      'prefix': raw message source,
+      'command': IRC command as received,
+      'params': list of parameters,
       'from_server': False,
-      'server': server host,
       'from': (nick, ident, host),
       'target': Nick/Channel,
+      'channel': Channel,
       'action': Code/Event,
-      'message': data
+      'msg': data
 }
 """
 
+TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
 
 class Parser:
 
-    def parse(self, raw):
-        e = Event()
-        t = self.tokenize(raw)
-
-        # print(t)
-        if raw.startswith("PING"):
-            e.add("from_server", True)
-            e.add("action", "ping")
-            e.add("msg", t[0])
-            return e
-        elif raw.startswith("AUTHENTICATE"):
-            e.add("from_server", True)
-            e.add("action", "authenticate")
-            e.add("msg", t[0])
-            return e
-        elif raw.startswith('ERROR'):
-            e.add("from_server", True)
-            e.add("action", t[0].lower())
-            e.add("msg", ' '.join(': '.join(t[1:]).strip().split()[1:]))
-            return e
-        else:
-            if self.isServerMessage(t):
-                e.add("from_server", True)
-            else:
-                e.add("from_server", False)
-                e.add("from", (self.getNickname(t), self.getUser(t), self.getHostname(t)))
-
-            e.add("action", self.getAction(t).lower())
-            e.add("msg", self.getMsg(t, action=e.get("action")))
-
-            if e.get("action") == "part":
-                msg = self.getMsg(t, action=e.get("action"))
-                if msg.startswith("#"):
-                    e.add("channel", msg)
-                else:
-                    e.add("channel", self.getChannel(t))
-
-            elif e.get("action") == "nick":
-                pass
-            elif e.get("action") == "kick":
-                e.add("channel", self.getChannel(t))
-                e.add("target", self.getMsg(t, action=e.get("action")).split()[0])
-                e.add(
-                    "msg", " ".join(self.getMsg(t, action=e.get("action")).split()[1:])
-                )
-            elif e.get("action") == "quit":
-                pass
-            elif e.get("action") == 'kill' or e.get("action") == '465' or e.get("action") == 'closing link':
-                e.add("channel", None)
-                pass
-            else:
-                e.add("target", self.getTarget(t))
-                e.add("channel", self.getChannel(t))
+    def __init__(self, chantypes="#"):
+        self.chantypes = chantypes
 
-            return e
+    def parse(self, raw, accept=None):
+        """
+        Return the Event of a raw line. When accept is given, it is called with
+        the command and the Event is only built if it returns True.
+        """
+        rawtags, source, command, pos = self.scan(raw)
+        if accept is not None and not accept(command.lower()) and command.upper() != "ERROR":
+            return None
+        return Event(self, raw, rawtags, source, command, pos)
 
-    def tokenize(self, s):
-        """Tokenize the given IRC output."""
-        s = s.split(":")
-        if len(s) > 1:
-            return s[1:]
-        else:
-            return []
+    def scan(self, raw):
+        """
+        Locate the tags, the source and the command of a raw IRC line.
+        Return (rawtags, source, command, pos), params start at pos.
+        """
+        length = len(raw)
+        pos = 0
+        rawtags = None
+        source = None
 
-    def getNickname(self, t):
-        """Take in a token list, and return the nickname."""
-        return t[0].split("!")[0]
+        if raw.startswith("@"):
+            end = raw.find(" ")
+            if end == -1:
+                end = length
+            rawtags = raw[1:end]
+            pos = end
+            while pos < length and raw[pos] == " ":
+                pos += 1
 
-    def getHostname(self, t):
-        """Return the users host from a tokenized list."""
-        return t[0].split("!")[1].split("@")[1].split()[0]
+        if raw.startswith(":", pos):
+            end = raw.find(" ", pos)
+            if end == -1:
+                end = length
+            source = raw[pos + 1:end]
+            pos = end
+            while pos < length and raw[pos] == " ":
+                pos += 1
 
-    def getUser(self, t):
-        """Return the user from a tokenized list."""
-        return t[0].split("!")[1].split("@")[0]
+        end = raw.find(" ", pos)
+        if end == -1:
+            end = length
+        return rawtags, source, raw[pos:end], end
 
-    def getServer(self, t):
-        """Return the server address from a tokenized list."""
-        return t[0].split()[0]
+    def tokenize(self, raw):
+        """
+        Walk the raw IRC line once and split it in
+        (tags, source, command, params, trailing).
+        """
+        rawtags, source, command, pos = self.scan(raw)
+        params, trailing = self.splitParams(raw, pos)
+        return self.parseTags(rawtags), source, command, params, trailing
 
-    def getAction(self, t):
-        """Return the action from a tokenized list."""
-        return t[0].split()[1]
+    def splitParams(self, raw, pos):
+        """Return (params, trailing) from the params starting at pos."""
+        if pos >= len(raw):
+            return [], False
 
-    def getTarget(self, t):
-        """Get the target of the event"""
-        if len(t[0].split()) >= 3:
-            return t[0].split()[2]
-        return None
+        # Middle params end at the first " :", everything after is the trailing param.
+        if raw.startswith(":", pos + 1):
+            return [raw[pos + 2:]], True
+        split = raw.find(" :", pos)
+        if split == -1:
+            return raw[pos + 1:].split(), False
+        params = raw[pos + 1:split].split()
+        params.append(raw[split + 2:])
+        return params, True
+
+    def parseTags(self, raw):
+        """Return a dict from the IRCv3 tags string (without the leading @)."""
+        tags = {}
+        if not raw:
+            return tags
+        for item in raw.split(";"):
+            if not item:
+                continue
+            key, _, value = item.partition("=")
+            if "\\" in value:
+                value = self.unescapeTag(value)
+            tags[key] = value
+        return tags
+
+    def unescapeTag(self, value):
+        """Unescape an IRCv3 tag value."""
+        out = []
+        i = 0
+        length = len(value)
+        while i < length:
+            char = value[i]
+            if char == "\\":
+                i += 1
+                if i < length:
+                    out.append(TAG_ESCAPES.get(value[i], value[i]))
+            else:
+                out.append(char)
+            i += 1
+        return "".join(out)
+
+    def parseSource(self, source):
+        """Return (nick, ident, host) from a nick!ident@host source."""
+        user, _, host = source.rpartition("@")
+        if not user:
+            return (host, None, None)
+        nick, _, ident = user.partition("!")
+        return (nick, ident, host)
+
+    def isServerMessage(self, source):
+        """Check if the IRC output is a server message."""
+        return source is None or "!" not in source
+
+    def getErrorAction(self, params):
+        """ERROR :Closing Link: ... is dispatched as 'closing link'."""
+        text = params[-1] if params else ""
+        return text.partition(":")[0].strip().lower()
 
-    def getChannel(self, t):
-        """Return the channel from a tokenized list."""
-        for item in t[0].split():
-            if item.startswith("#"):
+    def getChannel(self, action, params, trailing):
+        """Return the channel of the event."""
+        if action == "join" or action == "part" or action == "kick":
+            return params[0] if params else None
+        middle = params[:-1] if trailing else params
+        for item in middle:
+            if item[0] in self.chantypes:
                 return item
         return None
 
-    def isServerMessage(self, t):
-        """Check if the IRC output is a server message."""
-        if "!" not in t[0].split()[0]:
-            return True
-        return False
+    def getTarget(self, action, params):
+        """Get the target of the event"""
+        if action == "kick":
+            return params[1]
+        return params[0] if params else None
 
-    def getMsg(self, t, action=None):
-        """Return the message from a tokenized list."""
+    def getMsg(self, action, params, trailing):
+        """Return the message from the params list."""
         if action == "333":
-            return " ".join(t[0].split()[4:])
-        elif action == "mode":
-            if len(t) > 1:
-                return " ".join(t[0].split()[3:]) + " " + ":".join(t[1:])
-            else:
-                return "".join(t[0].split()[3:])
+            return " ".join(params[2:])
+        elif action == "mode" or action == "cap":
+            return " ".join(params[1:])
         elif action == "kick":
-            return " ".join(t[0].split()[3:]) + " " + ":".join(t[1:])
-        elif action == "cap":
-            return " ".join(t[0].split()[3:]) + " " + ":".join(t[1:])
+            return params[2] if len(params) > 2 else ""
+        elif action == "nick":
+            return params[0] if params else None
         elif action == "352":
-            return " ".join(t[0].split()[4:]) + " " + " ".join(t[1].split()[1:])
+            return " ".join(params[2:-1]) + " " + " ".join(params[-1].split()[1:])
         elif action == "367":
-            time = str(t[-1])
-            if len(t) > 2:
-                return (
-                    t[0].split()[4]
-                    + ":"
-                    + "".join(":".join(t[1:-1]).split()[:-1])
-                    + " "
-                    + time
-                )
-            else:
-                return t[0].split()[4] + " " + time
+            if len(params) > 4:
+                return params[2] + " " + params[4]
+            return params[2]
         elif action == "311":
-            return t[0].split()[3] + "!" + t[0].split()[4] + "@" + t[0].split()[5]
+            return params[1] + "!" + params[2] + "@" + params[3]
         elif action == "318":
-            return t[0].split()[3]
-        elif len(t) > 1:
-            return ":".join(t[1:])
+            return params[1]
+        elif params and (trailing or len(params) > 1):
+            return params[-1]
         return None
 
 
-""" Class wrapper for manipulation of parsed event """
+""" Parsed event, derived fields are decoded on first access """
+
+_UNSET = object()
+
+# Events coming straight from the server, without source, channel or target.
+SERVER_ACTIONS = ("ping", "authenticate", "error")
+NO_CHANNEL = ("nick", "quit")
+NULL_CHANNEL = ("kill", "465", "closing link")
+NO_TARGET = ("part", "nick", "quit") + NULL_CHANNEL
 
 
 class Event:
-    def __init__(self):
-        self.data = {}
+    __slots__ = (
+        "parser", "raw", "source", "command", "action",
+        "_special", "_pos", "_rawtags", "_tags", "_params", "_trailing",
+        "_from", "_channel", "_target", "_msg", "_extra",
+    )
+
+    # Compatibility keys of get/has/data and the attribute serving them.
+    KEYS = {
+        "tags": "tags",
+        "prefix": "source",
+        "command": "command",
+        "params": "params",
+        "from_server": "from_server",
+        "from": "sender",
+        "action": "action",
+        "target": "target",
+        "channel": "channel",
+        "msg": "msg",
+    }
+
+    def __init__(self, parser, raw, rawtags, source, command, pos):
+        self.parser = parser
+        self.raw = raw
+        self.source = source
+        self.command = command
+        self.action = command.lower()
+        self._special = self.action in SERVER_ACTIONS
+        self._pos = pos
+        self._rawtags = rawtags
+        self._tags = _UNSET
+        self._params = _UNSET
+        self._trailing = False
+        self._from = _UNSET
+        self._channel = _UNSET
+        self._target = _UNSET
+        self._msg = _UNSET
+        self._extra = None
+
+        if self.action == "error":
+            self.action = parser.getErrorAction(self.params)
+
+    """ Lazy fields """
+
+    @property
+    def tags(self):
+        if self._tags is _UNSET:
+            self._tags = self.parser.parseTags(self._rawtags)
+        return self._tags
+
+    @property
+    def params(self):
+        if self._params is _UNSET:
+            self._params, self._trailing = self.parser.splitParams(self.raw, self._pos)
+        return self._params
+
+    @property
+    def trailing(self):
+        """Whether the last param was a trailing (:) one."""
+        self.params
+        return self._trailing
+
+    @property
+    def from_server(self):
+        return self._special or self.parser.isServerMessage(self.source)
+
+    @property
+    def sender(self):
+        """(nick, ident, host) of the source, None for server messages."""
+        if self._from is _UNSET:
+            if self.from_server:
+                self._from = None
+            else:
+                self._from = self.parser.parseSource(self.source)
+        return self._from
+
+    @property
+    def channel(self):
+        if self._channel is _UNSET:
+            if self._special or self.action in NO_CHANNEL or self.action in NULL_CHANNEL:
+                self._channel = None
+            else:
+                self._channel = self.parser.getChannel(self.action, self.params, self.trailing)
+        return self._channel
+
+    @property
+    def target(self):
+        if self._target is _UNSET:
+            if self._special or self.action in NO_TARGET:
+                self._target = None
+            else:
+                self._target = self.parser.getTarget(self.action, self.params)
+        return self._target
+
+    @property
+    def msg(self):
+        if self._msg is _UNSET:
+            params = self.params
+            if self.command.lower() == "error":
+                text = params[-1] if params else ""
+                self._msg = " ".join(text.partition(":")[2].split()[1:])
+            elif self._special:
+                self._msg = params[-1] if params else None
+            else:
+                self._msg = self.parser.getMsg(self.action, params, self._trailing)
+        return self._msg
+
+    """ Compatibility with the dict-backed event """
+
+    def _present(self, key):
+        if key == "from":
+            return not self.from_server
+        if key == "channel":
+            return not self._special and self.action not in NO_CHANNEL
+        if key == "target":
+            return not self._special and self.action not in NO_TARGET
+        return key in self.KEYS
 
     def add(self, key, value):
-        self.data[key] = value
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
 
     def get(self, key):
-        return self.data[key]
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        if not self._present(key):
+            raise KeyError(key)
+        return getattr(self, self.KEYS[key])
 
     def has(self, key):
-        return key in self.data
+        if self._extra is not None and key in self._extra:
+            return True
+        return self._present(key)
+
+    @property
+    def data(self):
+        # Spelled out rather than walking KEYS with _present : several times faster.
+        from_server = self.from_server
+        data = {
+            "tags": self.tags,
+            "prefix": self.source,
+            "command": self.command,
+            "params": self.params,
+            "from_server": from_server,
+        }
+        if not from_server:
+            data["from"] = self.sender
+        data["action"] = self.action
+        if not self._special:
+            if self.action not in NO_TARGET:
+                data["target"] = self.target
+            if self.action not in NO_CHANNEL:
+                data["channel"] = self.channel
+        data["msg"] = self.msg
+        if self._extra is not None:
+            data.update(self._extra)
+        return data
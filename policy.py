@@ -0,0 +1,113 @@
+import asyncio
+import collections
+import inspect
+import time
+
+""" Listener isolation policies """
+
+
+class Policy:
+    """
+    Run listeners in Tasks under limits, see Dispatcher.set_policy. One Policy
+    may be shared by several listeners (ex: every listener of a module).
+
+    concurrency : max invocations running at once (0 : unlimited)
+    timeout     : seconds before an invocation is cancelled (None : no limit)
+    queue       : invocations waiting for a free slot once concurrency is reached
+    overflow    : 'drop' the invocation when the queue is full, or 'wait' : the
+                  read loop waits for room (backpressure on lines from the server,
+                  events emitted by code are queued past the limit)
+    """
+
+    DROP = "drop"
+    WAIT = "wait"
+
+    def __init__(self, concurrency=0, timeout=None, queue=0, overflow=DROP):
+        if overflow not in (self.DROP, self.WAIT):
+            raise ValueError("overflow must be 'drop' or 'wait', not %r" % (overflow))
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue = queue
+        self.overflow = overflow
+
+        self.running = 0
+        self.waiting = collections.deque()
+        self._room = collections.deque()
+
+        self.completed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_options(cls, options):
+        """Build a Policy from a dict of keyword arguments (or return a Policy as is)."""
+        if options is None or isinstance(options, cls):
+            return options
+        return cls(**options)
+
+    def full(self):
+        return bool(self.concurrency) and self.running >= self.concurrency and len(self.waiting) >= self.queue
+
+    def submit(self, dispatcher, event, listener, args, kwargs):
+        """Start or queue an invocation, return False if it was dropped."""
+        if not self.concurrency or self.running < self.concurrency:
+            self.running += 1
+            asyncio.create_task(self._run(dispatcher, (event, listener, args, kwargs)))
+            return True
+        if len(self.waiting) < self.queue or self.overflow == self.WAIT:
+            self.waiting.append((event, listener, args, kwargs))
+            return True
+        self.dropped += 1
+        return False
+
+    async def wait(self):
+        """With overflow='wait', return once an invocation can be submitted."""
+        while self.overflow == self.WAIT and self.full():
+            room = asyncio.get_running_loop().create_future()
+            self._room.append(room)
+            await room
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": len(self.waiting),
+            "completed": self.completed,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+        }
+
+    async def _run(self, dispatcher, job):
+        """Run invocations until none is queued, each slot is one Task."""
+        try:
+            while job is not None:
+                await self._invoke(dispatcher, *job)
+                job = self.waiting.popleft() if self.waiting else None
+                while self._room:
+                    room = self._room.popleft()
+                    if not room.done():
+                        room.set_result(None)
+                        break
+        finally:
+            self.running -= 1
+
+    async def _invoke(self, dispatcher, event, listener, args, kwargs):
+        metrics = dispatcher.metrics
+        start = time.perf_counter()
+        try:
+            result = listener(*args, **kwargs)
+            if inspect.isawaitable(result):
+                if self.timeout:
+                    await asyncio.wait_for(result, self.timeout)
+                else:
+                    await result
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            dispatcher._failed(event, listener, asyncio.TimeoutError("timed out after %ss" % (self.timeout)))
+        except Exception as exc:
+            self.failures += 1
+            dispatcher._failed(event, listener, exc)
+        if metrics is not None:
+            metrics.listener(event, listener, time.perf_counter() - start)
@@ -0,0 +1,103 @@
+import asyncio
+import multiprocessing
+
+from .client import Client
+
+""" Many clients, one event loop """
+
+
+class ClientPool:
+    """
+    Host many Client instances on a single event loop. Script modules are
+    imported and scanned once for the whole process, each client gets its
+    own instances.
+    """
+
+    def __init__(self, configs=None):
+        self.clients = {}
+        for name, options in (configs or {}).items():
+            self.add(name, options)
+
+    def add(self, name, options):
+        """Create a client from options (or register an existing Client)."""
+        if name in self.clients:
+            raise ValueError("Client %s already in the pool" % (name))
+        client = options if isinstance(options, Client) else Client(options)
+        self.clients[name] = client
+        return client
+
+    def get(self, name):
+        return self.clients.get(name)
+
+    async def remove(self, name):
+        client = self.clients.pop(name, None)
+        if client:
+            await client.disconnect()
+        return client
+
+    """ Aggregated start / stop """
+
+    async def start(self):
+        """Connect every client concurrently, return {name: exception} of the failed ones."""
+        names = list(self.clients)
+        results = await asyncio.gather(*(self.clients[name].connect() for name in names), return_exceptions=True)
+        failed = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                self.clients[name].log.error("%s : connection failed (%r)" % (name, result))
+                failed[name] = result
+        return failed
+
+    async def stop(self):
+        """Disconnect every client, Client.disconnect cancels their pending reconnects."""
+        await asyncio.gather(*(client.disconnect() for client in self.clients.values()), return_exceptions=True)
+
+    def health(self):
+        """Per client health and totals."""
+        clients = {name: client.health() for name, client in self.clients.items()}
+        return {
+            'clients': clients,
+            'total': len(clients),
+            'connected': sum(1 for health in clients.values() if health['connected']),
+            'channels': sum(health['channels'] for health in clients.values()),
+            'users': sum(health['users'] for health in clients.values()),
+        }
+
+    def run(self):
+        """Connect and run every client in a single event loop."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self.start())
+        try:
+            loop.run_forever()
+        finally:
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+    """ Process sharding """
+
+    @classmethod
+    def run_sharded(cls, configs, processes=None):
+        """
+        Split {name: options} across `processes` processes (one per CPU by
+        default), each running its own pool. Blocks until they exit.
+        """
+        processes = min(processes or multiprocessing.cpu_count(), len(configs)) or 1
+        names = sorted(configs)
+        shards = [{name: configs[name] for name in names[index::processes]} for index in range(processes)]
+
+        workers = [multiprocessing.Process(target=_run_shard, args=(cls, shard), daemon=True) for shard in shards]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+        return workers
+
+
+def _run_shard(cls, configs):
+    cls(configs).run()
@@ -0,0 +1,105 @@
+import asyncio
+import random
+import time
+
+""" Reconnect state machine """
+
+
+class Reconnector:
+    """
+    Reconnect a Client with exponential backoff and jitter, without blocking
+    the event loop. The attempt counter is reset once the server registers us.
+    """
+
+    CONNECTED = "connected"
+    WAITING = "waiting"
+    CONNECTING = "connecting"
+    REGISTERING = "registering"
+    STOPPED = "stopped"
+
+    def __init__(self, client, delay=5, max_delay=300, retries=5, jitter=0.5):
+        self.client = client
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retries = retries # 0 : retry forever
+        self.jitter = jitter
+
+        self.state = self.CONNECTED
+        self.attempts = 0
+        self._task = None
+
+        self.reconnects = 0
+        self.failures = 0
+        self.downtime = 0
+        self.last_downtime = 0
+        self.lost_at = None
+
+    def backoff(self, attempt):
+        """Delay before the given attempt (0 based)."""
+        delay = min(self.max_delay, self.delay * (2 ** attempt))
+        return delay * (1 - self.jitter * random.random())
+
+    def start(self):
+        """Connection lost, start reconnecting unless already doing so."""
+        if self.lost_at is None:
+            self.lost_at = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self.state = self.STOPPED
+
+    async def run(self):
+        log = self.client.log
+        while not self.retries or self.attempts < self.retries:
+            delay = self.backoff(self.attempts)
+            self.attempts += 1
+            self.state = self.WAITING
+            if self.client.opt.get('debug'):
+                log.info("Trying to reconnect n°%d in %.1fs." % (self.attempts, delay))
+            self.client.emit("reconnecting", self.attempts, delay)
+            await asyncio.sleep(delay)
+
+            self.state = self.CONNECTING
+            try:
+                await self.client.connect()
+            except (OSError, asyncio.TimeoutError) as exc:
+                self.failures += 1
+                log.warn("Reconnect n°%d failed : %r" % (self.attempts, exc))
+                continue
+            self.state = self.REGISTERING
+            return
+
+        self.state = self.STOPPED
+        log.error("Giving up reconnecting after %d attempts." % (self.attempts))
+        self.client.emit("reconnect_failed", self.attempts)
+
+    def registered(self):
+        """
+        Called on 001. Return True when this registration ends a reconnect,
+        so the client restores its state.
+        """
+        reconnected = self.lost_at is not None
+        if reconnected:
+            self.last_downtime = time.monotonic() - self.lost_at
+            self.downtime += self.last_downtime
+            self.reconnects += 1
+            self.lost_at = None
+        self.attempts = 0
+        self.state = self.CONNECTED
+        return reconnected
+
+    def stats(self):
+        current = time.monotonic() - self.lost_at if self.lost_at is not None else 0
+        return {
+            "state": self.state,
+            "attempts": self.attempts,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "downtime": self.downtime + current,
+            "last_downtime": self.last_downtime,
+            "current_downtime": current,
+        }
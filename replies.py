@@ -0,0 +1,253 @@
+import asyncio
+import collections
+import itertools
+
+"""
+Request/response correlation : send a command and await the numerics it
+produces, up to its end reply.
+"""
+
+
+class Spec:
+    """
+    Numerics answering a command. ends close the request, errors close it
+    too when the server sends no end after them. keyed : the end reply
+    repeats the target of the command in its second param.
+    """
+
+    __slots__ = ("replies", "ends", "errors", "keyed")
+
+    def __init__(self, replies, ends, errors=(), keyed=True):
+        self.replies = replies
+        self.ends = ends
+        self.errors = errors
+        self.keyed = keyed
+
+
+SPECS = {
+    # 401/402 are followed by 318, they are replies and not errors.
+    "WHOIS": Spec(("311", "312", "313", "317", "319", "330", "338", "671", "301", "276", "307", "320", "378", "379", "401", "402"), ("318",), ("431",)),
+    "WHOWAS": Spec(("314", "312", "330", "406"), ("369",), ("431",)),
+    "WHO": Spec(("352", "354"), ("315",)),
+    "NAMES": Spec(("353",), ("366",)),
+    "MODE b": Spec(("367",), ("368",), ("403", "442", "482")),
+    "MODE e": Spec(("348",), ("349",), ("403", "442", "482")),
+    "MODE I": Spec(("346",), ("347",), ("403", "442", "482")),
+    "LIST": Spec(("321", "322"), ("323",), keyed=False),
+    "MOTD": Spec(("375", "372"), ("376",), ("422",), keyed=False),
+}
+
+
+def family_of(line):
+    """(SPECS key, target) of a command line."""
+    words = line.split()
+    command = words[0].upper() if words else ""
+    if command == "MODE" and len(words) > 2 and words[2].lstrip("+") in ("b", "e", "I"):
+        return "MODE %s" % (words[2].lstrip("+")), words[1]
+    if command == "WHOIS" and len(words) > 1:
+        # WHOIS [server] nick
+        return command, words[-1]
+    return command, words[1] if len(words) > 1 else None
+
+
+class Reply:
+    """
+    Events answering a request, end reply included. reply["311"] lists the
+    params (without our nick) of every 311 received.
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.events = []
+        self.error = None
+
+    def __getitem__(self, numeric):
+        return [event.get('params')[1:] for event in self.events if event.command == numeric]
+
+    def __contains__(self, numeric):
+        return any(event.command == numeric for event in self.events)
+
+    def first(self, numeric):
+        """Params of the first numeric reply, None if there is none."""
+        for event in self.events:
+            if event.command == numeric:
+                return event.get('params')[1:]
+        return None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return "<Reply %r %s>" % (self.line, " ".join(event.command for event in self.events))
+
+
+class _Pending:
+    __slots__ = ("key", "family", "spec", "target", "reply", "future", "timer")
+
+    def __init__(self, key, family, spec, target, reply, future):
+        self.key = key
+        self.family = family
+        self.spec = spec
+        self.target = target
+        self.reply = reply
+        self.future = future
+        self.timer = None
+
+
+class RequestTracker:
+    """
+    Correlate commands with their numeric replies, see Client.request.
+
+    With labeled-response (and batch) the server tags every reply with the
+    label of the command, correlation is exact. Otherwise requests of a
+    family wait in a FIFO, replies go to the oldest one, which is closed by
+    the end reply carrying its target : servers answer commands in order.
+    Identical requests in flight share the same reply.
+    """
+
+    def __init__(self, client, timeout=30):
+        self.client = client
+        self.timeout = timeout
+        self._inflight = {} # normalized line -> _Pending
+        self._queues = collections.defaultdict(collections.deque) # family -> FIFO of _Pending
+        self._labels = {}
+        self._batches = {} # labeled-response batch reference -> _Pending
+        self._ids = itertools.count(1)
+        self._listening = False
+        self._numerics = {}
+
+    def labeled(self):
+        return "labeled-response" in self.client.activeCAP and "batch" in self.client.activeCAP
+
+    async def request(self, line, timeout=None):
+        """
+        Send line and return its Reply once the end reply arrived. Raise
+        ValueError for commands without known replies, asyncio.TimeoutError
+        after timeout seconds (shared by identical requests) and
+        ConnectionError if the connection is lost first.
+        """
+        family, target = family_of(line)
+        spec = SPECS.get(family)
+        if spec is None:
+            raise ValueError("No known reply to %r" % (line))
+        self._listen()
+
+        # WHO #chan and WHO #chan %fields,token are different requests.
+        key = "%s %s %s" % (family, self.client.casefold(target) if target else "", " ".join(line.split()[2:]))
+        pending = self._inflight.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self._inflight[key] = _Pending(key, family, spec, target, Reply(line), loop.create_future())
+            timeout = self.timeout if timeout is None else timeout
+            if timeout:
+                pending.timer = loop.call_later(timeout, self._fail, pending, asyncio.TimeoutError(line))
+            if self.labeled():
+                label = "r%d" % (next(self._ids))
+                self._labels[label] = pending
+                await self.client.send("@label=%s %s" % (label, line))
+            else:
+                self._queues[family].append(pending)
+                await self.client.send(line)
+        return await asyncio.shield(pending.future)
+
+    def pending(self):
+        return len(self._inflight)
+
+    def _listen(self):
+        if self._listening:
+            return
+        self._listening = True
+        for family, spec in SPECS.items():
+            for numeric in spec.replies + spec.ends + spec.errors:
+                self._numerics.setdefault(numeric, set()).add(family)
+        for numeric in self._numerics:
+            self.client.on(numeric, self.numeric_event)
+        self.client.on("batch", self.batch_event)
+        self.client.on("ack", self.ack_event)
+        self.client.on("disconnected", self.disconnected_event)
+
+    def _finish(self, pending):
+        self._drop(pending)
+        if not pending.future.done():
+            pending.future.set_result(pending.reply)
+
+    def _fail(self, pending, exc):
+        self._drop(pending)
+        if not pending.future.done():
+            pending.future.set_exception(exc)
+            # Retrieved or not, the failure is reported to the waiters only.
+            pending.future.exception()
+
+    def _drop(self, pending):
+        if pending.timer is not None:
+            pending.timer.cancel()
+        if self._inflight.get(pending.key) is pending:
+            del self._inflight[pending.key]
+        queue = self._queues.get(pending.family)
+        if queue and pending in queue:
+            queue.remove(pending)
+        for table in (self._labels, self._batches):
+            for name in [name for name, each in table.items() if each is pending]:
+                del table[name]
+
+    def _add(self, pending, event):
+        pending.reply.events.append(event)
+        if event.command in pending.spec.errors or (pending.reply.error is None and event.command[0] in "45"):
+            pending.reply.error = event
+
+    """ Handle events """
+
+    def numeric_event(self, event):
+        tags = event.get('tags')
+        if tags:
+            if tags.get('batch') in self._batches:
+                self._add(self._batches[tags['batch']], event)
+                return
+            if tags.get('label') in self._labels:
+                # Single line response.
+                pending = self._labels[tags['label']]
+                self._add(pending, event)
+                self._finish(pending)
+                return
+
+        for family in self._numerics.get(event.command, ()):
+            queue = self._queues.get(family)
+            if not queue:
+                continue
+            pending = queue[0]
+            spec = pending.spec
+            if event.command in spec.ends:
+                params = event.get('params')
+                if spec.keyed and pending.target and (len(params) < 2 or self.client.casefold(params[1]) != self.client.casefold(pending.target)):
+                    # End of a command someone else sent.
+                    continue
+                self._add(pending, event)
+                self._finish(pending)
+            elif event.command in spec.errors:
+                self._add(pending, event)
+                self._finish(pending)
+            else:
+                self._add(pending, event)
+            return
+
+    def batch_event(self, event):
+        params = event.get('params')
+        if not params:
+            return
+        ref = params[0][1:]
+        if params[0][0] == "+":
+            label = event.get('tags').get('label')
+            if label in self._labels and len(params) > 1 and params[1] == "labeled-response":
+                self._batches[ref] = self._labels.pop(label)
+        elif ref in self._batches:
+            self._finish(self._batches[ref])
+
+    def ack_event(self, event):
+        pending = self._labels.get(event.get('tags').get('label'))
+        if pending is not None:
+            self._finish(pending)
+
+    def disconnected_event(self, event):
+        for pending in list(self._inflight.values()):
+            self._fail(pending, ConnectionError("Disconnected before the reply to %r" % (pending.reply.line)))
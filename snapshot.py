@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+"""
+Channel state snapshots in SQLite : ISUPPORT, channels, members with their
+status and ban lists. Loaded on start so the state can be queried before the
+NAMES replies of the server arrive, see Channel.synced.
+"""
+
+VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS isupport (token TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS channels (name TEXT PRIMARY KEY, key TEXT);
+CREATE TABLE IF NOT EXISTS members (channel TEXT, nick TEXT, ident TEXT, host TEXT, status INTEGER);
+CREATE TABLE IF NOT EXISTS bans (channel TEXT, mask TEXT, setter TEXT, stamp TEXT);
+"""
+
+
+class Snapshot:
+    """Save and restore the state of a Client to a SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.saved = None
+        self.saving = False
+
+    def collect(self, client):
+        """Copy the state in plain rows, on the loop (fast, no I/O)."""
+        channels = []
+        members = []
+        bans = []
+        for name, channel in client.channels.items():
+            channels.append((name, channel.key))
+            for member in channel.users.values():
+                user = member.user
+                members.append((name, user.nick, user.ident, user.host, member.status))
+            for item in channel.bans.masks.values():
+                setter, stamp = item.data if item.data else (None, None)
+                bans.append((name, item.mask, setter, stamp))
+        return {
+            "meta": [("version", str(VERSION)), ("hostname", client.opt.get('hostname') or ""), ("time", str(time.time()))],
+            "isupport": list(client.isupport.tokens.items()),
+            "channels": channels,
+            "members": members,
+            "bans": bans,
+        }
+
+    def write(self, rows):
+        """Replace the file content with rows, in a single transaction (thread safe)."""
+        temp = "%s.tmp" % (self.path)
+        db = sqlite3.connect(temp)
+        try:
+            db.executescript(SCHEMA)
+            with db:
+                for table in ("meta", "isupport", "channels", "members", "bans"):
+                    db.execute("DELETE FROM %s" % (table))
+                    if rows[table]:
+                        db.executemany("INSERT INTO %s VALUES (%s)" % (table, ",".join("?" * len(rows[table][0]))), rows[table])
+        finally:
+            db.close()
+        os.replace(temp, self.path)
+        self.saved = time.time()
+
+    def read(self):
+        """Return the rows of the file, None if there is none."""
+        if not os.path.exists(self.path):
+            return None
+        db = sqlite3.connect(self.path)
+        try:
+            return {
+                table: db.execute("SELECT * FROM %s" % (table)).fetchall()
+                for table in ("meta", "isupport", "channels", "members", "bans")
+            }
+        except sqlite3.DatabaseError:
+            return None
+        finally:
+            db.close()
+
+    async def save(self, client):
+        """Collect on the loop, write in a thread."""
+        if self.saving:
+            return
+        self.saving = True
+        try:
+            rows = self.collect(client)
+            await asyncio.get_running_loop().run_in_executor(None, self.write, rows)
+        finally:
+            self.saving = False
+
+    def load(self, client):
+        """
+        Restore the state saved for the same hostname. Channels are created
+        with synced=False, NAMES (366) reconciles them. Return the number of
+        channels restored.
+        """
+        rows = self.read()
+        if not rows:
+            return 0
+        meta = dict(rows["meta"])
+        if meta.get("version") != str(VERSION) or meta.get("hostname") != (client.opt.get('hostname') or ""):
+            return 0
+
+        client.isupport.tokens.update(rows["isupport"])
+        client.isupport.update()
+        client.parser.chantypes = client.isupport.chantypes
+        client.dispatcher.set_chantypes(client.isupport.chantypes)
+        client.refold()
+
+        channels = {}
+        for name, key in rows["channels"]:
+            channel = client.channels.get(client.casefold(name)) or client.channel(name)
+            channel.key = key
+            channel.synced = False
+            channels[name] = channel
+        for name, nick, ident, host, status in rows["members"]:
+            if name in channels:
+                channels[name]._add_member(nick, ident, host, status)
+        for name, mask, setter, stamp in rows["bans"]:
+            if name in channels:
+                channels[name].bans.add(mask, (setter, stamp))
+        return len(channels)
@@ -0,0 +1,201 @@
+"""
+Outgoing line splitting in bytes : the 512 bytes of an IRC line count the
+source prefix the server adds when relaying it (:nick!user@host), the CRLF,
+and UTF-8 characters take more than one byte.
+"""
+
+LINE_BYTES = 512 # CRLF included, message tags excluded
+# Source prefix assumed until our hostmask is known, besides the nick : ":" "!~" ident(10) "@" host(63) " "
+UNKNOWN_SOURCE = 78
+
+
+def split_text(text, size):
+    """
+    Split text in chunks of at most size UTF-8 bytes, at the last space when
+    there is one. A character wider than size makes a chunk of its own.
+    """
+    data = text.encode("utf-8")
+    if len(data) <= size:
+        return [text]
+    chunks = []
+    while len(data) > size:
+        cut = size
+        # Never in the middle of a character : back to the start of the UTF-8 sequence.
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        if cut == 0:
+            # size is narrower than this character : it goes alone on its line.
+            cut = 1
+            while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+                cut += 1
+        space = data.rfind(b" ", 0, cut + 1)
+        if space > size // 2:
+            chunks.append(data[:space].decode("utf-8"))
+            data = data[space + 1:]
+        else:
+            chunks.append(data[:cut].decode("utf-8"))
+            data = data[cut:]
+    if data:
+        chunks.append(data.decode("utf-8"))
+    return chunks
+
+
+def split_line(line, reserved=UNKNOWN_SOURCE, limit=LINE_BYTES):
+    """
+    Lines of at most limit bytes, once relayed with reserved bytes of source
+    prefix. Only the trailing (:) param is split, the command, targets and
+    message tags are repeated on each line. A CTCP ACTION stays an ACTION on
+    each line. Lines without trailing param are returned untouched.
+    """
+    tags = ""
+    body = line
+    if line.startswith("@"):
+        tags, _, body = line.partition(" ")
+        tags += " "
+    length = len(body) if body.isascii() else len(body.encode("utf-8"))
+    if length + reserved + 2 <= limit:
+        return [line]
+
+    split = body.find(" :")
+    if split == -1:
+        return [line]
+    head, text = body[:split + 2], body[split + 2:]
+    size = limit - 2 - reserved - len(head.encode("utf-8"))
+
+    action = text.startswith("\x01ACTION ") and text.endswith("\x01")
+    if action:
+        text = text[8:-1]
+        size -= 9
+    if size < 1 or len(text.encode("utf-8")) <= size:
+        return [line]
+
+    if action:
+        return ["%s%s\x01ACTION %s\x01" % (tags, head, chunk) for chunk in split_text(text, size)]
+    return ["%s%s%s" % (tags, head, chunk) for chunk in split_text(text, size)]
+
+
+def pack_targets(targets, count, room):
+    """
+    Group targets for comma separated commands : at most count targets per
+    group (0 : no limit) and room bytes for the joined targets.
+    """
+    groups = []
+    group = []
+    used = 0
+    for target in targets:
+        extra = len(target.encode("utf-8")) + (1 if group else 0)
+        if group and ((count and len(group) >= count) or used + extra > room):
+            groups.append(group)
+            group = []
+            extra -= 1
+            used = 0
+        group.append(target)
+        used += extra
+    if group:
+        groups.append(group)
+    return groups
+
+
+class MessageSplitter:
+    """
+    Track the source prefix the server puts on our messages : our nick
+    (001, NICK) and user@host from the JOIN echoes, 396 (displayed host),
+    CHGHOST, or our entry in the channel members (userhost-in-names).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.nick = None
+        self.ident = None
+        self.host = None
+
+        client.on("001", self.welcome_event)
+        client.on("396", self.host_hidden_event)
+        client.on("join", self.join_event)
+        client.on("nick", self.nick_event)
+        client.on("chghost", self.chghost_event)
+
+    @property
+    def hostmask(self):
+        nick, ident, host = self._source()
+        if ident and host:
+            return "%s!%s@%s" % (nick, ident, host)
+        return None
+
+    def reserved(self):
+        """Bytes of the ":nick!user@host " prefix of our relayed messages."""
+        nick, ident, host = self._source()
+        if not host:
+            return UNKNOWN_SOURCE + len(nick)
+        # A 396 may only give the host, the ident is then counted at its longest.
+        return len(nick.encode("utf-8")) + (len(ident.encode("utf-8")) if ident else 11) + len(host.encode("utf-8")) + 4
+
+    def split(self, line):
+        return split_line(line, self.reserved())
+
+    def pack(self, command, targets, text=None):
+        """
+        Lines sending text to every target (or command alone, as JOIN/PART),
+        with as many targets per line as the server TARGMAX allows.
+        """
+        count = self.client.isupport.max_targets(command)
+        budget = LINE_BYTES - 2 - self.reserved() - len(command) - 2
+        if text is None:
+            room = budget
+        else:
+            needed = len(text.encode("utf-8")) + 2
+            # Leave the text on a single line when it fits beside a target list, split it otherwise.
+            room = budget - needed if budget - needed >= budget // 4 else budget // 2
+        lines = []
+        for group in pack_targets(targets, count, room):
+            if text is None:
+                lines.append("%s %s" % (command, ",".join(group)))
+            else:
+                lines.extend(self.split("%s %s :%s" % (command, ",".join(group), text)))
+        return lines
+
+    def _source(self):
+        nick = self.nick or self.client.opt.get('nickname')
+        if self.host:
+            return nick, self.ident, self.host
+        # Our own entry in the channels members, from NAMES with userhost-in-names.
+        user = self.client.users.get(nick)
+        if user is not None:
+            return nick, user.ident, user.host
+        return nick, None, None
+
+    def _me(self, nick):
+        return self.client.casefold(nick) == self.client.casefold(self.nick or self.client.opt.get('nickname'))
+
+    """ Handle events """
+
+    def welcome_event(self, event):
+        params = event.get('params')
+        if params:
+            self.nick = params[0]
+        # Some servers end the welcome with our nick!user@host.
+        last = (event.get('msg') or "").split()[-1:]
+        if last and "!" in last[0] and "@" in last[0]:
+            self.ident, _, self.host = last[0].partition("!")[2].partition("@")
+
+    def host_hidden_event(self, event):
+        params = event.get('params')
+        if len(params) > 2:
+            ident, _, host = params[1].rpartition("@")
+            if ident:
+                self.ident = ident
+            self.host = host
+
+    def join_event(self, event):
+        nick, ident, host = event.get('from')
+        if self._me(nick) and ident and host:
+            self.nick, self.ident, self.host = nick, ident, host
+
+    def nick_event(self, event):
+        if self._me(event.get('from')[0]):
+            self.nick = event.get('msg')
+
+    def chghost_event(self, event):
+        params = event.get('params')
+        if self._me(event.get('from')[0]) and len(params) > 1:
+            self.ident, self.host = params[0], params[1]
@@ -0,0 +1,19 @@
+"""
+Shared helpers for the tests, run them from the repository :
+    python -m pytest -q
+"""
+
+import importlib
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.dirname(ROOT))
+
+pyrc = importlib.import_module(os.path.basename(ROOT))
+
+
+def load(name):
+    """Import a submodule of the library (ex: load('parser'))."""
+    return importlib.import_module("%s.%s" % (pyrc.__name__, name))
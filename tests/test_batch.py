@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from conftest import load
+
+batch = load("batch")
+client = load("client")
+ircd = load("ircd")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_netsplit_and_netjoin_are_applied_at_once():
+    bot = client.Client({'dispatch': 'inline'})
+    channel = bot.channel("#a")
+    splits = []
+    quits = []
+    bot.on("netsplit", lambda each, nicks, channels: splits.append((sorted(nicks), channels)))
+    bot.on("quit", lambda event: quits.append(event))
+    feed(bot, ":alice!a@h JOIN #a", ":bob!b@h JOIN #a", ":carol!c@h JOIN #a",
+         ":irc.test BATCH +s1 netsplit irc.test split.test",
+         "@batch=s1 :alice!a@h QUIT :irc.test split.test",
+         "@batch=s1 :bob!b@h QUIT :irc.test split.test")
+    # Nothing is applied until the batch ends.
+    assert sorted(channel.users) == ["alice", "bob", "carol"]
+    feed(bot, ":irc.test BATCH -s1")
+    assert sorted(channel.users) == ["carol"] and "alice" not in bot.users
+    assert splits == [(["alice", "bob"], {"#a": ["alice", "bob"]})] and quits == []
+
+    feed(bot, ":irc.test BATCH +j1 draft/netjoin irc.test split.test",
+         "@batch=j1 :alice!a@h JOIN #a", ":irc.test BATCH -j1")
+    assert sorted(channel.users) == ["alice", "carol"]
+
+
+def test_other_batches_are_dispatched_as_usual():
+    bot = client.Client({'dispatch': 'inline'})
+    seen = []
+    bot.on("privmsg", lambda event: seen.append(event.get('msg')))
+    feed(bot, ":irc.test BATCH +l1 labeled-response", "@batch=l1 :a!a@h PRIVMSG #a :hi", ":irc.test BATCH -l1")
+    assert seen == ["hi"] and not bot.batches.open
+
+
+def test_history_is_paged_newest_first():
+    async def run():
+        server = ircd.FakeIRCd()
+        port = await server.start()
+        bot = client.Client({'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': 'bot', 'auto_reconnect': False, 'flood_control': False})
+        welcomed = asyncio.Event()
+        bot.on("001", lambda event: welcomed.set())
+        await bot.connect()
+        await asyncio.wait_for(welcomed.wait(), 5)
+        await bot.join("#x")
+        for index in range(5):
+            await bot.send("PRIVMSG #x :message %d" % (index))
+        end = time.monotonic() + 5
+        while len(server.channels.get("#x", ircd.FakeChannel("#x")).history) < 5 and time.monotonic() < end:
+            await asyncio.sleep(0.01)
+        sent = len(server.channels["#x"].history)
+
+        messages = [event.get('msg') async for event in bot.history("#x", limit=4, page=3)]
+        try:
+            [event async for event in bot.history("#nowhere")]
+            failed = None
+        except batch.HistoryError as exc:
+            failed = exc.args[0]
+        await bot.disconnect()
+        await server.stop()
+        return sent, messages, failed
+
+    sent, messages, failed = asyncio.run(run())
+    assert sent == 5
+    assert messages == ["message 4", "message 3", "message 2", "message 1"]
+    assert failed is not None
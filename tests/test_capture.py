@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from conftest import load
+
+capture = load("capture")
+client = load("client")
+
+
+@pytest.mark.parametrize("name", ["traffic.log", "traffic.log.gz"])
+def test_writer_records_whole_lines(tmp_path, name):
+    path = str(tmp_path / name)
+    writer = capture.CaptureWriter(path)
+    writer.record_in(b":irc.test 001 bot :Wel")
+    writer.record_in(b"come\r\nPING :a\r\n")
+    writer.record_out(b"PONG :a\r\n")
+    writer.close()
+    records = [(direction, line) for direction, _, line in capture.read_capture(path)]
+    assert records == [("I", b":irc.test 001 bot :Welcome"), ("I", b"PING :a"), ("O", b"PONG :a")]
+
+
+def test_replay_rebuilds_the_state(tmp_path):
+    path = str(tmp_path / "traffic.log")
+    writer = capture.CaptureWriter(path)
+    writer.record_in(b":alice!a@host JOIN #a\r\n:irc.test 353 bot = #a :@alice bob\r\n:irc.test 366 bot #a :End\r\nPING :x\r\n")
+    writer.record_out(b"JOIN #a\r\n")
+    writer.close()
+
+    async def run():
+        bot = client.Client({'dispatch': 'inline'})
+        bot.channel("#a")
+        return await capture.replay(bot, path), bot.connection.sent
+
+    report, sent = asyncio.run(run())
+    assert report["lines"] == 4 and report["captured_sent"] == 1
+    assert report["state"] == {"channels": {"#a": {"alice": [client.Channel.OP], "bob": []}}, "users": 2}
+    assert "PONG x" in sent
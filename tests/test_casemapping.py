@@ -0,0 +1,41 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_casefold_follows_casemapping():
+    bot = client.Client({'dispatch': 'inline'})
+    assert bot.casefold("#[A]~") == "#{a}^"
+    feed(bot, ":irc.test 005 bot CASEMAPPING=ascii :are supported by this server")
+    assert bot.casefold("#[A]~") == "#[a]~"
+
+
+def test_channels_are_folded_again_when_casemapping_changes():
+    bot = client.Client({'dispatch': 'inline'})
+    channel = bot.channel("#[Chan]")
+    seen = []
+    bot.on("privmsg#{chan}", lambda event: seen.append(event.get('msg')))
+    feed(bot, ":alice!a@host JOIN #[Chan]")
+    assert bot.channels["#{chan}"] is channel
+    assert bot.users.get("alice").channels == {"#{chan}"}
+
+    feed(bot, ":irc.test 005 bot CASEMAPPING=ascii :are supported by this server")
+    assert channel.name == "#[chan]"
+    assert bot.channels == {"#[chan]": channel}
+    assert bot.users.get("alice").channels == {"#[chan]"}
+
+    # The listeners of the channel (its own and the modules') still fire.
+    feed(bot, ":bob!b@host JOIN #[CHAN]", ":alice!a@host PRIVMSG #[chan] :hello", ":alice!a@host PART #[chan]")
+    assert sorted(channel.users) == ["bob"]
+    assert seen == ["hello"]
+    assert "alice" not in bot.users
@@ -0,0 +1,45 @@
+import asyncio
+
+from conftest import load
+
+connection = load("connection")
+
+
+class Writer:
+    def __init__(self):
+        self.writes = []
+        self.drains = 0
+
+    def write(self, data):
+        self.writes.append(data)
+
+    async def drain(self):
+        self.drains += 1
+
+
+def sent(coalesce, flush_bytes=4096):
+    async def run():
+        each = connection.Connection("irc", 6667, False, flood_control=False, coalesce=coalesce, flush_bytes=flush_bytes)
+        each.reader, each.writer = object(), Writer()
+        sender = asyncio.create_task(each.send_forever())
+        await each.send("PRIVMSG #a :one")
+        await each.send("PRIVMSG #b :two")
+        await each.send("PRIVMSG #c :three", wait=True)
+        sender.cancel()
+        return each.writer.writes, each.writer.drains
+
+    return asyncio.run(run())
+
+
+def test_lines_queued_together_are_written_at_once():
+    assert sent(True) == ([b"PRIVMSG #a :one\r\nPRIVMSG #b :two\r\nPRIVMSG #c :three\r\n"], 1)
+
+
+def test_without_coalescing_each_line_is_drained():
+    writes, drains = sent(False)
+    assert (len(writes), drains) == (3, 3)
+
+
+def test_flush_bytes_bounds_a_write():
+    writes, _ = sent(True, flush_bytes=40)
+    assert writes == [b"PRIVMSG #a :one\r\nPRIVMSG #b :two\r\n", b"PRIVMSG #c :three\r\n"]
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+commands = load("commands")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_arguments_are_parsed_and_converted():
+    args = commands.Arguments("<nick> [count:int] [reason...]")
+    assert args.parse("bob 3 too much noise") == ["bob", 3, "too much noise"]
+    assert args.parse("bob") == ["bob", None, None]
+    with pytest.raises(commands.UsageError):
+        args.parse("")
+    with pytest.raises(commands.UsageError):
+        args.parse("bob many")
+    with pytest.raises(ValueError):
+        commands.Arguments("<nick:date>")
+
+
+def test_router_emits_the_matching_command_only():
+    bot = client.Client({'dispatch': 'inline'})
+    calls = []
+    errors = []
+    bot.router.add("kick", lambda event, nick, reason: calls.append(("kick", nick, reason)), args="<nick> [reason...]", aliases=("k",))
+    bot.router.add("kickban", lambda event, rest: calls.append(("kickban", rest)))
+    bot.on("command_error", lambda event, command, reason: errors.append((command.name, reason)))
+    feed(bot,
+         ":op!o@h PRIVMSG #x :!KICK bob go away",
+         ":op!o@h PRIVMSG #x :!k bob",
+         ":op!o@h PRIVMSG #x :!kickban bob",
+         ":op!o@h PRIVMSG #x :!kic bob",
+         ":op!o@h PRIVMSG #x :!kick",
+         ":op!o@h PRIVMSG #x :hello !kick bob")
+    assert calls == [("kick", "bob", "go away"), ("kick", "bob", None), ("kickban", "bob")]
+    assert errors == [("kick", "usage")]
+
+
+def test_cooldown_and_user_rate():
+    bot = client.Client({'dispatch': 'inline'})
+    calls = []
+    errors = []
+    bot.router.add("slow", lambda event, rest: calls.append(rest), cooldown=60)
+    bot.router.add("rated", lambda event, rest: calls.append(rest), user_rate=(1, 60))
+    bot.on("command_error", lambda event, command, reason: errors.append(reason))
+    feed(bot,
+         ":a!a@h PRIVMSG #x :!slow 1", ":a!a@h PRIVMSG #x :!slow 2",
+         ":a!a@h PRIVMSG #x :!rated 3", ":A!a@h PRIVMSG #x :!rated 4", ":b!b@h PRIVMSG #x :!rated 5")
+    assert calls == ["1", "3", "5"]
+    assert errors == ["cooldown", "rate"]
+
+
+def test_abbreviations_and_remove():
+    bot = client.Client({'dispatch': 'inline'})
+    router = commands.CommandRouter(bot, prefix=("!", "."), abbreviations=True)
+    router.add("status", lambda event, rest: None)
+    router.add("stop", lambda event, rest: None)
+    assert router.match(".stat")[0].name == "status"
+    assert router.match("!st") is None
+    router.remove("stop")
+    assert router.match("!st")[0].name == "status"
+    assert "command:stop" not in bot.dispatcher.events
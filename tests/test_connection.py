@@ -0,0 +1,88 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+connection = load("connection")
+ircd = load("ircd")
+
+SendQueue = connection.SendQueue
+
+
+def drain(queue):
+    lines = []
+    while True:
+        item = queue.get_nowait(4096)
+        if item is None:
+            return lines
+        lines.append(item[0].decode().rstrip("\r\n"))
+
+
+def test_lanes_are_sent_by_priority():
+    async def run():
+        queue = SendQueue()
+        for line in ("PRIVMSG #x :hi", "JOIN #x", "NICK bot", "PONG :x"):
+            queue.put(line)
+        return drain(queue)
+
+    assert asyncio.run(run()) == ["PONG :x", "NICK bot", "JOIN #x", "PRIVMSG #x :hi"]
+
+
+def test_held_queue_only_serves_registration():
+    async def run():
+        queue = SendQueue()
+        queue.hold()
+        queue.put("PRIVMSG #x :hi")
+        queue.put("JOIN #x")
+        queue.put("NICK bot")
+        before = drain(queue)
+        waiter = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0)
+        blocked = not waiter.done()
+        queue.release()
+        data, _ = await asyncio.wait_for(waiter, 1)
+        return before, blocked, data, drain(queue), queue.depth
+
+    assert asyncio.run(run()) == (["NICK bot"], True, b"JOIN #x\r\n", ["PRIVMSG #x :hi"], 0)
+
+
+def test_token_bucket_burst_then_delay():
+    bucket = connection.TokenBucket(delay=10, burst=2)
+    assert [bucket.take(), bucket.take()] == [0, 0]
+    assert bucket.take() > 9
+
+
+def test_line_buffer_splits_and_falls_back():
+    buffer = connection.LineBuffer()
+    assert buffer.feed(b"PING :a\r\nPRIVMSG #x :caf\xe9\r\nPAR") == ["PING :a", "PRIVMSG #x :caf\xe9"]
+    assert buffer.feed(b"T #x\n") == ["PART #x"]
+    assert (buffer.lines, buffer.fallback) == (3, 1)
+
+
+def test_lines_queued_while_disconnected_wait_for_registration():
+    async def run():
+        server = ircd.FakeIRCd()
+        port = await server.start()
+        bot = client.Client({'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': 'bot', 'auto_reconnect': False, 'flood_control': False})
+        refused = []
+        welcomed = asyncio.Event()
+        bot.on("451", lambda event: refused.append(event))
+        bot.on("001", lambda event: welcomed.set())
+        await bot.connect()
+        await asyncio.wait_for(welcomed.wait(), 5)
+
+        await bot.connection.disconnect()
+        welcomed.clear()
+        await bot.send("JOIN #x")
+        await bot.connect()
+        await asyncio.wait_for(welcomed.wait(), 5)
+        for _ in range(100):
+            if "#x" in server.channels:
+                break
+            await asyncio.sleep(0.01)
+        joined = "#x" in server.channels
+        await bot.disconnect()
+        await server.stop()
+        return refused, joined
+
+    assert asyncio.run(run()) == ([], True)
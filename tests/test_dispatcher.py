@@ -0,0 +1,76 @@
+import asyncio
+
+from conftest import load
+
+dispatcher = load("dispatcher")
+
+
+def test_listeners_are_indexed_by_kind():
+    each = dispatcher.Dispatcher()
+
+    def plain(event):
+        pass
+
+    async def coroutine(event):
+        pass
+
+    async def slow(event):
+        pass
+
+    each.on("join", plain)
+    each.on("join", coroutine)
+    each.on("join#x", slow, task=True)
+    assert each._index["join"] == ((plain, dispatcher.FUNCTION), (coroutine, dispatcher.COROUTINE))
+    assert each._index["join#x"] == ((slow, dispatcher.TASK),)
+    assert each.wants("join") and not each.wants("part")
+
+    each.remove("join#x", slow)
+    assert "join#x" not in each._index and not each.is_task(slow)
+    each.remove("join", plain)
+    each.remove("join", coroutine)
+    assert not each.wants("join")
+
+
+def test_inline_mode_runs_listeners_in_emit_order():
+    async def run():
+        each = dispatcher.Dispatcher(mode="inline")
+        seen = []
+
+        async def first(value):
+            await asyncio.sleep(0.01)
+            seen.append(("first", value))
+
+        each.on("line", first)
+        each.on("line", lambda value: seen.append(("second", value)))
+        for value in range(3):
+            each.emit("line", value)
+        await each.dispatch("line", 3)
+        # The drain started by the first emit also runs the dispatched event.
+        await asyncio.sleep(0.1)
+        return seen
+
+    assert asyncio.run(run()) == [(name, value) for value in range(4) for name in ("first", "second")]
+
+
+def test_failures_go_to_on_error_in_both_modes():
+    async def run(mode):
+        failed = []
+        each = dispatcher.Dispatcher(mode=mode, on_error=lambda event, listener, exc: failed.append((event, type(exc))))
+
+        async def broken(event):
+            raise KeyError(event)
+
+        each.on("ping", broken)
+        each.on("ping", lambda event: 1 / 0)
+        await each.dispatch("ping", "x")
+        await asyncio.sleep(0)
+        return sorted(failed, key=repr)
+
+    expected = sorted([("ping", KeyError), ("ping", ZeroDivisionError)], key=repr)
+    assert asyncio.run(run("task")) == expected
+    assert asyncio.run(run("inline")) == expected
+
+
+def test_action_of_strips_the_channel():
+    each = dispatcher.Dispatcher(chantypes="#&")
+    assert [each.action_of(event) for event in ("join#x", "part&y", "ping")] == ["join", "part", "ping"]
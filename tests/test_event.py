@@ -0,0 +1,25 @@
+from conftest import load
+
+parser = load("parser")
+
+
+def test_fields_are_decoded_on_first_access():
+    event = parser.Parser().parse("@a=b :nick!ident@host PRIVMSG #chan :hello")
+    assert event._params is parser._UNSET and event._tags is parser._UNSET
+    assert event.msg == "hello"
+    assert event._params == ["#chan", "hello"]
+    assert event._tags is parser._UNSET
+
+
+def test_added_keys_override_and_extend():
+    event = parser.Parser().parse(":nick!ident@host PRIVMSG #chan :hello")
+    event.add("msg", "changed")
+    event.add("error", "usage")
+    assert event.get("msg") == "changed"
+    assert event.has("error")
+    assert event.data["error"] == "usage"
+
+
+def test_event_has_no_dict():
+    event = parser.Parser().parse("PING :x")
+    assert not hasattr(event, "__dict__")
@@ -0,0 +1,54 @@
+from conftest import load
+
+hostmask = load("hostmask")
+
+
+def matches(index, text):
+    return sorted(item.mask for item in index.match(text))
+
+
+def test_normalize():
+    assert hostmask.normalize("nick") == "nick!*@*"
+    assert hostmask.normalize("user@host") == "*!user@host"
+    assert hostmask.normalize("nick!user") == "nick!user@*"
+
+
+def test_every_bucket_matches():
+    index = hostmask.MaskIndex()
+    masks = ["*!*@bad.host", "nick!*@bad.host", "*!evil@*.net", "troll*!*@*", "*!*@*.isp.net", "*!*u?er@*"]
+    for mask in masks:
+        index.add(mask, ("op", None))
+    assert matches(index, "Nick!user@bad.host") == ["*!*@bad.host", "*!*u?er@*", "nick!*@bad.host"]
+    assert matches(index, "x!evil@a.net") == ["*!evil@*.net"]
+    assert matches(index, "troller!a@b") == ["troll*!*@*"]
+    assert matches(index, "x!y@dsl.isp.net") == ["*!*@*.isp.net"]
+    assert matches(index, "clean!user@good.host") == ["*!*u?er@*"]
+
+
+def test_remove():
+    index = hostmask.MaskIndex()
+    index.add("*!*@bad.host")
+    index.add("troll*!*@*")
+    index.remove("troll*!*@*")
+    assert matches(index, "troll!a@bad.host") == ["*!*@bad.host"]
+    assert "troll*!*@*" not in index and len(index) == 1
+
+
+def test_extended_bans_never_match():
+    index = hostmask.MaskIndex()
+    index.add("$a:account")
+    assert "$a:account" in index
+    assert matches(index, "account!a@b") == []
+
+
+def test_empty_masks_are_ignored():
+    index = hostmask.MaskIndex()
+    index.add("")
+    assert len(index) == 0
+    assert index.remove("") is None
+
+
+def test_casefold():
+    index = hostmask.MaskIndex()
+    index.add("*!*@Bad.Host")
+    assert matches(index, "x!y@BAD.host") == ["*!*@Bad.Host"]
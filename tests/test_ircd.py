@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from conftest import load
+
+client = load("client")
+ircd = load("ircd")
+
+
+async def wait_for(predicate, timeout=5):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "timed out"
+        await asyncio.sleep(0.005)
+
+
+async def joined_bot():
+    server = ircd.FakeIRCd()
+    port = await server.start()
+    bot = client.Client({'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': 'bot', 'auto_reconnect': False, 'flood_control': False})
+    bot.channel("#x")
+    done = asyncio.Event()
+    bot.on("001", lambda event: done.set())
+    await bot.connect()
+    await asyncio.wait_for(done.wait(), 5)
+    await bot.join("#x")
+    await wait_for(lambda: "bot" in server.channels.get("#x", ircd.FakeChannel("#x")).members)
+    return server, bot
+
+
+def test_mode_is_relayed_with_its_arguments():
+    async def run():
+        server, bot = await joined_bot()
+        channel = server.channels["#x"]
+        channel.members["alice"] = ["alice", "a", "a.host", "", None]
+        server.broadcast(channel, server.join_line("alice!a@a.host", "#x", None, "Alice"))
+        server.mode(channel, "op!o@o.host", "+ov", ["alice", "alice"])
+        await wait_for(lambda: bot.channels["#x"].is_voice("alice"))
+        status = (bot.channels["#x"].is_op("alice"), channel.members["alice"][3])
+        await bot.disconnect()
+        await server.stop()
+        return status
+
+    assert asyncio.run(run()) == (True, "@+")
@@ -0,0 +1,47 @@
+from conftest import load
+
+client = load("client")
+isupport = load("isupport")
+parser = load("parser")
+
+
+def parse(line):
+    event = parser.Parser().parse(line)
+    support = isupport.ISupport()
+    support.parse(event.params, event.trailing)
+    return support
+
+
+def test_tokens_before_the_trailing_text():
+    support = parse(":irc.test 005 me CHANTYPES=# PREFIX=(qaohv)~&@%+ :are supported by this server")
+    assert support.chantypes == "#"
+    assert support.prefix_symbols == "~&@%+"
+    assert support.status_from_symbol["@"] == 3
+
+
+def test_last_token_is_kept_without_trailing_text():
+    support = parse(":irc.test 005 me CHANTYPES=# CASEMAPPING=ascii")
+    assert support.casemapping == "ascii"
+    assert support.chantypes == "#"
+
+
+def test_negated_tokens_restore_the_defaults():
+    support = parse(":irc.test 005 me CHANTYPES=! :are supported")
+    support.parse(["me", "-CHANTYPES", "are supported"])
+    assert support.chantypes == "#&"
+
+
+def test_casemappings():
+    assert isupport.casefold_function("rfc1459")("[A]\\~") == "{a}|^"
+    assert isupport.casefold_function("strict-rfc1459")("[A]\\~") == "{a}|~"
+    assert isupport.casefold_function("ascii")("[A]\\~") == "[a]\\~"
+
+
+def test_chanmodes_and_targmax():
+    support = parse(":irc.test 005 me CHANMODES=beI,k,l,imnpst TARGMAX=PRIVMSG:4,JOIN: :are supported")
+    assert support.takes_param("b", False) and support.takes_param("k", False)
+    assert support.takes_param("l", True) and not support.takes_param("l", False)
+    assert not support.takes_param("m", True)
+    assert support.max_targets("privmsg") == 4
+    assert support.max_targets("JOIN") == 0
+    assert support.max_targets("KICK") == 1
@@ -0,0 +1,31 @@
+from conftest import load
+
+connection = load("connection")
+
+
+def test_lines_split_across_chunks():
+    buffer = connection.LineBuffer()
+    assert buffer.feed(b"PING :a\r") == []
+    assert buffer.feed(b"\nPING :b\n\r\nPI") == ["PING :a", "PING :b"]
+    assert buffer.feed(b"NG :c\r\n") == ["PING :c"]
+    assert buffer.stats()["buffered"] == 0
+
+
+def test_undecodable_line_falls_back_to_latin1():
+    buffer = connection.LineBuffer()
+    assert buffer.feed("PRIVMSG #x :été\r\n".encode("utf-8") + b"PRIVMSG #x :\xe9t\xe9\r\n") == ["PRIVMSG #x :été"] * 2
+    assert buffer.fallback == 1
+
+
+def test_oversized_line_is_dropped_up_to_its_end():
+    buffer = connection.LineBuffer()
+    assert buffer.feed(b"x" * (connection.LineBuffer.MAX_LINE + 1)) == []
+    assert buffer.feed(b"yyy\r\nPING :a\r\n") == ["PING :a"]
+    assert buffer.dropped == 1
+
+
+def test_reset_forgets_the_partial_line():
+    buffer = connection.LineBuffer()
+    buffer.feed(b"PRIVMSG #x :cut")
+    buffer.reset()
+    assert buffer.feed(b"PING :a\r\n") == ["PING :a"]
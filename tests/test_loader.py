@@ -0,0 +1,70 @@
+import asyncio
+import sys
+import textwrap
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+loader = load("loader")
+
+BASE = """
+class Base:
+    def __init__(self, client):
+        self.client = client
+"""
+
+GREETER = """
+calls = []
+
+class Greeter:
+    def __init__(self, client):
+        assert "base" in client.modules
+        client.on("privmsg", lambda event: calls.append(event.get('msg')))
+        client.router.add("hello", lambda event, rest: calls.append("command %s" % (rest)))
+"""
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    package = tmp_path / "lazymods"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "base.py").write_text(textwrap.dedent(BASE))
+    (package / "greeter.py").write_text(textwrap.dedent(GREETER))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield {'modules': 'lazymods', 'scripts': ['greeter.py', 'base.py'], 'dispatch': 'inline'}
+    for name in ("lazymods.greeter", "lazymods.base", "lazymods"):
+        sys.modules.pop(name, None)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        loader.ModuleLoader(client.Client({}), "eager")
+
+
+def test_sync_loading_follows_the_scripts(scripts):
+    with pytest.raises(AssertionError):
+        client.Client(scripts)
+    bot = client.Client(dict(scripts, scripts=['base.py', 'greeter.py']))
+    assert sorted(bot.modules) == ["base", "greeter"]
+    assert set(bot.loader.report()["scripts"]) == {"base.py", "greeter.py"}
+
+
+def test_lazy_module_gets_its_triggering_event(scripts):
+    manifest = {'greeter.py': {'events': ['privmsg'], 'requires': ['base.py']}}
+
+    async def run():
+        bot = client.Client(dict(scripts, module_loading='lazy', module_manifest=manifest))
+        bot.loader.start()
+        await bot.loader.wait('base.py')
+        assert "greeter" not in bot.modules
+        await bot.on_data(b":a!a@h PRIVMSG #x :!hello world\r\n")
+        await bot.loader.wait('greeter.py')
+        await asyncio.sleep(0.05)
+        await bot.on_data(b":a!a@h PRIVMSG #x :again\r\n")
+        await asyncio.sleep(0.05)
+        return bot.loader.loaded(), sys.modules["lazymods.greeter"].calls
+
+    assert asyncio.run(run()) == (True, ["!hello world", "command world", "again"])
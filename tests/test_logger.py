@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from conftest import load
+
+logger = load("logger")
+
+
+class ListSink:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_level_names_and_values():
+    log = logger.Logger("WARN", sinks=[ListSink()], threaded=False)
+    assert log.level == logger.WARN
+    log.set_level(logger.DEBUG)
+    assert log.level == logger.DEBUG
+
+
+def test_unknown_level_raises_value_error():
+    with pytest.raises(ValueError, match="debug, info, warn, error"):
+        logger.Logger("verbose", sinks=[ListSink()], threaded=False)
+    log = logger.Logger(sinks=[ListSink()], threaded=False)
+    with pytest.raises(ValueError):
+        log.set_level("loud")
+    assert log.level == logger.INFO
+
+
+def test_disabled_levels_are_skipped():
+    sink = ListSink()
+    log = logger.Logger("warn", sinks=[sink], threaded=False)
+    log.info("hidden")
+    log.warn("shown %d", 1)
+    assert len(sink.lines) == 1 and "shown 1" in sink.lines[0]
+
+
+def test_structured_lines_are_json():
+    sink = ListSink()
+    log = logger.Logger(sinks=[sink], structured=True, threaded=False)
+    log.error("failed", module="hello")
+    record = json.loads(sink.lines[0])
+    assert (record["level"], record["msg"], record["module"]) == ("error", "failed", "hello")
+
+
+def test_file_sink_rotates(tmp_path):
+    path = str(tmp_path / "pyrc.log")
+    sink = logger.FileSink(path, max_bytes=100, backups=2)
+    for index in range(20):
+        sink.write("line %d %s" % (index, "x" * 20))
+    sink.close()
+    assert (tmp_path / "pyrc.log.1").exists() and (tmp_path / "pyrc.log.2").exists()
+    assert not (tmp_path / "pyrc.log.3").exists()
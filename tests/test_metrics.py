@@ -0,0 +1,51 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+metrics = load("metrics")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def seen(event):
+    pass
+
+
+def test_lines_and_listeners_are_counted():
+    bot = client.Client({'dispatch': 'inline', 'metrics': True, 'slow_listener': 0})
+    bot.on("privmsg", seen)
+    feed(bot, ":a!a@h PRIVMSG #x :one", ":a!a@h PRIVMSG #x :two", ":irc.test NOTICE bot :hi")
+    snap = bot.metrics.snapshot()
+    assert snap["lines"]["privmsg"] == 2 and snap["lines"]["notice"] == 1
+    assert snap["parse"]["count"] == 3
+    timing = [item for item in snap["listeners"] if item["event"] == "privmsg" and item["module"] == __name__]
+    assert timing and timing[0]["count"] == 2
+    assert "send" in snap and "recv" in snap
+
+
+def test_prometheus_text_and_http_endpoint():
+    async def run():
+        each = metrics.Metrics()
+        each.lines["PING"] += 3
+        each.listener("join", seen, 0.25)
+        server = await each.serve(port=0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.0\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        each.close()
+        return each.slow, response.decode()
+
+    slow, response = asyncio.run(run())
+    assert slow == 1
+    assert response.startswith("HTTP/1.0 200 OK")
+    assert 'pyrc_lines_total{command="PING"} 3' in response
+    assert 'pyrc_listener_seconds_count{event="join",module="%s"} 1' % (__name__) in response
@@ -0,0 +1,42 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_names_are_swapped_in_on_366():
+    bot = client.Client({'dispatch': 'inline'})
+    channel = bot.channel("#a")
+    diffs = []
+    bot.on("names#a", lambda event, joined, left: diffs.append((sorted(joined), sorted(left))))
+    feed(bot, ":old!o@host JOIN #a", ":kept!k@host JOIN #a")
+
+    feed(bot, ":irc.test 353 bot = #a :@kept +new!n@new.host")
+    # The member list is only replaced once NAMES ends.
+    assert sorted(channel.users) == ["kept", "old"] and not channel.synced
+    feed(bot, ":irc.test 353 bot = #a :@+multi", ":irc.test 366 bot #a :End of /NAMES list.")
+
+    assert sorted(channel.users) == ["kept", "multi", "new"] and channel.synced
+    assert diffs == [(["multi", "new"], ["old"])]
+    assert channel.is_op("kept") and channel.is_voice("new")
+    assert channel.is_op("multi") and channel.is_voice("multi")
+    assert bot.users.get("new").host == "new.host"
+    assert "old" not in bot.users
+
+
+def test_member_records_survive_the_swap():
+    bot = client.Client({'dispatch': 'inline'})
+    channel = bot.channel("#a")
+    feed(bot, ":kept!k@host JOIN #a")
+    member = channel.users["kept"]
+    feed(bot, ":irc.test 353 bot = #a :+kept", ":irc.test 366 bot #a :End of /NAMES list.")
+    assert channel.users["kept"] is member and member.statuses() == [channel.VOICE]
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import load
+
+parser = load("parser")
+
+LINES = [
+    ":nick!ident@host PRIVMSG #chan :hello world",
+    "@time=2021-01-01T00:00:00.000Z;msgid=a\\sb :nick!ident@2001:db8::1 PRIVMSG #chan :tagged",
+    ":nick!ident@host JOIN #chan account :Real Name",
+    ":nick!ident@host PART #chan :bye",
+    ":nick!ident@host QUIT :Quit: bye",
+    ":nick!ident@host NICK :other",
+    ":op!ident@host MODE #chan +o nick",
+    ":op!ident@host KICK #chan nick :behave",
+    ":irc.server 353 me = #chan :@op +voice nick",
+    ":irc.server 005 me CHANTYPES=# :are supported",
+    "PING :irc.server",
+    "ERROR :Closing Link: host (Quit: bye)",
+]
+
+
+def test_fields():
+    event = parser.Parser().parse(LINES[1])
+    assert event.tags == {"time": "2021-01-01T00:00:00.000Z", "msgid": "a b"}
+    assert event.sender == ("nick", "ident", "2001:db8::1")
+    assert (event.command, event.action, event.channel, event.target, event.msg) == ("PRIVMSG", "privmsg", "#chan", "#chan", "tagged")
+    assert event.params == ["#chan", "tagged"]
+
+
+def test_kick_and_error():
+    p = parser.Parser()
+    kick = p.parse(LINES[7])
+    assert (kick.channel, kick.target, kick.msg) == ("#chan", "nick", "behave")
+    error = p.parse(LINES[11])
+    assert error.action == "closing link"
+    assert error.from_server
+
+
+def test_accept_skips_unwanted_commands():
+    p = parser.Parser()
+    assert p.parse(LINES[0], accept=lambda action: action == "join") is None
+    assert p.parse(LINES[2], accept=lambda action: action == "join").action == "join"
+
+
+@pytest.mark.parametrize("line", LINES)
+def test_data_matches_get_and_has(line):
+    event = parser.Parser().parse(line)
+    data = event.data
+    assert list(data) == [key for key in event.KEYS if event.has(key)]
+    assert all(data[key] == event.get(key) for key in data)
+
+
+def test_get_raises_for_missing_keys():
+    event = parser.Parser().parse(LINES[5])
+    assert not event.has("channel")
+    with pytest.raises(KeyError):
+        event.get("channel")
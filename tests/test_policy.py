@@ -0,0 +1,74 @@
+import asyncio
+import importlib
+import sys
+import textwrap
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+dispatcher = load("dispatcher")
+policy = load("policy")
+
+SOURCE = """
+import asyncio
+
+class Slow:
+    def __init__(self, client):
+        async def wait(event):
+            await asyncio.sleep(1)
+        client.on("greet", wait)
+        client.on("greet", lambda event: asyncio.sleep(1))
+        client.on("greet", self.greet_event)
+
+    async def greet_event(self, event):
+        await asyncio.sleep(1)
+"""
+
+
+@pytest.fixture
+def slow(tmp_path, monkeypatch):
+    package = tmp_path / "policymods"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "slow.py").write_text(textwrap.dedent(SOURCE))
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def make(options):
+        bot = client.Client(options)
+        bot.init_module("policymods.slow", importlib.import_module("policymods.slow"))
+        return bot
+    yield make
+    sys.modules.pop("policymods.slow", None)
+    sys.modules.pop("policymods", None)
+
+
+def kinds(bot):
+    return [kind for _, kind in bot.dispatcher._index["greet"]]
+
+
+def test_module_policy_covers_functions_and_lambdas(slow):
+    async def run():
+        bot = slow({'policies': {'slow': {'timeout': 0.05}}})
+        bot.emit("greet", None)
+        await asyncio.sleep(0.2)
+        return kinds(bot), bot.dispatcher.policy_of_owner("slow").stats()["timeouts"]
+
+    assert asyncio.run(run()) == ([dispatcher.ISOLATED] * 3, 3)
+
+
+def test_policy_set_after_load_and_removed_on_unload(slow):
+    bot = slow({})
+    assert dispatcher.ISOLATED not in kinds(bot)
+    bot.set_policy(bot.modules["slow"], {'concurrency': 1})
+    assert kinds(bot) == [dispatcher.ISOLATED] * 3
+    listeners = list(bot.dispatcher.events["greet"])
+    bot.unload_module("slow")
+    assert bot.dispatcher.policy_of_owner("slow") is None
+    assert all(bot.dispatcher.policy_of(listener) is None for listener in listeners)
+
+
+def test_policy_rejects_unknown_overflow():
+    with pytest.raises(ValueError):
+        policy.Policy(overflow="block")
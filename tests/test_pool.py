@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+ircd = load("ircd")
+pool = load("pool")
+
+
+def options(port, nickname):
+    return {'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': nickname, 'auto_reconnect': False, 'flood_control': False}
+
+
+def test_names_are_unique():
+    each = pool.ClientPool({"a": {}})
+    with pytest.raises(ValueError):
+        each.add("a", {})
+    bot = client.Client({})
+    assert each.add("b", bot) is bot and each.get("b") is bot
+
+
+def test_clients_share_one_loop():
+    async def run():
+        server = ircd.FakeIRCd()
+        port = await server.start()
+        each = pool.ClientPool({"one": options(port, "one"), "two": options(port, "two"), "down": options(1, "down")})
+        failed = await each.start()
+        health = each.health()
+        await each.stop()
+        await server.stop()
+        return sorted(failed), health['total'], health['connected'], each.get("one").connected
+
+    assert asyncio.run(run()) == (["down"], 3, 2, False)
@@ -0,0 +1,48 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+reconnect = load("reconnect")
+
+
+def test_backoff_grows_up_to_max_delay():
+    bot = client.Client({})
+    each = reconnect.Reconnector(bot, delay=1, max_delay=8, jitter=0)
+    assert [each.backoff(attempt) for attempt in range(5)] == [1, 2, 4, 8, 8]
+
+
+def test_disconnect_cancels_a_pending_reconnect():
+    async def run():
+        bot = client.Client({'retry_delay': 0.05})
+        attempts = []
+
+        async def connect():
+            attempts.append(1)
+        bot.connect = connect
+        bot.reconnector.jitter = 0
+
+        await bot.connection_lost()
+        await asyncio.sleep(0)
+        assert bot.reconnector.state == reconnect.Reconnector.WAITING
+        await bot.disconnect()
+        await asyncio.sleep(0.2)
+        return attempts, bot.reconnector.state
+
+    assert asyncio.run(run()) == ([], reconnect.Reconnector.STOPPED)
+
+
+def test_connection_lost_reconnects():
+    async def run():
+        bot = client.Client({'retry_delay': 0.01})
+        attempts = []
+
+        async def connect():
+            attempts.append(1)
+        bot.connect = connect
+
+        await bot.connection_lost()
+        await asyncio.sleep(0.1)
+        return attempts
+
+    assert asyncio.run(run()) == [1]
@@ -0,0 +1,79 @@
+import importlib
+import sys
+import textwrap
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+
+SOURCE = """
+class Hello:
+    def __init__(self, client):
+        self.client = client
+        self.version = %d
+        self.unloaded = False
+        client.on("greet", self.greet_event, task=True)
+        client.router.add("hi", self.hi, args="<nick>", cooldown=5)
+        %s
+
+    def greet_event(self, event):
+        pass
+
+    def hi(self, event, nick):
+        pass
+
+    def unload(self):
+        self.unloaded = True
+"""
+
+
+@pytest.fixture
+def hello(tmp_path, monkeypatch):
+    package = tmp_path / "reloadmods"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    path = package / "hello.py"
+    monkeypatch.syspath_prepend(str(tmp_path))
+    # Rewritten within the same second : no stale bytecode.
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+
+    def write(version, extra="pass"):
+        path.write_text(textwrap.dedent(SOURCE % (version, extra)))
+
+    write(1)
+    bot = client.Client({})
+    bot.init_module("reloadmods.hello", importlib.import_module("reloadmods.hello"))
+    yield bot, write
+    sys.modules.pop("reloadmods.hello", None)
+    sys.modules.pop("reloadmods", None)
+
+
+def test_reload_swaps_the_instance(hello):
+    bot, write = hello
+    old = bot.modules["hello"]
+    write(2)
+    assert bot.reload_module("hello") == ["hello"]
+    assert bot.modules["hello"].version == 2
+    assert old.unloaded
+    assert bot.dispatcher.events["greet"] == [bot.modules["hello"].greet_event]
+
+
+def test_failed_instantiation_keeps_the_old_instance(hello):
+    bot, write = hello
+    old = bot.modules["hello"]
+    write(2, 'client.on("part", self.greet_event); raise RuntimeError("broken")')
+    assert bot.reload_module("hello") == []
+    assert bot.modules["hello"] is old and not old.unloaded
+    assert bot.dispatcher.events["greet"] == [old.greet_event]
+    assert bot.dispatcher.is_task(old.greet_event)
+    assert "part" not in bot.dispatcher.events
+    command, rest = bot.router.match("!hi bob")
+    assert (command.name, command.cooldown, command.args.spec) == ("hi", 5, "<nick>")
+    assert bot.dispatcher.events["command:hi"] == [old.hi]
+
+    # Unloading still removes everything it registered.
+    bot.unload_module("hello")
+    assert bot.router.match("!hi bob") is None
+    assert "greet" not in bot.dispatcher.events
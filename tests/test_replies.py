@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from conftest import load
+
+client = load("client")
+ircd = load("ircd")
+
+
+def offline():
+    """Client whose sent lines are recorded, replies are fed with on_data."""
+    bot = client.Client({'dispatch': 'inline'})
+    bot.sent = []
+
+    async def send(line, priority=None, wait=False):
+        bot.sent.append(line)
+    bot.send = send
+    return bot
+
+
+async def answer(bot, *lines):
+    await asyncio.sleep(0)
+    for line in lines:
+        await bot.on_data(("%s\r\n" % (line)).encode())
+
+
+def test_replies_go_to_the_oldest_request():
+    async def run():
+        bot = offline()
+        first = asyncio.ensure_future(bot.request("WHOIS alice"))
+        second = asyncio.ensure_future(bot.request("WHOIS bob"))
+        same = asyncio.ensure_future(bot.request("WHOIS ALICE"))
+        await answer(bot,
+                     ":irc.test 311 me alice a a.host * :Alice",
+                     ":irc.test 318 me alice :End of /WHOIS list.",
+                     ":irc.test 311 me bob b b.host * :Bob",
+                     ":irc.test 318 me bob :End of /WHOIS list.")
+        return bot.sent, await first, await second, await same, bot.replies.pending()
+
+    sent, first, second, same, pending = asyncio.run(run())
+    assert sent == ["WHOIS alice", "WHOIS bob"]
+    assert first is same and first.ok
+    assert first["311"] == [["alice", "a", "a.host", "*", "Alice"]]
+    assert second.first("311")[:3] == ["bob", "b", "b.host"]
+    assert pending == 0
+
+
+def test_errors_timeouts_and_unknown_commands():
+    async def run():
+        bot = offline()
+        failed = asyncio.ensure_future(bot.request("MODE #x +b"))
+        await answer(bot, ":irc.test 442 me #x :You're not on that channel")
+        with pytest.raises(asyncio.TimeoutError):
+            await bot.request("WHO #y", timeout=0.01)
+        with pytest.raises(ValueError):
+            await bot.request("PRIVMSG #x :hi")
+        lost = asyncio.ensure_future(bot.request("NAMES #z"))
+        await asyncio.sleep(0)
+        bot.emit("disconnected", None)
+        with pytest.raises(ConnectionError):
+            await lost
+        return await failed
+
+    reply = asyncio.run(run())
+    assert not reply.ok and reply.error.command == "442"
+
+
+def test_labeled_replies_from_the_server():
+    async def run():
+        server = ircd.FakeIRCd()
+        port = await server.start()
+        bot = client.Client({'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': 'bot', 'auto_reconnect': False, 'flood_control': False})
+        welcomed = asyncio.Event()
+        bot.on("001", lambda event: welcomed.set())
+        await bot.connect()
+        await asyncio.wait_for(welcomed.wait(), 5)
+        whois, missing = await asyncio.gather(bot.request("WHOIS bot", 5), bot.request("WHOIS nobody", 5))
+        labeled = bot.replies.labeled()
+        await bot.disconnect()
+        await server.stop()
+        return labeled, whois, missing
+
+    labeled, whois, missing = asyncio.run(run())
+    assert labeled
+    assert whois.first("311")[0] == "bot" and "318" in whois
+    assert "401" in missing and "311" not in missing
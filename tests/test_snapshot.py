@@ -0,0 +1,45 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+snapshot = load("snapshot")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "state.db")
+    bot = client.Client({'dispatch': 'inline', 'hostname': 'irc.test'})
+    bot.channel("#a").key = "secret"
+    feed(bot,
+         ":irc.test 005 bot CASEMAPPING=ascii PREFIX=(qov)~@+ :are supported by this server",
+         ":irc.test 353 bot = #a :~owner!o@o.host @op!p@p.host",
+         ":irc.test 366 bot #a :End of /NAMES list.",
+         ":op!p@p.host MODE #a +b *!*@bad.host")
+    asyncio.run(snapshot.Snapshot(path).save(bot))
+
+    restored = client.Client({'dispatch': 'inline', 'hostname': 'irc.test'})
+    assert snapshot.Snapshot(path).load(restored) == 1
+    channel = restored.channels["#a"]
+    assert restored.isupport.tokens["CASEMAPPING"] == "ascii"
+    assert channel.key == "secret" and not channel.synced
+    assert sorted(channel.users) == ["op", "owner"]
+    assert channel.is_op("op") and channel.get_user_status("owner") == [restored.isupport.status_from_letter["q"]]
+    assert channel.is_banned("x!y@bad.host") == ["*!*@bad.host"]
+    assert restored.users.get("owner").host == "o.host"
+
+
+def test_other_network_is_ignored(tmp_path):
+    path = str(tmp_path / "state.db")
+    bot = client.Client({'hostname': 'irc.test'})
+    bot.channel("#a")
+    snapshot.Snapshot(path).write(snapshot.Snapshot(path).collect(bot))
+    assert snapshot.Snapshot(path).load(client.Client({'hostname': 'irc.other'})) == 0
+    assert snapshot.Snapshot(str(tmp_path / "missing.db")).load(bot) == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+splitter = load("splitter")
+
+
+def test_short_line_is_untouched():
+    assert splitter.split_line("PRIVMSG #c :hello", 60) == ["PRIVMSG #c :hello"]
+
+
+def test_lines_fit_once_relayed():
+    text = " ".join("word%d" % (index) for index in range(300))
+    lines = splitter.split_line("PRIVMSG #c :%s" % (text), 60)
+    assert len(lines) > 1
+    assert all(len(line.encode("utf-8")) + 60 + 2 <= splitter.LINE_BYTES for line in lines)
+    assert " ".join(line[len("PRIVMSG #c :"):] for line in lines) == text
+
+
+def test_utf8_characters_are_never_cut():
+    text = "é€😀" * 200
+    chunks = splitter.split_text(text, 100)
+    assert "".join(chunks) == text
+    assert all(len(chunk.encode("utf-8")) <= 100 for chunk in chunks)
+
+
+def test_size_narrower_than_a_character_still_progresses():
+    # Each of these characters is wider than size.
+    assert splitter.split_text("😀😀😀", 3) == ["😀", "😀", "😀"]
+    assert splitter.split_text("a€b", 2) == ["a", "€", "b"]
+    assert splitter.split_text("日本", 1) == ["日", "本"]
+
+
+def test_action_stays_an_action():
+    lines = splitter.split_line("PRIVMSG #c :\x01ACTION %s\x01" % ("waves " * 200), 60)
+    assert len(lines) > 1
+    assert all(line.startswith("PRIVMSG #c :\x01ACTION ") and line.endswith("\x01") for line in lines)
+
+
+def test_pack_targets_respects_count_and_room():
+    groups = splitter.pack_targets(["#a", "#bb", "#ccc", "#d"], 2, 100)
+    assert groups == [["#a", "#bb"], ["#ccc", "#d"]]
+    assert splitter.pack_targets(["#aaaa", "#bbbb"], 0, 6) == [["#aaaa"], ["#bbbb"]]
+
+
+def test_reserved_follows_our_hostmask():
+    bot = client.Client({'dispatch': 'inline', 'nickname': 'bot'})
+
+    async def feed(*lines):
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+
+    unknown = bot.splitter.reserved()
+    asyncio.run(feed(":irc.test 001 bot :Welcome bot!ident@some.host", ":irc.test 005 bot TARGMAX=PRIVMSG:2 :are supported"))
+    assert bot.splitter.hostmask == "bot!ident@some.host"
+    assert bot.splitter.reserved() == len(":bot!ident@some.host ") < unknown
+    asyncio.run(feed(":bot!ident@some.host CHGHOST x hidden.host"))
+    assert bot.splitter.hostmask == "bot!x@hidden.host"
+    assert bot.splitter.pack("PRIVMSG", ["#a", "#b", "#c"], "hi") == ["PRIVMSG #a,#b :hi", "PRIVMSG #c :hi"]
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from conftest import load
+
+client = load("client")
+ircd = load("ircd")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_events_keep_entries_fresh():
+    bot = client.Client({'dispatch': 'inline'})
+    bot.channel("#a")
+    feed(bot, ":alice!a@host JOIN #a alice_acc :Alice Liddell")
+    info = bot.usercache.get("ALICE")
+    assert (info.account, info.realname) == ("alice_acc", "Alice Liddell")
+    feed(bot, ":alice!a@host ACCOUNT *", ":alice!a@host CHGHOST b new.host", ":alice!b@new.host NICK :carol")
+    assert bot.usercache.get("alice") is None
+    assert (info.nick, info.account, info.ident, info.host) == ("carol", None, "b", "new.host")
+    feed(bot, ":carol!b@new.host QUIT :bye")
+    assert "carol" not in bot.usercache
+
+
+def test_entries_expire_and_are_evicted():
+    bot = client.Client({'dispatch': 'inline', 'user_cache_ttl': 60, 'user_cache_size': 2})
+    cache = bot.usercache
+    for nick in ("a", "b", "c"):
+        cache._store(nick)
+    assert list(cache.entries) == ["b", "c"]
+    cache.entries["b"].expires = time.monotonic() - 1
+    assert cache.get("b") is None and list(cache.entries) == ["c"]
+
+
+def test_lookups_share_one_who():
+    async def run():
+        server = ircd.FakeIRCd()
+        port = await server.start()
+        bot = client.Client({'hostname': '127.0.0.1', 'port': port, 'ssl': False, 'nickname': 'bot', 'auto_reconnect': False, 'flood_control': False})
+        bot.channel("#x")
+        welcomed = asyncio.Event()
+        bot.on("001", lambda event: welcomed.set())
+        await bot.connect()
+        await asyncio.wait_for(welcomed.wait(), 5)
+        names = asyncio.Event()
+        bot.on("names#x", lambda event, joined, left: names.set())
+        server.channels["#x"] = channel = ircd.FakeChannel("#x")
+        channel.members["alice"] = ["alice", "a", "a.host", "", None]
+        channel.members["bob"] = ["bob", "b", "b.host", "+", None]
+        await bot.join("#x")
+        await asyncio.wait_for(names.wait(), 5)
+
+        alice, bob = await asyncio.gather(bot.usercache.lookup("alice"), bot.usercache.lookup("bob"))
+        again = await bot.usercache.lookup("alice")
+        result = (alice.host, bob.host, again is alice, server.who_queries, bot.usercache.hits)
+        await bot.disconnect()
+        await server.stop()
+        return result
+
+    assert asyncio.run(run()) == ("a.host", "b.host", True, 1, 1)
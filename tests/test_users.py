@@ -0,0 +1,54 @@
+import asyncio
+
+from conftest import load
+
+client = load("client")
+user = load("user")
+
+
+def feed(bot, *lines):
+    async def run():
+        for line in lines:
+            await bot.on_data(("%s\r\n" % (line)).encode())
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_channels_share_one_user_record():
+    bot = client.Client({'dispatch': 'inline'})
+    first, second = bot.channel("#a"), bot.channel("#b")
+    feed(bot, ":Alice!a@host.net JOIN #a", ":Alice!a@host.net JOIN #b")
+    assert first.users["alice"].user is second.users["alice"].user is bot.users.get("ALICE")
+    assert bot.users.get("alice").channels == {"#a", "#b"}
+
+    feed(bot, ":Alice!a@host.net PART #a")
+    assert "alice" in bot.users and bot.users.get("alice").channels == {"#b"}
+    feed(bot, ":Alice!a@host.net QUIT :bye")
+    assert "alice" not in bot.users and not second.users
+
+
+def test_nick_change_keeps_the_record():
+    bot = client.Client({'dispatch': 'inline'})
+    channel = bot.channel("#a")
+    feed(bot, ":alice!a@host.net JOIN #a")
+    record = bot.users.get("alice")
+    feed(bot, ":alice!a@host.net NICK :bob")
+    assert bot.users.get("bob") is record and record.nick == "bob"
+    assert "alice" not in bot.users and channel.users["bob"].user is record
+
+
+def test_registry_interns_hosts():
+    registry = user.UserRegistry()
+    first = registry.add("a", "ident", "".join(["shared.", "host"]))
+    second = registry.add("b", "ident", "".join(["shared.", "host"]))
+    assert first.host is second.host
+
+
+def test_member_status_bitmask():
+    member = user.Member(user.User("alice"))
+    member.give_status(3)
+    member.give_status(1)
+    member.remove_status(1)
+    assert member.statuses() == [3] and member.get("status") == [3]
+    assert member.has_status(3) and not member.has_status(1)
+    assert member.get("nick") == "alice"
@@ -1,93 +1,123 @@
-""" Users class helper """
+import sys
+
+""" Users registry, shared by every Channel of a Client """
+
 
 class User:
+    """A user seen on at least one channel. One record per user, whatever the channel count."""
+
+    __slots__ = ("nick", "ident", "host", "channels")
+
+    def __init__(self, nick, ident=None, host=None):
+        self.nick = nick
+        self.ident = ident
+        self.host = host
+        self.channels = set()
+
+    def __repr__(self):
+        return "<User %s!%s@%s>" % (self.nick, self.ident, self.host)
+
+
+class Member:
+    """Membership of a User on a Channel, status modes are kept as a bitmask."""
+
+    __slots__ = ("user", "status")
+
+    def __init__(self, user, status=0):
+        self.user = user
+        self.status = status
+
+    def has_status(self, status):
+        return bool(self.status & (1 << status))
+
+    def give_status(self, status):
+        self.status |= 1 << status
+
+    def remove_status(self, status):
+        self.status &= ~(1 << status)
+
+    def statuses(self):
+        """List of status constants set on this member."""
+        return [status for status in range(self.status.bit_length()) if self.status & (1 << status)]
+
+    """ Compatibility with the former dict wrapper """
 
-    """ Constants """
+    def get(self, key):
+        if key == "status":
+            return self.statuses()
+        return getattr(self.user, key)
 
-    REGULAR = 0
-    VOICE = 1
-    HALFOP = 2
-    OP = 3
+    def has(self, key):
+        return key in ("nick", "ident", "host", "status")
 
-    def __init__(self, client, channel):
-        self.client = client
+    def __repr__(self):
+        return "<Member %s %s>" % (self.user.nick, self.statuses())
+
+
+class UserRegistry:
+    """
+    Client level table of users keyed by casefolded nick.
+    Idents and hosts are interned, most users of a network share a few of them.
+    """
+
+    def __init__(self, casefold=str.lower):
+        self.casefold = casefold
         self.users = {}
-        self.channel = channel
-
-        self.client.on("join%s" % (self.channel.name), self.join_event)
-        self.client.on("kick%s" % (self.channel.name), self.kick_event)
-        self.client.on("part%s" % (self.channel.name), self.part_event)
-        self.client.on("quit", self.quit_event)
-        self.client.on("mode%s" % (self.channel.name), self.mode_event)
-        self.client.on("nick", self.nick_event)
-        self.client.on("353%s" % (self.channel.name), self.names_event)
-    
-    """ Event """
-
-    async def join_event(self, event):
-        print(event.data)
-        pass
-    async def part_event(self, event):
-        pass
-    async def nick_event(self, event):
-        pass
-    async def kick_event(self, event):
-        pass
-    async def quit_event(self, event):
-        pass
-    async def mode_event(self, event):
-        print(event.data)
-
-    async def names_event(self, event):
-        users = self._parse_users_from_names(event.get('msg'))
-        for user in users:
-            if user.get('nick') not in self.users:
-                self.users[user.get('nick')] = user
-    
-    """ Privates methods """
-
-    def _parse_users_from_names(self, event_message):
-        names = event_message.lower().split()
-        users = []
-
-        for user in names:
-            current_user = User.User(self._get_user(user))
-            if self._has_status(parsed_user.get('nick')):
-                current_user.add('status', [self._get_status_symbol(current_user.get('nick'))])
-                current_user.add('nick', self._strip_status_symbol_from_nick(current_user.get('nick')))
-            else:
-                current_user.add('status', [])
-            users.append(current_user)
-        
-        return users
-
-    def _get_user(self, user):
-        return {
-            "nick": user.split("!")[0],
-            "ident": user.split("!")[1].split("@")[0],
-            "host": user.split("!")[1].split("@")[1].split()[0],
-        } 
-    
-    def _has_status(self, nick):
-        if nick[0] in '+%@':
-            return True
-    
-    def _get_status_symbol(self, nick):
-        return nick[0]
-    
-    def _strip_status_symbol_from_nick(self, nick):
-        return nick[1:]
-
-    """ Wrapprer for individual user """
-    class User:
-        def __init__(self, user):
-            self.user = user
-
-        def get(self, key):
-            return self.user[key]
-
-        def add(self, key, value):
-            self.user[key] = value
-
-        def has(self, key):
-            return key in self.user
\ No newline at end of file
+
+    def set_casefold(self, casefold):
+        """Switch to another casemapping, keys are rebuilt."""
+        self.casefold = casefold
+        self.users = {casefold(user.nick): user for user in self.users.values()}
+
+    def rename_channels(self, names):
+        """Rename channels in every user channel set, names : {old name: new name}."""
+        for user in self.users.values():
+            if user.channels:
+                user.channels = {names.get(channel, channel) for channel in user.channels}
+
+    def __len__(self):
+        return len(self.users)
+
+    def __contains__(self, nick):
+        return self.casefold(nick) in self.users
+
+    def get(self, nick):
+        return self.users.get(self.casefold(nick))
+
+    def add(self, nick, ident=None, host=None):
+        """Return the user record of nick, created or updated with ident/host."""
+        key = self.casefold(nick)
+        user = self.users.get(key)
+        if user is None:
+            user = User(nick, self._intern(ident), self._intern(host))
+            self.users[key] = user
+        else:
+            if ident and user.ident != ident:
+                user.ident = self._intern(ident)
+            if host and user.host != host:
+                user.host = self._intern(host)
+        return user
+
+    def join(self, user, channel):
+        user.channels.add(channel)
+
+    def part(self, user, channel):
+        """Remove channel from the user, the user is forgotten once on no channel."""
+        user.channels.discard(channel)
+        if not user.channels:
+            key = self.casefold(user.nick)
+            if self.users.get(key) is user:
+                del self.users[key]
+
+    def rename(self, nick, new_nick):
+        user = self.users.pop(self.casefold(nick), None)
+        if user is not None:
+            user.nick = new_nick
+            self.users[self.casefold(new_nick)] = user
+        return user
+
+    def remove(self, nick):
+        return self.users.pop(self.casefold(nick), None)
+
+    def _intern(self, value):
+        return sys.intern(value) if value else value
@@ -0,0 +1,228 @@
+import asyncio
+import collections
+import time
+
+"""
+User metadata cache : account, realname, server and away state of users,
+filled in bulk by WHO/WHOX and kept fresh by account-notify, extended-join
+and chghost.
+"""
+
+# Query type of our WHOX requests, replies carrying another one belong to someone else.
+WHOX_TOKEN = "152"
+# t c u h s n f a r : the 354 reply lists them in this order.
+WHOX_FIELDS = "%tcuhsnfar"
+
+
+class UserInfo:
+    __slots__ = ("nick", "ident", "host", "realname", "account", "server", "away", "expires")
+
+    def __init__(self, nick, ident=None, host=None):
+        self.nick = nick
+        self.ident = ident
+        self.host = host
+        self.realname = None
+        self.account = None # None : not logged in (or unknown without WHOX)
+        self.server = None
+        self.away = None
+        self.expires = 0
+
+    def __repr__(self):
+        return "<UserInfo %s!%s@%s account=%s>" % (self.nick, self.ident, self.host, self.account)
+
+
+class UserCache:
+    """
+    Cache of UserInfo keyed by casefolded nick, entries expire after ttl
+    seconds and the least recently used are evicted past size entries.
+
+    lookup(nick) queries the channel the user shares with us rather than the
+    nick alone, so one WHO refreshes a whole channel. WHO go through
+    Client.request, concurrent lookups answered by the same query share it.
+    """
+
+    def __init__(self, client, ttl=600, size=10000, timeout=30):
+        self.client = client
+        self.ttl = ttl
+        self.size = size
+        self.timeout = timeout
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0 # WHO requests, shared ones included
+
+        client.on("join", self.join_event)
+        client.on("account", self.account_event)
+        client.on("chghost", self.chghost_event)
+        client.on("nick", self.nick_event)
+        client.on("quit", self.quit_event)
+        client.on("netsplit", self.netsplit_event)
+        client.on("netjoin", self.netjoin_event)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, nick):
+        return self.get(nick) is not None
+
+    def set_casefold(self, casefold):
+        self.entries = collections.OrderedDict((casefold(info.nick), info) for info in self.entries.values())
+
+    """ Lookups """
+
+    def get(self, nick):
+        """Fresh cached UserInfo of nick, or None."""
+        key = self.client.casefold(nick)
+        info = self.entries.get(key)
+        if info is None:
+            return None
+        if info.expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return info
+
+    async def lookup(self, nick):
+        """UserInfo of nick, from the cache or from a WHO. None if the server does not know nick."""
+        info = self.get(nick)
+        if info is not None:
+            self.hits += 1
+            return info
+        self.misses += 1
+        user = self.client.users.get(nick)
+        if user is not None and user.channels:
+            # Any channel will do, the whole channel is refreshed anyway.
+            await self.query(min(user.channels))
+        else:
+            await self.query(nick)
+        return self.entries.get(self.client.casefold(nick))
+
+    async def lookup_channel(self, channel):
+        """Refresh every member of channel with a single WHO, return {nick: UserInfo}."""
+        await self.query(channel)
+        channel = self.client.channels.get(self.client.casefold(channel))
+        if channel is None:
+            return {}
+        return {member.user.nick: self.entries[key] for key, member in channel.users.items() if key in self.entries}
+
+    async def query(self, mask):
+        """WHO mask and store the users of the reply. False on timeout or disconnection."""
+        self.queries += 1
+        if "WHOX" in self.client.isupport.tokens:
+            line = "WHO %s %s,%s" % (mask, WHOX_FIELDS, WHOX_TOKEN)
+        else:
+            line = "WHO %s" % (mask)
+        try:
+            reply = await self.client.request(line, self.timeout)
+        except (asyncio.TimeoutError, ConnectionError) as exc:
+            self.client.log.warn("%s failed : %r" % (line, exc))
+            return False
+        for event in reply.events:
+            if event.command == "354":
+                self.whox_event(event)
+            elif event.command == "352":
+                self.who_event(event)
+        return True
+
+    def invalidate(self, nick):
+        self.entries.pop(self.client.casefold(nick), None)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "queries": self.queries,
+        }
+
+    def _store(self, nick, ident=None, host=None):
+        """Entry of nick, created if needed, refreshed and marked most recently used."""
+        key = self.client.casefold(nick)
+        info = self.entries.get(key)
+        if info is None:
+            info = self.entries[key] = UserInfo(nick)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        if ident:
+            info.ident = ident
+        if host:
+            info.host = host
+        info.expires = time.monotonic() + self.ttl
+        return info
+
+    def _known(self, nick):
+        return self.entries.get(self.client.casefold(nick))
+
+    """ Handle events """
+
+    def whox_event(self, event):
+        """A 354 row of our WHOX query (see WHOX_FIELDS)."""
+        params = event.get('params')
+        if len(params) < 10 or params[1] != WHOX_TOKEN:
+            return
+        _, _, _, ident, host, server, nick, flags, account, realname = params[:10]
+        info = self._store(nick, ident, host)
+        info.server = server
+        info.away = flags.startswith("G")
+        info.account = None if account == "0" else account
+        info.realname = realname
+
+    def who_event(self, event):
+        params = event.get('params')
+        if len(params) < 8:
+            return
+        _, _, ident, host, server, nick, flags, last = params[:8]
+        info = self._store(nick, ident, host)
+        info.server = server
+        info.away = flags.startswith("G")
+        info.realname = last.partition(" ")[2]
+
+    def join_event(self, event):
+        nick, ident, host = event.get('from')
+        params = event.get('params')
+        if len(params) >= 3:
+            # extended-join : JOIN #channel account :realname
+            info = self._store(nick, ident, host)
+            info.account = None if params[1] == "*" else params[1]
+            info.realname = params[2]
+        else:
+            info = self._known(nick)
+            if info is not None:
+                info.ident, info.host = ident, host
+
+    def account_event(self, event):
+        info = self._known(event.get('from')[0])
+        params = event.get('params')
+        if info is not None and params:
+            info.account = None if params[0] == "*" else params[0]
+
+    def chghost_event(self, event):
+        nick = event.get('from')[0]
+        params = event.get('params')
+        if len(params) < 2:
+            return
+        info = self._known(nick)
+        if info is not None:
+            info.ident, info.host = params[0], params[1]
+        if nick in self.client.users:
+            self.client.users.add(nick, params[0], params[1])
+
+    def nick_event(self, event):
+        info = self.entries.pop(self.client.casefold(event.get('from')[0]), None)
+        if info is not None:
+            info.nick = event.get('msg')
+            self.entries[self.client.casefold(info.nick)] = info
+
+    def quit_event(self, event):
+        self.invalidate(event.get('from')[0])
+
+    def netsplit_event(self, batch, nicks, channels):
+        for nick in nicks:
+            self.invalidate(nick)
+
+    def netjoin_event(self, batch, channels):
+        for event in batch.events:
+            if event.action == "join":
+                self.join_event(event)